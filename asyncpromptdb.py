@@ -0,0 +1,74 @@
+import asyncio
+import functools
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+
+from promptdb import PromptDatabase
+
+# PromptDatabase methods that are not exposed as coroutines: close() belongs to the connection of one call,
+# and the iter_table_records generator would outlive the connection it reads from.
+SYNC_ONLY_METHODS = {'close', 'iter_table_records'}
+
+# PromptDatabase methods exposed as coroutines by AsyncPromptDatabase: every public method, so new ones are
+# picked up without being listed here.
+ASYNC_METHODS = [
+    name for name, member in vars(PromptDatabase).items()
+    if not name.startswith('_') and inspect.isfunction(member) and name not in SYNC_ONLY_METHODS
+]
+
+
+class AsyncPromptDatabase:
+    """
+    Awaitable versions of the PromptDatabase methods, for async services.
+
+    Every call runs on a bounded pool of worker threads and checks its own connection out of the shared
+    connection pool, so independent queries awaited together (e.g. with asyncio.gather) run concurrently and
+    a request takes about as long as its slowest query.
+    """
+    def __init__(self, host=None, user=None, password=None, database=None, backend=None, max_workers=4,
+                 read_backend=None, session=None):
+        """
+        Takes the same connection arguments as PromptDatabase.
+
+        :param max_workers: The maximum number of queries running at the same time. Keep it at or below the
+                            connection pool size (MSSQL_POOL_SIZE) so workers do not wait for connections.
+        """
+        self._db_args = dict(host=host, user=user, password=password, database=database, backend=backend,
+                             read_backend=read_backend, session=session)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-promptdb")
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        """
+        Stops the worker threads once the queries already submitted have finished.
+        """
+        self._executor.shutdown(wait=False)
+
+    async def run(self, method, *args, **kwargs):
+        """
+        Runs any PromptDatabase method by name on the worker pool and returns its result.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(self._call, method, args, kwargs))
+
+    def _call(self, method, args, kwargs):
+        with PromptDatabase(**self._db_args) as db:
+            return getattr(db, method)(*args, **kwargs)
+
+
+def _async_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(name, *args, **kwargs)
+    method.__name__ = name
+    method.__qualname__ = f"AsyncPromptDatabase.{name}"
+    method.__doc__ = getattr(PromptDatabase, name).__doc__
+    return method
+
+
+for _name in ASYNC_METHODS:
+    setattr(AsyncPromptDatabase, _name, _async_method(_name))
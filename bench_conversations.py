@@ -0,0 +1,264 @@
+"""
+Benchmarks for the ConversationDatabaseManager queries, run against a local SQLite stand-in.
+
+Usage:
+    python bench_conversations.py --sizes 1000,20000 --length 20000 --repeat 3 --output bench_conversations.json
+    python bench_conversations.py --sizes 1000000 --length 300 --vocabulary 50000 \
+        --methods search_conversations,search_conversations_ranked,search_term_like,search_term_ranked
+
+Every size gets a fresh database seeded with that many conversations of about ``--length`` characters.
+Besides the timings, every case reports the rows and the bytes of column data it transferred. With
+--compressed the seeded conversations are compressed before the cases run, and the compression ratio
+and timings are reported as well. With --vocabulary the words are drawn from a Zipf-distributed vocabulary of
+that many words, like natural text, instead of a handful of words that occur in every conversation; the
+*_term cases then search for a word that occurs in a fraction of a percent of the conversations. The
+*_ranked cases build the local full-text index (conversationindex) before their first call and report how
+long that took and how large the index is.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from conversationcodec import compression_stats
+from conversationdb import ConversationDatabaseManager, _search_indexes
+from dbbackend import SQLiteBackend
+
+DEFAULT_SIZES = (1_000, 20_000)
+WORDS = ("user", "assistant", "hello", "summary", "invoice", "Belgrade", "report", "context", "answer", "question",
+         "thanks", "please", "model", "prompt", "token")
+APPS = tuple(f"app_{i}" for i in range(20))
+
+
+def vocabulary_words(vocabulary):
+    """
+    Returns WORDS followed by ``vocabulary`` synthetic words, most frequent first, and their cumulative Zipf
+    weights.
+    """
+    words = WORDS + tuple(f"t{n:05d}" for n in range(vocabulary))
+    return words, list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+
+def seed_conversations(backend, size, length=20_000, seed=0, vocabulary=None):
+    """
+    Fills the stand-in with ``size`` conversations of roughly ``length`` characters each, with words from
+    WORDS or, when ``vocabulary`` is given, from vocabulary_words(vocabulary).
+    """
+    rng = random.Random(seed)
+    words, cum_weights = vocabulary_words(vocabulary) if vocabulary else (WORDS, None)
+    conn = backend.connect()
+    try:
+        def rows():
+            for i in range(1, size + 1):
+                turns = []
+                while sum(map(len, turns)) < length:
+                    speaker = "user" if len(turns) % 2 == 0 else "assistant"
+                    turns.append(f'{{"role": "{speaker}", "content": "{" ".join(rng.choices(words, cum_weights=cum_weights, k=40))}"}}')
+                yield i, rng.choice(APPS), f"user_{i % 500}", f"thread_{i:07d}", "[" + ", ".join(turns) + "]"
+        conn.executemany("INSERT INTO conversations (id, app_name, user_name, thread_id, conversation) "
+                         "VALUES (?, ?, ?, ?, ?)", rows())
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class BenchContext:
+    def __init__(self, size, seed=0, vocabulary=None, index_path=None):
+        self.size = size
+        self.rng = random.Random(seed)
+        # A word in roughly 0.3% of the conversations when they are drawn from a vocabulary.
+        self.term = vocabulary_words(vocabulary)[0][1000] if vocabulary and vocabulary > 1000 else "invoice"
+        self.index_path = index_path
+        self.index_built = False
+
+    def thread_id(self):
+        return f"thread_{self.rng.randint(1, self.size):07d}"
+
+
+def _select_all_search(db, ctx):
+    # The query the search view ran before projection: every matching conversation in full.
+    db.cursor.execute("SELECT * FROM conversations WHERE conversation LIKE ?", ("%invoice please%",))
+    return db.cursor.fetchall()
+
+
+def _select_all_by_app(db, ctx):
+    return db.fetch_records_by_column("app_name", "app_1") or []
+
+
+def _build_search_index(db, ctx):
+    # Untimed setup of the *_ranked cases: builds the index on the first call, then only refreshes it.
+    if ctx.index_built:
+        db.search_index(ctx.index_path)
+        return
+    started = time.perf_counter()
+    index = db.search_index(ctx.index_path)
+    built = time.perf_counter() - started
+    index.optimize()
+    ctx.index_built = True
+    stats = index.stats()
+    print(f"Indexed {stats['threads']} conversations in {built:.2f}s (optimized in "
+          f"{time.perf_counter() - started - built:.2f}s), index {stats['bytes']:,} bytes")
+
+
+def _update_each(db, ctx):
+    # One UPDATE and commit per message, as the Streamlit view and the logging services write today.
+    for i in range(1000):
+        db.update_conversation(ctx.thread_id(), f"updated {i}")
+
+
+def _write_behind(db, ctx):
+    writer = db.background_writer()
+    written = writer.stats()["rows_written"]
+    for i in range(1000):
+        writer.update(ctx.thread_id(), f"updated {i}")
+    writer.flush()
+    return {"rows_written": writer.stats()["rows_written"] - written}
+
+
+CASES = (
+    ("search_select_all", _select_all_search),
+    ("search_conversations", lambda db, ctx: db.search_conversations("invoice please")),
+    ("search_conversations_ranked", lambda db, ctx: db.search_conversations_ranked('"invoice please"'),
+     _build_search_index),
+    ("search_term_like", lambda db, ctx: db.search_conversations(ctx.term)),
+    ("search_term_ranked", lambda db, ctx: db.search_conversations_ranked(ctx.term), _build_search_index),
+    ("fetch_records_by_column_app", _select_all_by_app),
+    ("list_conversations_app", lambda db, ctx: db.list_conversations("app_name", "app_1")),
+    ("fetch_conversation", lambda db, ctx: db.fetch_conversation(ctx.thread_id())),
+    ("update_conversation_x1000", _update_each),
+    ("background_writer_update_x1000", _write_behind),
+)
+
+
+def _value_bytes(value):
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return 8 if value is not None else 0
+
+
+def _transferred(result):
+    """
+    Returns (rows, bytes of column data) for a case result.
+    """
+    if result is None:
+        return 0, 0
+    if isinstance(result, (str, bytes)):
+        return 1, len(result)
+    if isinstance(result, dict):
+        return result.get("rows_written", 0), 0
+    if hasattr(result, "itertuples"):
+        rows = list(result.itertuples(index=False, name=None))
+    else:
+        rows = result
+    return len(rows), sum(_value_bytes(value) for row in rows for value in row)
+
+
+def run_size(size, length, repeat, methods=None, workdir=None, compressed=False, vocabulary=None):
+    """
+    Seeds a fresh stand-in with ``size`` conversations and times every case ``repeat`` times.
+    """
+    path = os.path.join(workdir or tempfile.gettempdir(), f"bench_conversations_{size}_{os.getpid()}.sqlite")
+    index_path = path[:-len(".sqlite")] + "_index.sqlite"
+    for stale in (path, index_path):
+        if os.path.exists(stale):
+            os.remove(stale)
+    backend = SQLiteBackend(path)
+    started = time.perf_counter()
+    seed_conversations(backend, size, length, vocabulary=vocabulary)
+    print(f"Seeded {size} conversations in {time.perf_counter() - started:.2f}s")
+
+    ctx = BenchContext(size, vocabulary=vocabulary, index_path=index_path)
+    results = []
+    try:
+        with ConversationDatabaseManager(backend=backend, compress=compressed) as db:
+            if compressed:
+                started = time.perf_counter()
+                migrated = db.migrate_compression(batch_size=500)
+                print(f"Compressed {migrated['compressed']} conversations in {time.perf_counter() - started:.2f}s, "
+                      f"ratio {migrated['original_chars'] / max(migrated['stored_chars'], 1):.2f}")
+            for name, case, *setup in CASES:
+                if methods and name not in methods:
+                    continue
+                timings = []
+                for _ in range(repeat):
+                    if setup:
+                        setup[0](db, ctx)
+                    t0 = time.perf_counter()
+                    result = case(db, ctx)
+                    timings.append(time.perf_counter() - t0)
+                rows, transferred = _transferred(result)
+                results.append({
+                    "size": size,
+                    "method": name,
+                    "repeat": repeat,
+                    "min_ms": min(timings) * 1000,
+                    "median_ms": statistics.median(timings) * 1000,
+                    "rows": rows,
+                    "bytes": transferred,
+                    "compressed": compressed,
+                })
+    finally:
+        index = _search_indexes.pop(backend.key, None)
+        if index is not None:
+            index.close()
+        for suffix in ("", "-wal", "-shm"):
+            for base in (path, index_path):
+                if os.path.exists(base + suffix):
+                    os.remove(base + suffix)
+    return results
+
+
+def print_report(results):
+    print(f"{'size':>9}  {'method':<36}{'min ms':>11}{'median ms':>11}{'rows':>9}{'bytes':>14}")
+    for r in results:
+        print(f"{r['size']:>9}  {r['method']:<36}{r['min_ms']:>11.3f}{r['median_ms']:>11.3f}"
+              f"{r['rows']:>9}{r['bytes']:>14,}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ConversationDatabaseManager queries against a SQLite stand-in.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated conversation counts to seed (default: 1000,20000).")
+    parser.add_argument("--length", type=int, default=20_000, help="Approximate characters per conversation.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed calls per case and size.")
+    parser.add_argument("--methods", default="", help="Comma separated subset of cases to run.")
+    parser.add_argument("--output", default="bench_conversations.json", help="Where to write the JSON results.")
+    parser.add_argument("--workdir", help="Directory for the temporary SQLite files.")
+    parser.add_argument("--compressed", action="store_true", help="Compress the seeded conversations first.")
+    parser.add_argument("--vocabulary", type=int, help="Draw the words from a Zipf vocabulary of this many words.")
+    args = parser.parse_args()
+
+    methods = {m for m in args.methods.split(",") if m}
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        results.extend(run_size(size, args.length, args.repeat, methods, args.workdir, args.compressed,
+                                args.vocabulary))
+    print_report(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "length": args.length,
+            "vocabulary": args.vocabulary,
+            "compression": compression_stats.stats() if args.compressed else None,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Micro-benchmarks for the public PromptDatabase methods, run against a local SQLite stand-in.
+
+Usage:
+    python bench_promptdb.py --sizes 1000,100000,1000000 --repeat 5 --output bench_promptdb.json
+    python bench_promptdb.py --sizes 1000 --compare bench_promptdb.json
+
+Every size gets a fresh database seeded with that many PromptStrings and CentralRelationshipTable
+rows. The report is printed and written as JSON so runs before and after a change can be compared.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from dbbackend import SQLiteBackend
+from promptcatalog import PromptCatalog
+from promptdb import PromptDatabase
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+WORDS = ("alpha", "beta", "gamma", "delta", "serbian", "assistant", "summary", "report", "context", "answer")
+
+
+def seed_database(backend, size, seed=0):
+    """
+    Fills the stand-in with ``size`` prompts and ``size`` relationship rows plus small dimension tables.
+    """
+    rng = random.Random(seed)
+    n_users = min(size, 100)
+    n_variables = min(size, 1_000)
+    n_files = min(size, 100)
+    conn = backend.connect()
+    try:
+        conn.executemany("INSERT INTO Users (UserID, Username) VALUES (?, ?)",
+                         ((i, f"user_{i}") for i in range(1, n_users + 1)))
+        conn.executemany("INSERT INTO PromptVariables (VariableID, VariableName) VALUES (?, ?)",
+                         ((i, f"variable_{i}") for i in range(1, n_variables + 1)))
+        conn.executemany("INSERT INTO PythonFiles (FileID, Filename, FilePath) VALUES (?, ?, ?)",
+                         ((i, f"file_{i}.py", f"/srv/app/file_{i}.py") for i in range(1, n_files + 1)))
+        conn.executemany(
+            "INSERT INTO PromptStrings (PromptID, PromptName, PromptString, Comment, UserID, VariableID, VariableFileID) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ((i, f"prompt_{i:07d}", " ".join(rng.choices(WORDS, k=30)), f"comment {i}",
+              i % n_users + 1, i % n_variables + 1, i % n_files + 1) for i in range(1, size + 1)))
+        conn.executemany(
+            "INSERT INTO CentralRelationshipTable (ID, PromptID, UserID, VariableID, FileID) VALUES (?, ?, ?, ?, ?)",
+            ((i, i, i % n_users + 1, i % n_variables + 1, i % n_files + 1) for i in range(1, size + 1)))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class BenchContext:
+    """
+    Holds the seeded size and the counters the write cases use to generate unique names.
+    """
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.rng = random.Random(seed)
+        self.counter = 0
+        self.added_names = []
+        self.catalog = None
+
+    def next_id(self):
+        self.counter += 1
+        return self.counter
+
+    def prompt_name(self):
+        return f"prompt_{self.rng.randint(1, self.size):07d}"
+
+    def prompt_names(self, count):
+        return [self.prompt_name() for _ in range(count)]
+
+    def user_id(self):
+        return self.rng.randint(1, min(self.size, 100))
+
+
+def _add_new_record(db, ctx):
+    name = f"bench_new_{ctx.next_id()}"
+    ctx.added_names.append(name)
+    return db.add_new_record("user_1", "file_1.py", "variable_1", "bench prompt text", name, "bench")
+
+
+def _bulk_upsert(db, ctx):
+    # Half new prompts, half updates of seeded ones.
+    batch = ctx.next_id()
+    records = [{"PromptName": f"bench_bulk_{batch}_{i}", "PromptString": "bulk text", "Comment": "bulk"} for i in range(5000)]
+    records += [{"PromptName": name, "PromptString": "bulk update"} for name in ctx.prompt_names(5000)]
+    return db.bulk_upsert_prompts(records)
+
+
+def _delete_prompt_by_name(db, ctx):
+    name = ctx.added_names.pop() if ctx.added_names else f"bench_missing_{ctx.next_id()}"
+    return db.delete_prompt_by_name(name)
+
+
+def _update_all_record(db, ctx):
+    # Rename a user and back so the seeded names stay valid for the other cases.
+    db.update_all_record("user_2", "user_2_renamed", "Users", "Username")
+    return db.update_all_record("user_2_renamed", "user_2", "Users", "Username")
+
+
+def _edit_then_sync(db, ctx):
+    # Untimed setup: a fully synced catalog, then 10 edits made through the library.
+    if ctx.catalog is None:
+        ctx.catalog = PromptCatalog()
+        db.sync_prompt_catalog(ctx.catalog)
+    for name in ctx.prompt_names(10):
+        db.update_prompt_record(name, f"edited {ctx.next_id()}", "edited")
+
+
+def _edit_with_revisions(db, ctx):
+    # Twenty one-word edits of the same prompt, each stored as a delta or checkpoint revision.
+    db.cursor.execute("SELECT PromptString FROM PromptStrings WHERE PromptName = ?", ("prompt_0000001",))
+    words = db.cursor.fetchone()[0].split(" ")
+    for _ in range(20):
+        words[ctx.rng.randrange(len(words))] = f"edit{ctx.next_id()}"
+        db.update_prompt_record("prompt_0000001", " ".join(words), "edited")
+    return db.get_prompt_revisions("prompt_0000001")
+
+
+# (name, timed call, optional untimed setup run before every call)
+def _rows_to_dataframe(db, ctx):
+    # The row path the Streamlit views used before the columnar fetch, for comparison.
+    import pandas as pd
+
+    records, columns = db.get_all_records_from_table("PromptStrings")
+    return pd.DataFrame([tuple(record) for record in records], columns=columns)
+
+
+CASES = (
+    ("query_sql_prompt_strings", lambda db, ctx: db.query_sql_prompt_strings(ctx.prompt_names(20))),
+    ("resolve_prompt_strings_5000", lambda db, ctx: db.resolve_prompt_strings(ctx.prompt_names(5000))),
+    ("get_prompts_by_names", lambda db, ctx: db.get_prompts_by_names([f"v{i}" for i in range(20)], ctx.prompt_names(20))),
+    ("get_prompt_details_by_name", lambda db, ctx: db.get_prompt_details_by_name(ctx.prompt_name())),
+    ("get_prompts_for_username", lambda db, ctx: db.get_prompts_for_username(f"user_{ctx.user_id()}")),
+    ("get_records_from_column", lambda db, ctx: db.get_records_from_column("PromptStrings", "PromptName")),
+    ("get_all_records_from_table", lambda db, ctx: db.get_all_records_from_table("PromptStrings")),
+    ("get_all_records_from_table_dataframe", _rows_to_dataframe),
+    ("get_all_records_frame", lambda db, ctx: db.get_all_records_frame("PromptStrings")),
+    ("get_table_page_middle", lambda db, ctx: db.get_table_page("PromptStrings", after=ctx.size // 2)["records"]),
+    ("iter_table_records", lambda db, ctx: [len(rows) for _, rows in db.iter_table_records("PromptStrings")]),
+    ("search_for_string_in_prompt_text", lambda db, ctx: db.search_for_string_in_prompt_text("serbian summary")),
+    ("get_prompts_contain_in_name", lambda db, ctx: db.get_prompts_contain_in_name("_00001")),
+    ("get_record_by_name", lambda db, ctx: db.get_record_by_name("PromptStrings", "PromptName", ctx.prompt_name())),
+    ("get_prompt_details_for_all", lambda db, ctx: db.get_prompt_details_for_all("user_1", "Users", "Username")),
+    ("get_file_path_by_name", lambda db, ctx: db.get_file_path_by_name("file_1.py")),
+    ("get_relationships_by_user_id", lambda db, ctx: db.get_relationships_by_user_id(ctx.user_id())),
+    ("fetch_relationship_data", lambda db, ctx: db.fetch_relationship_data()),
+    ("fetch_relationship_data_by_prompt", lambda db, ctx: db.fetch_relationship_data(ctx.rng.randint(1, ctx.size))),
+    ("get_related_names_file_prompts", lambda db, ctx: db.get_related_names("file", "file_1.py", "prompt")),
+    ("add_record", lambda db, ctx: db.add_record("PromptStrings", PromptName=f"bench_add_{ctx.next_id()}",
+                                                 PromptString="bench", Comment="bench")),
+    ("add_new_record", _add_new_record),
+    ("add_new_records_1000", lambda db, ctx: db.add_new_records(
+        [dict(username=f"user_{i % 50 + 1}", filename="file_1.py", variablename=f"variable_{i + 1}",
+              promptstring="bench", promptname=f"bench_batch_{ctx.next_id()}", comment="bench") for i in range(1000)])),
+    ("bulk_upsert_prompts_10000", _bulk_upsert),
+    ("update_prompt_record", lambda db, ctx: db.update_prompt_record(ctx.prompt_name(), "updated text", "updated")),
+    ("update_record", lambda db, ctx: db.update_record("PromptStrings", {"Comment": "bench"},
+                                                       ("PromptName = ?", [ctx.prompt_name()]))),
+    ("update_all_record", _update_all_record),
+    ("update_filename_and_path", lambda db, ctx: db.update_filename_and_path("file_2.py", "file_2.py", "/srv/app/moved.py")),
+    ("add_relationship_record", lambda db, ctx: db.add_relationship_record(1, 1, 1, 1)),
+    ("update_relationship_record", lambda db, ctx: db.update_relationship_record(1, user_id=ctx.user_id())),
+    ("delete_prompt_by_name", _delete_prompt_by_name),
+    ("delete_record", lambda db, ctx: db.delete_record("CentralRelationshipTable", ("ID = ?", [ctx.size + ctx.next_id()]))),
+    ("sync_prompt_catalog_after_10_edits", lambda db, ctx: db.sync_prompt_catalog(ctx.catalog), _edit_then_sync),
+    # Everything below runs with the in-memory search index enabled.
+    ("search_for_string_in_prompt_text_indexed", lambda db, ctx: db.search_for_string_in_prompt_text("serbian summary"),
+     lambda db, ctx: db.enable_search_index()),
+    ("get_prompts_contain_in_name_indexed", lambda db, ctx: db.get_prompts_contain_in_name("_00001"),
+     lambda db, ctx: db.enable_search_index()),
+    # And with the relationship graph enabled.
+    ("get_relationships_by_user_id_graph", lambda db, ctx: db.get_relationships_by_user_id(ctx.user_id()),
+     lambda db, ctx: db.enable_relationship_graph()),
+    ("fetch_relationship_data_graph", lambda db, ctx: db.fetch_relationship_data(),
+     lambda db, ctx: db.enable_relationship_graph()),
+    ("fetch_relationship_data_by_prompt_graph", lambda db, ctx: db.fetch_relationship_data(ctx.rng.randint(1, ctx.size)),
+     lambda db, ctx: db.enable_relationship_graph()),
+    ("get_related_names_file_prompts_graph", lambda db, ctx: db.get_related_names("file", "file_1.py", "prompt"),
+     lambda db, ctx: db.enable_relationship_graph()),
+    # And with the revision log, which update_prompt_record writes from then on.
+    ("update_prompt_record_with_revisions", _edit_with_revisions, lambda db, ctx: db.create_revision_log()),
+    ("get_prompt_revision_oldest", lambda db, ctx: db.get_prompt_revision("prompt_0000001", 1)),
+)
+
+
+def _result_rows(result):
+    if hasattr(result, "shape"):
+        return result.shape[0]
+    if isinstance(result, tuple) and result and isinstance(result[0], list):
+        return len(result[0])
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict):
+        return result.get("rows_transferred", len(result))
+    return None
+
+
+def run_size(size, repeat, methods=None, workdir=None):
+    """
+    Seeds a fresh stand-in with ``size`` rows and times every case ``repeat`` times.
+    """
+    path = os.path.join(workdir or tempfile.gettempdir(), f"bench_promptdb_{size}_{os.getpid()}.sqlite")
+    if os.path.exists(path):
+        os.remove(path)
+    backend = SQLiteBackend(path)
+    started = time.perf_counter()
+    seed_database(backend, size)
+    print(f"Seeded {size} rows in {time.perf_counter() - started:.2f}s")
+
+    ctx = BenchContext(size)
+    results = []
+    try:
+        with open(os.devnull, "w") as devnull, PromptDatabase(backend=backend) as db:
+            for name, case, *setup in CASES:
+                if methods and name not in methods:
+                    continue
+                timings = []
+                rows = None
+                for _ in range(repeat):
+                    with contextlib.redirect_stdout(devnull):
+                        if setup:
+                            setup[0](db, ctx)
+                        t0 = time.perf_counter()
+                        result = case(db, ctx)
+                        timings.append(time.perf_counter() - t0)
+                    rows = _result_rows(result)
+                results.append({
+                    "size": size,
+                    "method": name,
+                    "repeat": repeat,
+                    "min_ms": min(timings) * 1000,
+                    "median_ms": statistics.median(timings) * 1000,
+                    "mean_ms": statistics.fmean(timings) * 1000,
+                    "rows": rows,
+                })
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return results
+
+
+def print_report(results, baseline=None):
+    baseline_index = {(r["size"], r["method"]): r for r in baseline["results"]} if baseline else {}
+    header = f"{'size':>9}  {'method':<44}{'min ms':>11}{'median ms':>11}{'rows':>9}"
+    if baseline_index:
+        header += f"{'baseline':>11}{'change':>9}"
+    print(header)
+    for r in results:
+        line = f"{r['size']:>9}  {r['method']:<44}{r['min_ms']:>11.3f}{r['median_ms']:>11.3f}{str(r['rows']):>9}"
+        old = baseline_index.get((r["size"], r["method"]))
+        if old:
+            change = (r["median_ms"] / old["median_ms"] - 1) * 100 if old["median_ms"] else 0.0
+            line += f"{old['median_ms']:>11.3f}{change:>+8.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PromptDatabase methods against a SQLite stand-in.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated row counts to seed (default: 1000,100000,1000000).")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per method and size.")
+    parser.add_argument("--methods", default="", help="Comma separated subset of methods to run.")
+    parser.add_argument("--output", default="bench_promptdb.json", help="Where to write the JSON results.")
+    parser.add_argument("--compare", help="A previous JSON result file to compare medians against.")
+    parser.add_argument("--workdir", help="Directory for the temporary SQLite files.")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    methods = {m for m in args.methods.split(",") if m}
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, args.repeat, methods, args.workdir))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
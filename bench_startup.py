@@ -0,0 +1,199 @@
+"""
+Cold-start benchmarks: how long a fresh Python process takes to import the library and to get its prompts,
+and how much memory that costs.
+
+Usage:
+    python bench_startup.py --sizes 1000,100000 --repeat 5 --output bench_startup.json
+
+Every size gets a SQLite stand-in seeded with that many prompts (see bench_promptdb.seed_database) and a
+prompt snapshot exported from it. Every case then runs ``--repeat`` times in a new interpreter, which
+reports the milliseconds from its first line, before any import, to the end of the case, its peak RSS and
+which heavy optional modules (pyodbc, pandas, streamlit) it loaded. The stand-in is local, so the database
+case is a lower bound for a real MSSQL connection. Cases whose imports are not installed are reported as
+skipped.
+"""
+import argparse
+import compileall
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from bench_promptdb import seed_database
+from dbbackend import SQLiteBackend
+from promptdb import PromptDatabase
+
+DEFAULT_SIZES = (1_000, 100_000)
+
+# Environment variable -> prompt name, as configured for work_prompts() in a deployment.
+WORK_PROMPT_VARIABLES = ("TEXT_FROM_IMAGE", "TEXT_FROM_AUDIO", "CONTEXTUAL_COMPRESSION", "RAG_SELF_QUERY", "HYDE_RAG",
+                         "CHOOSE_RAG", "SYS_RAGBOT", "RAG_ANSWER_REFORMAT", "GAP_BA_EXPERT", "GAP_DT_CONSULTANT",
+                         "GAP_SERVICE_SUGGESTION", "GAP_WRITE_REPORT", "SUMMARY_END", "SUMMARY_BEGIN",
+                         "INTRO_SUMMARY", "TOPIC_LIST_SUMMARY", "DATE_PARTICIPANTS_SUMMARY", "TOPIC_SUMMARY",
+                         "CONCLUSION_SUMMARY", "NEW_LAW_EMAIL", "SYS_BLOGGER")
+
+# Modules reported as loaded when a case imported them.
+HEAVY_MODULES = ("pyodbc", "sqlite3", "pandas", "numpy", "streamlit")
+
+# Each case is the body of a child process; it sets ``prompts`` and may use DB_PATH, SNAPSHOT_PATH and NAMES.
+CASES = (
+    ("interpreter", "prompts = {}"),
+    ("import_promptdb", "import promptdb\nprompts = {}"),
+    ("import_conversationdb", "import conversationdb\nprompts = {}"),
+    ("import_st_prompt_cache", "import st_prompt_cache\nprompts = {}"),
+    ("database_resolve_prompt_strings", """
+from dbbackend import SQLiteBackend
+from promptdb import PromptDatabase
+with PromptDatabase(backend=SQLiteBackend(DB_PATH)) as db:
+    prompts = db.resolve_prompt_strings(NAMES)
+"""),
+    ("snapshot_get_many", """
+from promptsnapshot import PromptSnapshot
+with PromptSnapshot(SNAPSHOT_PATH) as snapshot:
+    prompts = snapshot.get_many(NAMES)
+"""),
+    ("work_prompts_from_snapshot", """
+from promptdb import work_prompts
+prompts = work_prompts()
+"""),
+)
+
+CHILD = """
+import time
+started = time.perf_counter()
+import json, os, sys
+DB_PATH, SNAPSHOT_PATH, NAMES = os.environ['BENCH_DB_PATH'], os.environ['PROMPT_SNAPSHOT_PATH'], {names!r}
+{body}
+elapsed = (time.perf_counter() - started) * 1000
+try:
+    # VmHWM is this process's peak RSS; ru_maxrss would include the parent's peak from before exec on Linux.
+    with open('/proc/self/status') as status:
+        rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM:'))
+except OSError:
+    try:
+        import resource
+        rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // (1024 if sys.platform == 'darwin' else 1)
+    except ImportError:
+        rss_kb = None
+print('BENCH_RESULT ' + json.dumps({{'ms': elapsed, 'rss_kb': rss_kb, 'prompts': len(prompts),
+                                    'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_child(body, env, names):
+    """
+    Runs a case in a new interpreter and returns its measurement, or None if the case could not run
+    (e.g. an optional module is not installed).
+    """
+    completed = subprocess.run([sys.executable, "-c", CHILD.format(names=names, body=body, heavy=HEAVY_MODULES)],
+                               env=env, capture_output=True, text=True)
+    line = next((line for line in completed.stdout.splitlines() if line.startswith("BENCH_RESULT ")), None)
+    if completed.returncode != 0 or line is None:
+        print(completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "Case failed")
+        return None
+    return json.loads(line[len("BENCH_RESULT "):])
+
+
+def run_size(size, repeat, methods=None, workdir=None):
+    """
+    Seeds a stand-in with ``size`` prompts, exports its snapshot and times every case ``repeat`` times.
+    """
+    directory = workdir or tempfile.gettempdir()
+    db_path = os.path.join(directory, f"bench_startup_{size}_{os.getpid()}.sqlite")
+    snapshot_path = os.path.join(directory, f"bench_startup_{size}_{os.getpid()}.snapshot")
+    for path in (db_path, snapshot_path):
+        if os.path.exists(path):
+            os.remove(path)
+    backend = SQLiteBackend(db_path)
+    seed_database(backend, size)
+    started = time.perf_counter()
+    with PromptDatabase(backend=backend) as db:
+        exported = db.export_prompt_snapshot(snapshot_path)
+    print(f"Exported {exported} prompts ({os.path.getsize(snapshot_path):,} bytes) in "
+          f"{time.perf_counter() - started:.2f}s")
+
+    names = [f"prompt_{i * size // len(WORK_PROMPT_VARIABLES) + 1:07d}" for i in range(len(WORK_PROMPT_VARIABLES))]
+    env = dict(os.environ, BENCH_DB_PATH=db_path, PROMPT_SNAPSHOT_PATH=snapshot_path,
+               PYTHONPATH=os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)),
+                                                         os.environ.get("PYTHONPATH")])))
+    env.update(zip(WORK_PROMPT_VARIABLES, names))
+
+    results = []
+    try:
+        for name, body in CASES:
+            if methods and name not in methods:
+                continue
+            runs = [run_child(body, env, names) for _ in range(repeat)]
+            if None in runs:
+                print(f"Skipped {name}")
+                continue
+            timings = [run["ms"] for run in runs]
+            rss = [run["rss_kb"] for run in runs if run["rss_kb"] is not None]
+            results.append({
+                "size": size,
+                "method": name,
+                "repeat": repeat,
+                "min_ms": min(timings),
+                "median_ms": statistics.median(timings),
+                "rss_kb": statistics.median(rss) if rss else None,
+                "prompts": runs[-1]["prompts"],
+                "loaded": runs[-1]["loaded"],
+                "snapshot_bytes": os.path.getsize(snapshot_path),
+            })
+    finally:
+        for path in (db_path, db_path + "-wal", db_path + "-shm", snapshot_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return results
+
+
+def print_report(results):
+    print(f"{'size':>9}  {'method':<36}{'min ms':>11}{'median ms':>11}{'RSS KB':>10}{'prompts':>9}  loaded")
+    for r in results:
+        rss = f"{r['rss_kb']:>10,.0f}" if r['rss_kb'] is not None else f"{'-':>10}"
+        print(f"{r['size']:>9}  {r['method']:<36}{r['min_ms']:>11.3f}{r['median_ms']:>11.3f}{rss}"
+              f"{r['prompts']:>9}  {', '.join(r['loaded'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cold start of prompt lookups in a new process.")
+    parser.add_argument("--sizes", default=",".join(str(s) for s in DEFAULT_SIZES),
+                        help="Comma separated prompt counts to seed (default: 1000,100000).")
+    parser.add_argument("--repeat", type=int, default=5, help="New processes per case and size.")
+    parser.add_argument("--methods", default="", help="Comma separated subset of cases to run.")
+    parser.add_argument("--output", default="bench_startup.json", help="Where to write the JSON results.")
+    parser.add_argument("--workdir", help="Directory for the temporary SQLite and snapshot files.")
+    args = parser.parse_args()
+
+    # Children import from byte code, as a deployed app does, even with PYTHONDONTWRITEBYTECODE set.
+    compileall.compile_dir(os.path.dirname(os.path.abspath(__file__)), maxlevels=0, quiet=1)
+
+    methods = {m for m in args.methods.split(",") if m}
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        results.extend(run_size(size, args.repeat, methods, args.workdir))
+    print_report(results)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
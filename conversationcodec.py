@@ -0,0 +1,138 @@
+import base64
+import re
+import threading
+import time
+import zlib
+
+# A compressed conversation is stored as text:
+#   MARKER | original length (10 digits) | head length (4 digits) | head | base64(zlib(utf-8 text))
+# The head is the first HEAD_CHARS characters in plain text, so previews can still be cut on the server.
+# Values that do not start with MARKER are legacy plain-text rows and are read unchanged.
+MARKER = '~Z1~'
+HEAD_OFFSET = len(MARKER) + 14  # 0-based position of the head
+HEAD_CHARS = 200
+
+# Conversations shorter than this are stored as they are; compressing them saves too little.
+MIN_COMPRESS_CHARS = 512
+
+
+class CompressionStats:
+    """
+    Process-wide counters for compression: characters written before and after encoding, and the time
+    spent compressing and decompressing.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats = {"compressed_writes": 0, "plain_writes": 0, "original_chars": 0, "stored_chars": 0,
+                           "compress_seconds": 0.0, "decompressed_reads": 0, "plain_reads": 0,
+                           "decompress_seconds": 0.0}
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self._stats[name] += value
+
+    def stats(self):
+        """
+        Returns the counters plus 'ratio' (original / stored characters of the compressed writes) and the
+        average milliseconds per compression and decompression.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats["ratio"] = stats["original_chars"] / stats["stored_chars"] if stats["stored_chars"] else None
+        stats["compress_ms_avg"] = (stats["compress_seconds"] * 1000 / stats["compressed_writes"]
+                                    if stats["compressed_writes"] else None)
+        stats["decompress_ms_avg"] = (stats["decompress_seconds"] * 1000 / stats["decompressed_reads"]
+                                      if stats["decompressed_reads"] else None)
+        return stats
+
+
+compression_stats = CompressionStats()
+
+
+def is_compressed(value):
+    return isinstance(value, str) and value.startswith(MARKER)
+
+
+def encode(text, level=6):
+    """
+    Returns the stored form of a conversation: compressed if it is long enough and compression pays off,
+    otherwise the text itself.
+    """
+    if text is None or len(text) < MIN_COMPRESS_CHARS or is_compressed(text):
+        compression_stats.add(plain_writes=1)
+        return text
+    started = time.perf_counter()
+    head = text[:HEAD_CHARS]
+    payload = base64.b64encode(zlib.compress(text.encode('utf-8'), level)).decode('ascii')
+    encoded = f"{MARKER}{len(text):010d}{len(head):04d}{head}{payload}"
+    elapsed = time.perf_counter() - started
+    if len(encoded) >= len(text):
+        compression_stats.add(plain_writes=1)
+        return text
+    compression_stats.add(compressed_writes=1, original_chars=len(text), stored_chars=len(encoded),
+                          compress_seconds=elapsed)
+    return encoded
+
+
+def decode(value):
+    """
+    Returns the conversation text of a stored value, compressed or legacy plain text.
+    """
+    if not is_compressed(value):
+        compression_stats.add(plain_reads=1)
+        return value
+    started = time.perf_counter()
+    head_length = int(value[HEAD_OFFSET - 4:HEAD_OFFSET])
+    text = zlib.decompress(base64.b64decode(value[HEAD_OFFSET + head_length:])).decode('utf-8')
+    compression_stats.add(decompressed_reads=1, decompress_seconds=time.perf_counter() - started)
+    return text
+
+
+def like_matcher(pattern, char_classes=False):
+    """
+    Returns a case-insensitive predicate with the semantics of ``LIKE pattern``, used to search compressed
+    conversations that the database cannot match itself. ``%`` and ``_`` are wildcards; with
+    ``char_classes`` (SQL Server) ``[abc]``, ``[a-f]`` and ``[^abc]`` match one character of a set, as they
+    do in T-SQL. SQLite matches ``[`` literally, which is the default.
+    """
+    regex = []
+    position = 0
+    while position < len(pattern):
+        char = pattern[position]
+        end = pattern.find(']', position + 2) if char_classes and char == '[' else -1
+        if char == '%':
+            regex.append('.*')
+        elif char == '_':
+            regex.append('.')
+        elif end != -1:
+            regex.append(_char_class(pattern[position + 1:end]))
+            position = end
+        else:
+            regex.append(re.escape(char))
+        position += 1
+    try:
+        return re.compile(f"^{''.join(regex)}$", re.DOTALL | re.IGNORECASE).match
+    except re.error:
+        # e.g. a reversed range such as [z-a], which matches nothing in T-SQL either
+        return lambda text: None
+
+
+def _char_class(body):
+    negate = body.startswith('^') and len(body) > 1
+    if negate:
+        body = body[1:]
+    members = []
+    position = 0
+    while position < len(body):
+        if position + 2 < len(body) and body[position + 1] == '-':
+            members.append(f"{re.escape(body[position])}-{re.escape(body[position + 2])}")
+            position += 3
+        else:
+            members.append(re.escape(body[position]))
+            position += 1
+    return f"[{'^' if negate else ''}{''.join(members)}]"
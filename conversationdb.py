@@ -0,0 +1,767 @@
+import os
+import threading
+import time
+import conversationcodec
+from conversationfacets import ConversationFacets
+from dbbackend import CONVERSATION_CHANGE_LOG_DDL, MSSQLBackend, read_backend_from_env
+from dbframe import DEFAULT_BATCH_SIZE, fetch_frame
+from dbinstrument import get_default_instrumentation, instrument_cursor
+from dbmarks import GAP_WINDOW, after_mark, open_gaps
+from dbpool import get_pool
+from dbrouting import ReadRouting, on_primary, route_reads
+from sqlstatements import select_in
+
+# Metadata columns returned by the conversation list queries; the conversation body is fetched separately.
+CONVERSATION_LIST_COLUMNS = ['id', 'app_name', 'user_name', 'thread_id']
+
+_facet_indexes = {}  # backend key -> ConversationFacets, see ConversationDatabaseManager.facets
+_search_indexes = {}  # backend key -> ConversationSearchIndex, see ConversationDatabaseManager.search_index
+_search_indexes_lock = threading.Lock()
+_change_log_available = {}  # backend key -> bool, see ConversationDatabaseManager._has_change_log
+_writers = {}  # backend key -> ConversationWriter, see ConversationDatabaseManager.background_writer
+_writers_lock = threading.Lock()
+
+# Thread IDs per existence check in write_conversations (MSSQL allows 2100 parameters per statement).
+MAX_QUERY_PARAMS = 2000
+
+# Seconds between checks for new conversations, and between full reloads that also pick up rows deleted
+# by other processes.
+FACETS_REFRESH_INTERVAL = float(os.getenv('CONVERSATION_FACETS_REFRESH', '2'))
+FACETS_MAX_AGE = float(os.getenv('CONVERSATION_FACETS_MAX_AGE', '600'))
+
+# The local full-text index used by search_conversations_ranked, and the seconds between its refreshes.
+SEARCH_INDEX_PATH = os.getenv('CONVERSATION_SEARCH_INDEX', 'conversation_search.sqlite')
+SEARCH_INDEX_REFRESH_INTERVAL = float(os.getenv('CONVERSATION_SEARCH_REFRESH', '2'))
+
+# Set CONVERSATION_COMPRESSION=1 to store new and updated conversation bodies compressed by default.
+COMPRESSION_ENABLED = os.getenv('CONVERSATION_COMPRESSION', '0') == '1'
+
+
+class ConversationDatabaseManager:
+    """
+    A class to interact with a MSSQL database for storing and retrieving conversation data.
+    """
+    
+    def __init__(self, host=None, user=None, password=None, database=None, backend=None, instrumentation=None,
+                 compress=None, read_backend=None, session=None, pin_seconds=None):
+        """
+        Initializes the connection details for the database, with the option to use environment variables as defaults.
+        A backend (e.g. dbbackend.SQLiteBackend) can be passed instead to run against another database, and a
+        dbinstrument.QueryInstrumentation to record per-query metrics (defaults to the process-wide hook, if any).
+        With compress=True (default: the CONVERSATION_COMPRESSION setting) conversation bodies are written
+        compressed; compressed and plain rows are read transparently either way.
+        The read-only methods (READ_METHODS) go to ``read_backend`` when one is given (by default the replica in
+        MSSQL_READ_HOST, if set), except for ``session`` during the ``pin_seconds`` after one of its writes.
+        """
+        self.host = host if host is not None else os.getenv('MSSQL_HOST')
+        self.user = user if user is not None else os.getenv('MSSQL_USER')
+        self.password = password if password is not None else os.getenv('MSSQL_PASS')
+        self.database = database if database is not None else os.getenv('MSSQL_DB')
+        self.backend = backend if backend is not None else MSSQLBackend(self.host, self.user, self.password, self.database)
+        self.instrumentation = instrumentation if instrumentation is not None else get_default_instrumentation()
+        self.compress = compress if compress is not None else COMPRESSION_ENABLED
+        if read_backend is None and backend is None:
+            read_backend = read_backend_from_env(self.user, self.password, self.database)
+        self.routing = ReadRouting(self.backend, read_backend, session, pin_seconds, self.instrumentation)
+        self.conn = None
+        self.cursor = None
+
+    def __enter__(self):
+        """
+        Checks a connection out of the shared pool and returns the instance itself when entering the context.
+        """
+        self.conn = self._pool().checkout()
+        self.cursor = self._new_cursor()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """
+        Closes the cursor and returns the connection to the pool when exiting the context.
+        Handles any exceptions that occurred within the context.
+        """
+        self.close()
+        if exc_type or exc_val or exc_tb:
+            pass
+
+    def _pool(self):
+        return get_pool(self.backend.key, self.backend.connect)
+
+    def _new_cursor(self, read=False):
+        if read and self.routing.use_replica():
+            return self.routing.new_cursor()
+        return instrument_cursor(self.conn.cursor(), self.instrumentation)
+
+    def close(self):
+        """
+        Closes the cursor and returns the connection to the pool.
+        """
+        if self.cursor is not None:
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
+            self.cursor = None
+        if self.conn is not None:
+            self._pool().checkin(self.conn)
+            self.conn = None
+        self.routing.close()
+
+    def query_frame(self, query, params=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Runs a query and returns its result as a pandas DataFrame filled column by column in batches.
+
+        Parameters:
+        - query: The SQL query to run.
+        - params: The query parameters, if any.
+        - batch_size: The number of rows fetched per round trip.
+
+        Returns:
+        - A DataFrame with the query result.
+        """
+        if params:
+            self.cursor.execute(query, params)
+        else:
+            self.cursor.execute(query)
+        return fetch_frame(self.cursor, batch_size)
+
+    def fetch_distinct_column_values(self, column_name):
+        """
+        Fetches distinct values of a specified column from the conversations table.
+        
+        Parameters:
+        - column_name: The name of the column (e.g., user_name, app_name, thread_id).
+
+        Returns:
+        - A list of distinct values for the specified column.
+        """
+        query = f"SELECT DISTINCT {column_name} FROM conversations"
+        self.cursor.execute(query)
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def fetch_records_by_column(self, column_name, column_value):
+        """
+        Fetches records from the conversations table where the specified column matches the given value.
+        
+        Parameters:
+        - column_name: The name of the column to filter by (e.g., user_name, app_name, thread_id).
+        - column_value: The value to match in the specified column.
+        
+        Returns:
+        - A list of tuples containing the matching records, or None if no records are found.
+        """
+        query = f"SELECT * FROM conversations WHERE {column_name} = ?"
+        self.cursor.execute(query, (column_value,))
+        rows = self.cursor.fetchall()
+        index = [desc[0] for desc in self.cursor.description].index('conversation')
+        rows = [row if not conversationcodec.is_compressed(row[index])
+                else tuple(conversationcodec.decode(value) if i == index else value for i, value in enumerate(row))
+                for row in rows]
+        return rows if rows else None
+
+    def _encode(self, conversation):
+        return conversationcodec.encode(conversation) if self.compress else conversation
+
+    def fetch_thread_ids(self, filter_column, filter_value):
+        """
+        Fetches thread IDs based on a filter (either app_name or user_name).
+
+        Parameters:
+        - filter_column: Column to filter by ('app_name' or 'user_name').
+        - filter_value: Value to filter on in the specified column.
+
+        Returns:
+        - A list of thread IDs.
+        """
+        query = f"SELECT DISTINCT thread_id FROM conversations WHERE {filter_column} = ?"
+        self.cursor.execute(query, (filter_value,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def fetch_distinct_thread_ids(self, column_name, column_value):
+        """
+        Fetches distinct thread IDs based on the specified column name and value.
+    
+        Parameters:
+        - column_name: The column to filter by ('app_name' or 'user_name').
+        - column_value: The value to match in the specified column.
+    
+        Returns:
+        - A list of distinct thread IDs.
+        """
+        query = f"SELECT DISTINCT thread_id FROM conversations WHERE {column_name} = ?"
+        self.cursor.execute(query, (column_value,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _preview_columns(self):
+        """
+        The metadata column list plus a server-side preview and the full length of the conversation,
+        so list queries never transfer the conversation bodies. Compressed rows (see conversationcodec)
+        return their stored plain-text head and original length.
+        """
+        marker = conversationcodec.MARKER
+        if self.backend.dialect == 'mssql':
+            substring, left, length, integer = "SUBSTRING", "LEFT(conversation, ?)", "LEN(conversation)", "BIGINT"
+        else:
+            substring, left, length, integer = "substr", "substr(conversation, 1, ?)", "length(conversation)", "INTEGER"
+        compressed = f"conversation LIKE '{marker}%'"
+        head = self._compressed_head()
+        original_length = f"CAST({substring}(conversation, {len(marker) + 1}, 10) AS {integer})"
+        return (", ".join(CONVERSATION_LIST_COLUMNS)
+                + f", CASE WHEN {compressed} THEN {head} ELSE {left} END AS preview"
+                + f", CASE WHEN {compressed} THEN {original_length} ELSE {length} END AS conversation_length")
+
+    def _compressed_head(self):
+        """
+        The SQL expression for the plain-text head stored in a compressed conversation.
+        """
+        offset = conversationcodec.HEAD_OFFSET
+        if self.backend.dialect == 'mssql':
+            return f"SUBSTRING(conversation, {offset + 1}, CAST(SUBSTRING(conversation, {offset - 3}, 4) AS BIGINT))"
+        return f"substr(conversation, {offset + 1}, CAST(substr(conversation, {offset - 3}, 4) AS INTEGER))"
+
+    def _preview_frame(self, query, params, preview_length):
+        df = self.query_frame(query, params)
+        if not df.empty and preview_length < conversationcodec.HEAD_CHARS:
+            df['preview'] = df['preview'].str.slice(0, preview_length)
+        return df
+
+    def list_conversations(self, column_name=None, column_value=None, preview_length=200):
+        """
+        Lists conversations with their metadata and a short preview instead of the full text.
+
+        Parameters:
+        - column_name: The column to filter by (e.g., user_name, app_name, thread_id), or None for all rows.
+        - column_value: The value to match in the specified column.
+        - preview_length: The number of characters of the conversation to include as 'preview'.
+
+        Returns:
+        - A DataFrame with the id, app_name, user_name, thread_id, preview and conversation_length columns.
+        """
+        query = f"SELECT {self._preview_columns()} FROM conversations"
+        params = [preview_length]
+        if column_name is not None:
+            query += f" WHERE {column_name} = ?"
+            params.append(column_value)
+        return self._preview_frame(query + " ORDER BY id", params, preview_length)
+
+    def search_conversations(self, search_string, preview_length=200):
+        """
+        Finds the conversations containing a string and returns their metadata and a short preview.
+        The match runs on the server; only the previews of the matching rows are transferred.
+
+        Compressed rows cannot be matched by the database. With a search index and the change log (see
+        _candidate_index) the index picks the threads that can match, and only their compressed rows are
+        read and searched after decompression. Without them only the plain-text head of a compressed row
+        (its first conversationcodec.HEAD_CHARS characters) is searched, on the server, so a search never
+        transfers the compressed table.
+
+        Parameters:
+        - search_string: The text to search for in the conversation column.
+        - preview_length: The number of characters of the conversation to include as 'preview'.
+
+        Returns:
+        - A DataFrame with the id, app_name, user_name, thread_id, preview and conversation_length columns.
+        """
+        marker = conversationcodec.MARKER
+        pattern = f"%{search_string}%"
+        index = self._candidate_index()
+        if index is None:
+            query = (f"SELECT {self._preview_columns()} FROM conversations "
+                     f"WHERE (conversation NOT LIKE '{marker}%' AND conversation LIKE ?) "
+                     f"OR (conversation LIKE '{marker}%' AND {self._compressed_head()} LIKE ?) ORDER BY id")
+            return self._preview_frame(query, [preview_length, pattern, pattern], preview_length)
+        query = (f"SELECT {self._preview_columns()} FROM conversations "
+                 f"WHERE conversation LIKE ? AND conversation NOT LIKE '{marker}%' ORDER BY id")
+        df = self._preview_frame(query, [preview_length, pattern], preview_length)
+        matches = self._search_compressed(pattern, index)
+        if matches:
+            import pandas as pd
+
+            found = pd.DataFrame([row + (text[:preview_length], len(text)) for row, text in matches],
+                                 columns=list(df.columns))
+            df = pd.concat([df, found], ignore_index=True).sort_values('id', ignore_index=True)
+        return df
+
+    def _search_compressed(self, pattern, index, batch_size=500):
+        """
+        Returns ((id, app_name, user_name, thread_id), text) for the compressed conversations matching a
+        LIKE pattern: only the compressed rows of the threads whose text in ``index`` matches are read, and
+        they are decompressed and matched one batch at a time.
+        """
+        marker = conversationcodec.MARKER
+        columns = f"{', '.join(CONVERSATION_LIST_COLUMNS)}, conversation"
+        # SQL Server's LIKE knows [...] character sets, SQLite's does not.
+        char_classes = self.backend.dialect == 'mssql'
+        thread_ids = index.like_threads(pattern, char_classes)
+        matches_pattern = conversationcodec.like_matcher(pattern, char_classes)
+        cursor = self._new_cursor(read=True)
+        try:
+            matches = []
+            for start in range(0, len(thread_ids), MAX_QUERY_PARAMS):
+                query, params = select_in(columns, 'conversations', 'thread_id', thread_ids[start:start + MAX_QUERY_PARAMS])
+                cursor.execute(f"{query} AND conversation LIKE '{marker}%'", params)
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        text = conversationcodec.decode(row[-1])
+                        if matches_pattern(text):
+                            matches.append((tuple(row[:-1]), text))
+            return sorted(matches, key=lambda match: match[0][0])
+        finally:
+            cursor.close()
+
+    def _candidate_index(self):
+        """
+        The search index compressed conversations can be preselected with: only when one is configured
+        (CONVERSATION_SEARCH_INDEX, or opened with search_index()) and the change log lets it see updates
+        of existing rows. Brought up to date before it is used.
+        """
+        if self.backend.key not in _search_indexes and not os.getenv('CONVERSATION_SEARCH_INDEX'):
+            return None
+        if not self._has_change_log():
+            return None
+        index = _search_indexes.get(self.backend.key) or self.search_index()
+        with index.refresh_lock, on_primary(self):
+            self.refresh_search_index(index)
+        return index
+
+    def fetch_conversation(self, thread_id):
+        """
+        Fetches the full conversation text for one thread.
+
+        Parameters:
+        - thread_id: The thread to load.
+
+        Returns:
+        - The conversation text, or None if the thread does not exist.
+        """
+        writer = _writers.get(self.backend.key)
+        if writer is not None:
+            pending = writer.pending_conversation(thread_id)
+            if pending is not None:
+                return pending
+        self.cursor.execute("SELECT conversation FROM conversations WHERE thread_id = ?", (thread_id,))
+        row = self.cursor.fetchone()
+        return conversationcodec.decode(row[0]) if row else None
+
+    def _facet_groups(self):
+        """
+        Returns the (app_name, user_name, thread_id, count, max id) groups of the whole table and its gaps.
+        The rows within GAP_WINDOW of the newest id are returned one by one (count 1), in the same query, so
+        the ids that were not committed yet are known.
+        """
+        self.cursor.execute("SELECT MAX(id) FROM conversations")
+        cutoff = max((self.cursor.fetchone()[0] or 0) - GAP_WINDOW, 0)
+        self.cursor.execute(
+            "SELECT app_name, user_name, thread_id, COUNT(*), MAX(id) FROM conversations WHERE id <= ? "
+            "GROUP BY app_name, user_name, thread_id "
+            "UNION ALL SELECT app_name, user_name, thread_id, 1, id FROM conversations WHERE id > ?", (cutoff, cutoff))
+        groups = self.cursor.fetchall()
+        seen = [group[4] for group in groups if group[4] > cutoff]
+        return groups, open_gaps((), seen, cutoff, max(seen, default=cutoff))
+
+    def _new_facet_rows(self, index):
+        """
+        Returns the rows added since the facets were last read, as groups of one, and the gaps left.
+        """
+        condition, params = after_mark('id', index.high_water_mark, index.gaps)
+        self.cursor.execute(f"SELECT app_name, user_name, thread_id, 1, id FROM conversations WHERE {condition}", params)
+        rows = self.cursor.fetchall()
+        seen = [row[4] for row in rows]
+        return rows, open_gaps(index.gaps, seen, index.high_water_mark, max(seen + [index.high_water_mark]))
+
+    def facets(self):
+        """
+        Returns the process-wide ConversationFacets for this database: the app_name / user_name -> thread_id
+        tree with counts used by the selection dropdowns.
+
+        The first call loads it with one grouped query. Later calls reuse it, merging in conversations
+        added since the last check at most every FACETS_REFRESH_INTERVAL seconds, and reloading it fully
+        every FACETS_MAX_AGE seconds. Rows that commit after rows with a higher id are merged in by a later
+        check (see dbmarks).
+        """
+        index = _facet_indexes.get(self.backend.key)
+        now = time.monotonic()
+        with on_primary(self):
+            if index is None or now - index.loaded_at > FACETS_MAX_AGE:
+                index = index or ConversationFacets()
+                index.load(*self._facet_groups())
+                _facet_indexes[self.backend.key] = index
+            elif index.refreshed_at is None or now - index.refreshed_at > FACETS_REFRESH_INTERVAL:
+                index.add(*self._new_facet_rows(index))
+        return index
+
+    def fetch_conversations(self, thread_ids):
+        """
+        Fetches the full conversation text of many threads, a thread's rows joined in id order.
+
+        Parameters:
+        - thread_ids: The threads to load.
+
+        Returns:
+        - A dictionary of thread_id -> conversation text; threads that do not exist are left out.
+        """
+        rows = []
+        thread_ids = list(dict.fromkeys(thread_ids))
+        for start in range(0, len(thread_ids), MAX_QUERY_PARAMS):
+            chunk = thread_ids[start:start + MAX_QUERY_PARAMS]
+            self.cursor.execute(*select_in('id, thread_id, conversation', 'conversations', 'thread_id', chunk))
+            rows.extend(self.cursor.fetchall())
+        conversations = {}
+        for _, thread_id, conversation in sorted(rows, key=lambda row: row[0]):
+            conversations.setdefault(thread_id, []).append(conversationcodec.decode(conversation))
+        return {thread_id: "\n".join(texts) for thread_id, texts in conversations.items()}
+
+    def _has_change_log(self):
+        """
+        Whether the conversation_changes table exists. Checked once per backend.
+        """
+        available = _change_log_available.get(self.backend.key)
+        if available is None:
+            try:
+                self.cursor.execute("SELECT COUNT(*) FROM conversation_changes WHERE 1 = 0")
+                self.cursor.fetchall()
+                available = True
+            except self.backend.error:
+                available = False
+            _change_log_available[self.backend.key] = available
+        return available
+
+    def create_change_log(self):
+        """
+        Creates the conversation_changes table and the triggers that record every insert, update and delete
+        of a conversation in it, so the search index also picks up changes to existing threads, whichever
+        client made them. Does nothing if they already exist.
+        """
+        for statement in CONVERSATION_CHANGE_LOG_DDL[self.backend.dialect]:
+            self.cursor.execute(statement)
+        self.conn.commit()
+        _change_log_available[self.backend.key] = True
+
+    def _index_threads(self, index, thread_ids, **marks):
+        conversations = self.fetch_conversations(thread_ids)
+        deleted = [thread_id for thread_id in dict.fromkeys(thread_ids) if thread_id not in conversations]
+        index.apply(conversations, deleted, **marks)
+        return len(conversations), len(deleted)
+
+    def refresh_search_index(self, index, batch_size=1000):
+        """
+        Brings a conversationindex.ConversationSearchIndex up to date, one batch and one index transaction at
+        a time, so an interrupted refresh continues where it stopped.
+
+        The threads of the conversations inserted since the last refresh (by id) are (re-)indexed. Threads
+        whose rows were updated or deleted are picked up from the change log (see create_change_log); without
+        it, changes to existing rows are only seen when the thread gets a new row. Ids below a mark that were
+        not committed yet when it moved are kept as gaps in the index and looked for again (see dbmarks).
+
+        Parameters:
+        - index: The ConversationSearchIndex to refresh.
+        - batch_size: The number of conversation rows or changes read per batch.
+
+        Returns:
+        - A dictionary with the number of threads 'indexed' and 'deleted'.
+        """
+        result = {'indexed': 0, 'deleted': 0}
+        last_id, last_change_id = index.high_water_marks()
+        if self._has_change_log() and last_change_id is None:
+            # Changes made while the rows are read below are in the log after this mark.
+            self.cursor.execute("SELECT MAX(change_id) FROM conversation_changes")
+            last_change_id = self.cursor.fetchone()[0] or 0
+            index.apply({}, last_change_id=last_change_id)
+        if self.backend.dialect == 'mssql':
+            new_rows = "SELECT TOP (?) id, thread_id FROM conversations WHERE id > ? ORDER BY id"
+            changes = "SELECT TOP (?) change_id, thread_id FROM conversation_changes WHERE change_id > ? ORDER BY change_id"
+        else:
+            new_rows = "SELECT id, thread_id FROM conversations WHERE id > ? ORDER BY id LIMIT ?"
+            changes = "SELECT change_id, thread_id FROM conversation_changes WHERE change_id > ? ORDER BY change_id LIMIT ?"
+        batches = [(new_rows, 'conversations', 'id', 'last_id', last_id or 0)]
+        if last_change_id is not None:
+            batches.append((changes, 'conversation_changes', 'change_id', 'last_change_id', last_change_id))
+
+        def index_rows(rows, mark, position, gaps):
+            indexed, deleted = self._index_threads(index, [row[1] for row in rows], **{mark: position},
+                                                   gaps={mark: gaps})
+            result['indexed'] += indexed
+            result['deleted'] += deleted
+
+        for query, table, column, mark, position in batches:
+            # Rows with a lower id can commit after the mark moved past them: look for the gaps again.
+            gaps = index.gaps(mark)
+            if gaps:
+                self.cursor.execute(*select_in(f"{column}, thread_id", table, column, sorted(gaps)))
+                rows = self.cursor.fetchall()
+                gaps = open_gaps(gaps, [row[0] for row in rows], position, position)
+                index_rows(rows, mark, position, gaps)
+            while True:
+                params = [batch_size, position] if self.backend.dialect == 'mssql' else [position, batch_size]
+                self.cursor.execute(query, params)
+                rows = self.cursor.fetchall()
+                if not rows:
+                    break
+                gaps = open_gaps(gaps, [row[0] for row in rows], position, rows[-1][0])
+                position = rows[-1][0]
+                index_rows(rows, mark, position, gaps)
+        index.refreshed_at = time.monotonic()
+        return result
+
+    def search_index(self, path=None):
+        """
+        Returns the process-wide conversationindex.ConversationSearchIndex for this database, stored in
+        ``path`` (default: SEARCH_INDEX_PATH), refreshed at most every SEARCH_INDEX_REFRESH_INTERVAL seconds.
+        The first refresh of a new index reads the whole table; build it ahead of time with
+        refresh_search_index() for large tables.
+        """
+        with _search_indexes_lock:
+            index = _search_indexes.get(self.backend.key)
+            if index is None:
+                from conversationindex import ConversationSearchIndex
+                index = _search_indexes[self.backend.key] = ConversationSearchIndex(path or SEARCH_INDEX_PATH)
+        if index.refreshed_at is None or time.monotonic() - index.refreshed_at > SEARCH_INDEX_REFRESH_INTERVAL:
+            # One refresh at a time; other searches meanwhile use the index as it is.
+            if index.refresh_lock.acquire(blocking=False):
+                try:
+                    with on_primary(self):
+                        self.refresh_search_index(index)
+                finally:
+                    index.refresh_lock.release()
+        return index
+
+    def search_conversations_ranked(self, query, limit=20, preview_length=200):
+        """
+        Finds the conversations best matching a query in the local full-text index (see search_index) and
+        fetches their metadata and a short preview by thread_id, without scanning the conversations table.
+
+        Parameters:
+        - query: Words that must all occur in the conversation; "quoted text" must occur as a phrase.
+        - limit: The maximum number of threads to return.
+        - preview_length: The number of characters of the conversation to include as 'preview'.
+
+        Returns:
+        - A DataFrame with the id, app_name, user_name, thread_id, preview and conversation_length columns
+          and the thread's relevance 'score', best match first. Threads with several rows return each row.
+        """
+        import pandas as pd
+
+        scores = dict(self.search_index().search(query, limit))
+        if not scores:
+            return pd.DataFrame(columns=CONVERSATION_LIST_COLUMNS + ['preview', 'conversation_length', 'score'])
+        select, params = select_in(self._preview_columns(), 'conversations', 'thread_id', list(scores))
+        df = self._preview_frame(select, [preview_length] + list(params), preview_length)
+        df['score'] = df['thread_id'].map(scores)
+        return df.sort_values(['score', 'id'], ascending=[False, True], ignore_index=True)
+
+    def insert_conversation(self, app_name, user_name, thread_id, conversation):
+        """
+        Inserts a new conversation.
+
+        Returns:
+        - The number of inserted rows.
+        """
+        self.cursor.execute(
+            "INSERT INTO conversations (app_name, user_name, thread_id, conversation) VALUES (?, ?, ?, ?)",
+            (app_name, user_name, thread_id, self._encode(conversation)))
+        count = self.cursor.rowcount
+        self.conn.commit()
+        self.routing.pin()
+        index = _facet_indexes.get(self.backend.key)
+        if index is not None:
+            index.refreshed_at = None  # merge the new row on the next facets() call
+        return count
+
+    def update_conversation(self, thread_id, conversation):
+        """
+        Replaces the conversation text of a thread.
+
+        Returns:
+        - The number of updated rows.
+        """
+        self.cursor.execute("UPDATE conversations SET conversation = ? WHERE thread_id = ?",
+                            (self._encode(conversation), thread_id))
+        count = self.cursor.rowcount
+        self.conn.commit()
+        self.routing.pin()
+        return count
+
+    def delete_conversation(self, thread_id):
+        """
+        Deletes every conversation row of a thread and drops the thread from the facets.
+
+        Returns:
+        - The number of deleted rows.
+        """
+        writer = _writers.get(self.backend.key)
+        if writer is not None:
+            writer.discard(thread_id)
+        self.cursor.execute("DELETE FROM conversations WHERE thread_id = ?", (thread_id,))
+        count = self.cursor.rowcount
+        self.conn.commit()
+        self.routing.pin()
+        index = _facet_indexes.get(self.backend.key)
+        if index is not None:
+            index.remove_thread(thread_id)
+        return count
+
+    def write_conversations(self, writes):
+        """
+        Applies many conversation writes in order, in one transaction, with consecutive writes of the same
+        kind sent as one batched statement.
+
+        Parameters:
+        - writes: (kind, app_name, user_name, thread_id, conversation) tuples, where kind is 'insert' (add a
+          row), 'update' (replace the text of an existing thread) or 'save' (update the thread if it exists,
+          insert it otherwise).
+
+        Returns:
+        - A dictionary with the number of 'inserted' and 'updated' rows.
+        """
+        saves = [write for write in writes if write[0] == 'save']
+        existing = set()
+        thread_ids = [write[3] for write in saves]
+        for start in range(0, len(thread_ids), MAX_QUERY_PARAMS):
+            chunk = thread_ids[start:start + MAX_QUERY_PARAMS]
+            self.cursor.execute(*select_in('DISTINCT thread_id', 'conversations', 'thread_id', chunk))
+            existing.update(row[0] for row in self.cursor.fetchall())
+
+        insert = "INSERT INTO conversations (app_name, user_name, thread_id, conversation) VALUES (?, ?, ?, ?)"
+        update = "UPDATE conversations SET conversation = ? WHERE thread_id = ?"
+        statements = []  # (statement, parameter rows) for each run of consecutive writes of the same kind
+        counts = {'inserted': 0, 'updated': 0}
+        for kind, app_name, user_name, thread_id, conversation in writes:
+            if kind == 'insert' or (kind == 'save' and thread_id not in existing):
+                statement, params = insert, (app_name, user_name, thread_id, self._encode(conversation))
+                existing.add(thread_id)  # a later save of the thread in this batch updates the new row
+                counts['inserted'] += 1
+            else:
+                statement, params = update, (self._encode(conversation), thread_id)
+                counts['updated'] += 1
+            if statements and statements[-1][0] == statement:
+                statements[-1][1].append(params)
+            else:
+                statements.append((statement, [params]))
+        if self.backend.dialect == 'mssql':
+            self.cursor.fast_executemany = True
+        try:
+            for statement, rows in statements:
+                self.cursor.executemany(statement, rows)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            if self.backend.dialect == 'mssql':
+                self.cursor.fast_executemany = False
+        self.routing.pin()
+        index = _facet_indexes.get(self.backend.key)
+        if index is not None and counts['inserted']:
+            index.refreshed_at = None
+        return counts
+
+    def background_writer(self, **options):
+        """
+        Returns the process-wide write-behind ConversationWriter for this database, starting it on first use.
+        Its insert/update/save calls only queue the write and return; see conversationwriter.ConversationWriter
+        for the batching options, which apply when the writer is created.
+        """
+        with _writers_lock:
+            writer = _writers.get(self.backend.key)
+            if writer is None or writer.closed:
+                from conversationwriter import ConversationWriter
+                backend, instrumentation, compress = self.backend, self.instrumentation, self.compress
+                writer = ConversationWriter(
+                    lambda: ConversationDatabaseManager(backend=backend, instrumentation=instrumentation,
+                                                        compress=compress), **options)
+                _writers[self.backend.key] = writer
+            return writer
+
+    def migrate_compression(self, batch_size=200, max_batches=None, pause=0.0, stop=None):
+        """
+        Compresses existing plain-text conversations in place, one batch and one commit at a time, in id order.
+        A row is only replaced if its text has not changed since it was read, so concurrent edits are kept.
+
+        Parameters:
+        - batch_size: The number of rows read and rewritten per transaction.
+        - max_batches: Stop after this many batches (None for all rows).
+        - pause: Seconds to sleep between batches, to leave room for other load.
+        - stop: An optional threading.Event that ends the migration after the current batch.
+
+        Returns:
+        - A dictionary with the rows 'scanned' and 'compressed', the 'original_chars' and 'stored_chars' of the
+          compressed rows, and the 'last_id' reached.
+        """
+        marker = conversationcodec.MARKER
+        if self.backend.dialect == 'mssql':
+            query = (f"SELECT TOP (?) id, conversation FROM conversations "
+                     f"WHERE id > ? AND conversation NOT LIKE '{marker}%' ORDER BY id")
+        else:
+            query = (f"SELECT id, conversation FROM conversations "
+                     f"WHERE id > ? AND conversation NOT LIKE '{marker}%' ORDER BY id LIMIT ?")
+        result = {'scanned': 0, 'compressed': 0, 'original_chars': 0, 'stored_chars': 0, 'last_id': 0}
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            if stop is not None and stop.is_set():
+                break
+            params = [batch_size, result['last_id']] if self.backend.dialect == 'mssql' else [result['last_id'], batch_size]
+            self.cursor.execute(query, params)
+            rows = self.cursor.fetchall()
+            if not rows:
+                break
+            updates = []
+            for row_id, conversation in rows:
+                encoded = conversationcodec.encode(conversation)
+                if encoded is not conversation:
+                    updates.append((encoded, row_id, conversation))
+                    result['original_chars'] += len(conversation)
+                    result['stored_chars'] += len(encoded)
+            try:
+                if updates:
+                    self.cursor.executemany("UPDATE conversations SET conversation = ? WHERE id = ? AND conversation = ?",
+                                            updates)
+                self.conn.commit()
+                self.routing.pin()
+            except Exception:
+                self.conn.rollback()
+                raise
+            result['scanned'] += len(rows)
+            result['compressed'] += len(updates)
+            result['last_id'] = rows[-1][0]
+            batches += 1
+            if pause:
+                time.sleep(pause)
+        return result
+
+    def start_compression_migration(self, **options):
+        """
+        Runs migrate_compression on a background thread with its own connection.
+
+        Returns:
+        - The started thread and a threading.Event that stops it after the current batch. The thread's
+          'result' attribute holds the migration result once it has finished.
+        """
+        stop = threading.Event()
+        backend, instrumentation = self.backend, self.instrumentation
+
+        def run():
+            with ConversationDatabaseManager(backend=backend, instrumentation=instrumentation) as db:
+                thread.result = db.migrate_compression(stop=stop, **options)
+
+        thread = threading.Thread(target=run, name="conversation-compression", daemon=True)
+        thread.result = None
+        thread.start()
+        return thread, stop
+
+    def compression_stats(self):
+        """
+        Returns the process-wide compression counters: compression ratio, characters before and after, and
+        average compression and decompression time (see conversationcodec.CompressionStats).
+        """
+        return conversationcodec.compression_stats.stats()
+
+
+# Methods that only read; they run on the read backend when one is configured.
+READ_METHODS = [
+    'query_frame', 'fetch_distinct_column_values', 'fetch_records_by_column', 'fetch_thread_ids',
+    'fetch_distinct_thread_ids', 'list_conversations', 'search_conversations', 'fetch_conversation', 'facets',
+    'fetch_conversations', 'search_conversations_ranked',
+]
+route_reads(ConversationDatabaseManager, READ_METHODS)
@@ -0,0 +1,93 @@
+import threading
+import time
+from collections import defaultdict
+
+FACET_COLUMNS = ('app_name', 'user_name')
+
+
+class ConversationFacets:
+    """
+    An in-memory app_name / user_name -> thread_id tree over the conversations table, with row counts.
+
+    It is filled from (app_name, user_name, thread_id, count, max id) groups. New conversations are
+    merged in by reading only the rows above the highest id seen so far (the high-water mark), and the ids
+    below it that had not been committed yet when it moved (the gaps, see dbmarks).
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.high_water_mark = 0
+        self.gaps = set()
+        self.loaded_at = None
+        self.refreshed_at = None
+        self._clear()
+
+    def _clear(self):
+        # column -> value -> thread_id -> number of conversation rows
+        self._tree = {column: defaultdict(lambda: defaultdict(int)) for column in FACET_COLUMNS}
+
+    def load(self, groups, gaps=()):
+        """
+        Replaces the contents with (app_name, user_name, thread_id, count, max_id) groups.
+        """
+        with self._lock:
+            self._clear()
+            self.high_water_mark = 0
+            self._add(groups)
+            self.gaps = set(gaps)
+            self.loaded_at = self.refreshed_at = time.monotonic()
+
+    def add(self, groups, gaps=()):
+        """
+        Merges the groups of newly inserted conversations and replaces the gaps.
+        """
+        with self._lock:
+            self._add(groups)
+            self.gaps = set(gaps)
+            self.refreshed_at = time.monotonic()
+
+    def _add(self, groups):
+        for app_name, user_name, thread_id, count, max_id in groups:
+            self._tree['app_name'][app_name][thread_id] += count
+            self._tree['user_name'][user_name][thread_id] += count
+            if max_id is not None and max_id > self.high_water_mark:
+                self.high_water_mark = max_id
+
+    def remove_thread(self, thread_id):
+        """
+        Drops a deleted thread from every facet.
+        """
+        with self._lock:
+            for values in self._tree.values():
+                for value in [value for value, threads in values.items() if thread_id in threads]:
+                    del values[value][thread_id]
+                    if not values[value]:
+                        del values[value]
+
+    def values(self, column):
+        """
+        Returns the distinct values of ``column`` ('app_name' or 'user_name'), sorted.
+        """
+        with self._lock:
+            return sorted(self._tree[column])
+
+    def counts(self, column):
+        """
+        Returns {value: number of conversations} for ``column``.
+        """
+        with self._lock:
+            return {value: sum(threads.values()) for value, threads in self._tree[column].items()}
+
+    def thread_ids(self, column, value):
+        """
+        Returns the sorted thread IDs of the conversations where ``column`` equals ``value``.
+        """
+        with self._lock:
+            threads = self._tree[column].get(value)
+            return sorted(threads) if threads else []
+
+    def thread_counts(self, column, value):
+        """
+        Returns {thread_id: number of conversation rows} where ``column`` equals ``value``.
+        """
+        with self._lock:
+            return dict(self._tree[column].get(value, {}))
@@ -0,0 +1,212 @@
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+
+from conversationcodec import like_matcher
+
+# The index is an SQLite FTS5 table: a tokenized inverted index (term -> documents and positions) stored in
+# b-trees on disk, which answers term and phrase queries from the postings and ranks them with BM25.
+# Conversation bodies are JSON, so the tokenizer drops the punctuation and folds case and diacritics
+# (e.g. "Beograd" and "beograd", "čćž" and "ccz" match).
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS indexed_threads (
+    doc_id INTEGER PRIMARY KEY,
+    thread_id TEXT NOT NULL UNIQUE
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS conversation_text USING fts5(
+    conversation, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS index_state (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS index_gaps (
+    name TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (name, id)
+);
+"""
+
+_QUERY_PARTS = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'[^\W_]+')
+_WILDCARDS = re.compile('[%_]')
+_CLASS_WILDCARDS = re.compile(r'[%_]|\[[^\]]+\]')
+
+
+def fts_query(text):
+    """
+    Turns a search box string into an FTS5 query: "quoted text" is a phrase, every other word a term, and a
+    conversation must contain all of them. Operators and special characters are matched literally.
+    Returns None if the string has nothing to search for.
+    """
+    parts = []
+    for phrase, term in _QUERY_PARTS.findall(text):
+        part = (phrase or term).strip()
+        if part:
+            parts.append('"' + part.replace('"', '""') + '"')
+    return " ".join(parts) or None
+
+
+def like_fts_query(pattern, char_classes=False):
+    """
+    Returns an FTS5 query that every text matching ``LIKE pattern`` also matches, or None if the pattern has
+    no word the index can look up. A word inside the pattern must occur whole; a word that ends the pattern
+    or a wildcard may be the start of a longer word; a word that starts it may be the end of one, so it is
+    left out. With ``char_classes`` a ``[...]`` set is a wildcard too (see conversationcodec.like_matcher).
+    """
+    terms = []
+    for segment in re.split(_CLASS_WILDCARDS if char_classes else _WILDCARDS, pattern):
+        for word in _WORD.finditer(segment):
+            start, end = word.span()
+            if start == 0 or not _separator(segment[start - 1]):
+                continue
+            terms.append(f'"{word.group()}"' + ('' if end < len(segment) and _separator(segment[end]) else '*'))
+    return " ".join(terms) or None
+
+
+def _separator(char):
+    # Punctuation, symbols, spaces and control characters separate tokens; combining marks do not.
+    return unicodedata.category(char)[0] in 'PSZC'
+
+
+class ConversationSearchIndex:
+    """
+    A local, persistent full-text index of conversations keyed by thread_id.
+
+    Each thread is one document holding the text of all its rows. refresh() (see
+    ConversationDatabaseManager.refresh_search_index) adds the rows inserted since the last refresh and
+    re-indexes the threads changed since then, so keeping the index current costs one pass over the new
+    rows rather than over the table. search() returns the best matching thread_ids, which are then
+    fetched from the database by key.
+    """
+    def __init__(self, path):
+        """
+        :param path: The SQLite file holding the index. It is created if it does not exist.
+        """
+        self.path = path
+        self.refreshed_at = None  # time.monotonic() of the last refresh, see ConversationDatabaseManager.search_index
+        self._lock = threading.Lock()
+        self.refresh_lock = threading.Lock()  # held by the refresh in progress
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self.conn.executescript(INDEX_SCHEMA)
+        except sqlite3.OperationalError as e:
+            self.conn.close()
+            raise RuntimeError(f"SQLite {sqlite3.sqlite_version} was built without FTS5: {e}") from e
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def high_water_marks(self):
+        """
+        Returns the last conversation id and the last change log id the index has seen (None when it has
+        not seen any yet).
+        """
+        with self._lock:
+            state = dict(self.conn.execute("SELECT name, value FROM index_state"))
+        return state.get('last_id'), state.get('last_change_id')
+
+    def gaps(self, name):
+        """
+        Returns the ids at or below the high-water mark ``name`` ('last_id' or 'last_change_id') that had not
+        been committed when the mark moved past them (see dbmarks).
+        """
+        with self._lock:
+            return {row[0] for row in self.conn.execute("SELECT id FROM index_gaps WHERE name = ?", (name,))}
+
+    def apply(self, conversations, deleted=(), last_id=None, last_change_id=None, gaps=None):
+        """
+        Stores the current text of some threads and drops deleted threads in one transaction, and moves the
+        high-water marks forward.
+
+        :param conversations: A dict of thread_id -> full conversation text, replacing what is indexed.
+        :param deleted: thread_ids to drop from the index.
+        :param last_id: The last conversation id covered, or None to keep the current mark.
+        :param last_change_id: The last change log id covered, or None to keep the current mark.
+        :param gaps: A dict of mark name -> ids replacing the gaps stored for that mark (see gaps()).
+        """
+        with self._lock:
+            with self.conn:
+                for thread_id in list(deleted) + list(conversations):
+                    row = self.conn.execute("SELECT doc_id FROM indexed_threads WHERE thread_id = ?",
+                                            (thread_id,)).fetchone()
+                    if row is not None:
+                        self.conn.execute("DELETE FROM conversation_text WHERE rowid = ?", row)
+                        self.conn.execute("DELETE FROM indexed_threads WHERE doc_id = ?", row)
+                for thread_id, text in conversations.items():
+                    doc_id = self.conn.execute("INSERT INTO indexed_threads (thread_id) VALUES (?)",
+                                               (thread_id,)).lastrowid
+                    self.conn.execute("INSERT INTO conversation_text (rowid, conversation) VALUES (?, ?)",
+                                      (doc_id, text))
+                for name, value in (('last_id', last_id), ('last_change_id', last_change_id)):
+                    if value is not None:
+                        self.conn.execute("INSERT OR REPLACE INTO index_state (name, value) VALUES (?, ?)",
+                                          (name, value))
+                for name, ids in (gaps or {}).items():
+                    self.conn.execute("DELETE FROM index_gaps WHERE name = ?", (name,))
+                    self.conn.executemany("INSERT INTO index_gaps (name, id) VALUES (?, ?)", [(name, id_) for id_ in ids])
+
+    def search(self, query, limit=20):
+        """
+        Returns up to ``limit`` (thread_id, score) pairs for the conversations containing every term and
+        phrase of ``query`` (see fts_query), best match first. The score is the BM25 relevance: higher is
+        better.
+        """
+        match = fts_query(query)
+        if match is None:
+            return []
+        with self._lock:
+            return self.conn.execute(
+                "SELECT t.thread_id, -c.rank FROM conversation_text c JOIN indexed_threads t ON t.doc_id = c.rowid "
+                "WHERE conversation_text MATCH ? ORDER BY c.rank LIMIT ?", (match, limit)).fetchall()
+
+    def like_threads(self, pattern, char_classes=False):
+        """
+        Returns the thread_ids whose indexed text matches a case-insensitive ``LIKE pattern``: candidates for
+        an exact match against the database rows. The words of the pattern are looked up in the index first
+        (see like_fts_query); the pattern itself is then matched against the stored text of those threads,
+        or of every thread if it has no such word. ``char_classes`` is passed on to like_matcher.
+        """
+        match = like_fts_query(pattern, char_classes)
+        # SQLite's LIKE only folds the case of ASCII letters and has no [...] sets
+        native = pattern.isascii() and not (char_classes and '[' in pattern)
+        query = "SELECT t.thread_id FROM conversation_text c JOIN indexed_threads t ON t.doc_id = c.rowid WHERE "
+        params = []
+        if match is not None:
+            query += "conversation_text MATCH ? AND "
+            params.append(match)
+        if native:
+            query += "c.conversation LIKE ?"
+            params.append(pattern)
+        else:
+            query += "like_matches(c.conversation)"
+        with self._lock:
+            if not native:
+                matches = like_matcher(pattern, char_classes)
+                self.conn.create_function('like_matches', 1, lambda text: matches(text) is not None)
+            return [row[0] for row in self.conn.execute(query, params)]
+
+    def optimize(self):
+        """
+        Merges the index segments left by incremental refreshes, which makes queries faster.
+        """
+        with self._lock:
+            with self.conn:
+                self.conn.execute("INSERT INTO conversation_text (conversation_text) VALUES ('optimize')")
+
+    def stats(self):
+        with self._lock:
+            threads = self.conn.execute("SELECT COUNT(*) FROM indexed_threads").fetchone()[0]
+            pages, page_size = (self.conn.execute(f"PRAGMA {name}").fetchone()[0] for name in ('page_count', 'page_size'))
+        last_id, last_change_id = self.high_water_marks()
+        return {"threads": threads, "bytes": pages * page_size, "last_id": last_id, "last_change_id": last_change_id,
+                "refreshed_seconds_ago": None if self.refreshed_at is None else time.monotonic() - self.refreshed_at}
@@ -0,0 +1,213 @@
+import atexit
+import os
+import threading
+import time
+
+# Defaults for ConversationWriter; the environment variables apply to the process-wide writer.
+DEFAULT_MAX_BATCH = int(os.getenv('CONVERSATION_WRITER_MAX_BATCH', '500'))
+DEFAULT_FLUSH_INTERVAL = float(os.getenv('CONVERSATION_WRITER_FLUSH_INTERVAL', '1.0'))
+
+
+class ConversationWriter:
+    """
+    A write-behind queue for conversation inserts and updates.
+
+    insert(), update() and save() only record the write and return. An update or save is coalesced with the
+    queued update or save of the same thread, so a thread updated many times between flushes costs a single
+    row write; inserts add a row each and are always queued on their own. A background thread applies the
+    queue in order with ConversationDatabaseManager.write_conversations, one transaction per batch, whenever
+    ``max_batch`` writes are pending or ``flush_interval`` seconds have passed. close() (also run at
+    interpreter exit) flushes whatever is still queued.
+
+    A batch that fails is put back in front of any newer writes to the same threads and retried on the next
+    flush, so a transient database error does not lose data.
+    """
+    def __init__(self, manager_factory, max_batch=DEFAULT_MAX_BATCH, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        """
+        :param manager_factory: Returns a new ConversationDatabaseManager for the target database.
+        :param max_batch: The number of pending writes that triggers a flush.
+        :param flush_interval: The longest time in seconds a write waits in the queue.
+        """
+        self.manager_factory = manager_factory
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.closed = False
+        self.last_error = None  # the exception of the last failed write attempt, None once a batch succeeds
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # one batch in flight at a time
+        self._pending = []  # (kind, app_name, user_name, thread_id, conversation) writes, in arrival order
+        self._last = {}  # thread_id -> index in _pending of the thread's newest write
+        self._in_flight = {}  # thread_id -> newest text in the batch being written, served until committed
+        self._discarded = set()  # threads of the batch being written that were discarded meanwhile
+        self._flush_requested = False
+        self._generation = 0  # number of completed flush attempts, for flush() waiters
+        self._stats = {"queued": 0, "coalesced": 0, "batches": 0, "rows_written": 0, "failures": 0,
+                       "flush_seconds": 0.0}
+        self._thread = threading.Thread(target=self._run, name="conversation-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def insert(self, app_name, user_name, thread_id, conversation):
+        """
+        Queues a new conversation row.
+        """
+        self._queue(('insert', app_name, user_name, thread_id, conversation))
+
+    def update(self, thread_id, conversation):
+        """
+        Queues a replacement of the conversation text of an existing thread.
+        """
+        self._queue(('update', None, None, thread_id, conversation))
+
+    def save(self, app_name, user_name, thread_id, conversation):
+        """
+        Queues a write that updates the thread if it exists and inserts it otherwise.
+        """
+        self._queue(('save', app_name, user_name, thread_id, conversation))
+
+    def _queue(self, write):
+        with self._lock:
+            if self.closed:
+                raise RuntimeError("ConversationWriter is closed")
+            thread_id = write[3]
+            index = self._last.get(thread_id)
+            if write[0] != 'insert' and index is not None and self._pending[index][0] != 'insert':
+                self._stats["coalesced"] += 1
+                self._pending[index] = self._coalesce(self._pending[index], write)
+            else:
+                self._last[thread_id] = len(self._pending)
+                self._pending.append(write)
+            self._stats["queued"] += 1
+            if len(self._pending) >= self.max_batch:
+                self._flush_requested = True
+                self._wakeup.notify()
+
+    @staticmethod
+    def _coalesce(previous, write):
+        """
+        Combines a queued update or save of a thread with a newer update or save of it into one write that
+        leaves the same final state. Inserts add a row rather than replace the thread's text, so they are
+        never combined.
+        """
+        kind, app_name, user_name, thread_id, conversation = write
+        if kind == 'update':
+            # An update after a save still inserts the thread if the save would have
+            return previous[:4] + (conversation,)
+        # A save after an update inserts the thread if the update found nothing to replace
+        return write
+
+    def pending_conversation(self, thread_id):
+        """
+        Returns the queued conversation text for a thread, or None if nothing is queued for it.
+        """
+        with self._lock:
+            index = self._last.get(thread_id)
+            return self._pending[index][4] if index is not None else self._in_flight.get(thread_id)
+
+    def discard(self, thread_id):
+        """
+        Drops any queued write for a thread, e.g. because the thread is being deleted. If the batch being
+        written contains the thread, its chunks not yet sent skip it, and discard() waits until the batch is
+        done so that a chunk already sent cannot commit after a delete that follows.
+        """
+        with self._lock:
+            if thread_id in self._last:
+                self._pending = [write for write in self._pending if write[3] != thread_id]
+                self._reindex()
+            if thread_id in self._in_flight and threading.current_thread() is not self._thread:
+                self._discarded.add(thread_id)
+                generation = self._generation
+                self._flushed.wait_for(lambda: self._generation > generation)
+
+    def flush(self, timeout=None):
+        """
+        Asks the background thread to write everything queued so far and waits until it is written or a
+        write attempt has failed (see last_error). Returns True if nothing was left queued.
+        """
+        with self._lock:
+            if not self._pending and not self._in_flight:
+                return True
+            # The batch in flight may predate this call, so wait for the attempt after it as well
+            target = self._generation + (2 if self._in_flight else 1)
+            self._flush_requested = True
+            self._wakeup.notify()
+            self._flushed.wait_for(lambda: self._generation >= target or not (self._pending or self._in_flight),
+                                   timeout)
+            return not self._pending and not self._in_flight
+
+    def close(self, timeout=30.0):
+        """
+        Flushes the queue and stops the background thread. Safe to call more than once.
+        """
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout)
+        self._write_batch()  # anything queued while the thread was stopping
+        atexit.unregister(self.close)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        return stats
+
+    def _run(self):
+        while True:
+            with self._lock:
+                self._wakeup.wait_for(lambda: self._flush_requested or self.closed, self.flush_interval)
+                self._flush_requested = False
+                closing = self.closed
+            self._write_batch()
+            if closing:
+                return
+
+    def _write_batch(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending, self._last = self._pending, [], {}
+                self._in_flight = {write[3]: write[4] for write in batch}
+            if batch:
+                started = time.perf_counter()
+                written = batches = 0
+                error = None
+                try:
+                    with self.manager_factory() as db:
+                        while written < len(batch):
+                            chunk = batch[written:written + self.max_batch]
+                            with self._lock:
+                                writes = [write for write in chunk if write[3] not in self._discarded]
+                            if writes:
+                                db.write_conversations(writes)
+                                batches += 1
+                            written += len(chunk)
+                except Exception as e:
+                    print(f"Failed to write {len(batch) - written} queued conversations: {e}")
+                    error = e
+                    with self._lock:
+                        self._stats["failures"] += 1
+                        self._requeue(batch[written:])
+                with self._lock:
+                    self.last_error = error
+                    self._stats["batches"] += batches
+                    self._stats["rows_written"] += written
+                    self._stats["flush_seconds"] += time.perf_counter() - started
+            with self._lock:
+                self._in_flight = {}
+                self._discarded.clear()
+                self._generation += 1
+                self._flushed.notify_all()
+
+    def _requeue(self, batch):
+        """
+        Puts a failed batch back ahead of the writes queued since; called with the lock held.
+        """
+        self._pending = [write for write in batch if write[3] not in self._discarded] + self._pending
+        self._reindex()
+
+    def _reindex(self):
+        self._last = {write[3]: index for index, write in enumerate(self._pending)}
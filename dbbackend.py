@@ -0,0 +1,251 @@
+import os
+
+
+class MSSQLBackend:
+    """
+    Connects to the production MSSQL server through pyodbc, which is imported on the first connect so that
+    importing the library does not load the ODBC driver manager.
+    """
+    dialect = 'mssql'
+
+    def __init__(self, host=None, user=None, password=None, database=None, read_only=False):
+        """
+        :param read_only: Connect with ApplicationIntent=ReadOnly, for readable secondary replicas.
+        """
+        self.host = host if host is not None else os.getenv('MSSQL_HOST')
+        self.user = user if user is not None else os.getenv('MSSQL_USER')
+        self.password = password if password is not None else os.getenv('MSSQL_PASS')
+        self.database = database if database is not None else os.getenv('MSSQL_DB')
+        self.read_only = read_only
+
+    @property
+    def key(self):
+        """
+        Identifies the pool this backend's connections belong to.
+        """
+        return (self.dialect, self.host, self.database, self.user, self.password, self.read_only)
+
+    @property
+    def error(self):
+        """
+        The base class of the driver's database errors.
+        """
+        import pyodbc
+        return pyodbc.Error
+
+    def connect(self):
+        """
+        Opens a new physical connection to the database.
+        """
+        import pyodbc
+        options = {'ApplicationIntent': 'ReadOnly'} if self.read_only else {}
+        return pyodbc.connect(
+            driver='{ODBC Driver 18 for SQL Server}',
+            server=self.host,
+            database=self.database,
+            uid=self.user,
+            pwd=self.password,
+            TrustServerCertificate='yes',
+            **options
+        )
+
+
+def read_backend_from_env(user=None, password=None, database=None):
+    """
+    Returns a read-only MSSQLBackend for the replica named by MSSQL_READ_HOST, or None if it is not set.
+    """
+    host = os.getenv('MSSQL_READ_HOST')
+    if not host:
+        return None
+    return MSSQLBackend(host, user, password, database, read_only=True)
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS Users (
+    UserID INTEGER PRIMARY KEY,
+    Username TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS PromptVariables (
+    VariableID INTEGER PRIMARY KEY,
+    VariableName TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS PythonFiles (
+    FileID INTEGER PRIMARY KEY,
+    Filename TEXT NOT NULL UNIQUE,
+    FilePath TEXT
+);
+CREATE TABLE IF NOT EXISTS PromptStrings (
+    PromptID INTEGER PRIMARY KEY,
+    PromptName TEXT NOT NULL UNIQUE,
+    PromptString TEXT,
+    Comment TEXT,
+    UserID INTEGER REFERENCES Users(UserID),
+    VariableID INTEGER REFERENCES PromptVariables(VariableID),
+    VariableFileID INTEGER REFERENCES PythonFiles(FileID)
+);
+CREATE TABLE IF NOT EXISTS CentralRelationshipTable (
+    ID INTEGER PRIMARY KEY,
+    PromptID INTEGER REFERENCES PromptStrings(PromptID),
+    UserID INTEGER REFERENCES Users(UserID),
+    VariableID INTEGER REFERENCES PromptVariables(VariableID),
+    FileID INTEGER REFERENCES PythonFiles(FileID)
+);
+CREATE INDEX IF NOT EXISTS IX_PromptStrings_UserID ON PromptStrings(UserID);
+CREATE INDEX IF NOT EXISTS IX_CentralRelationshipTable_PromptID ON CentralRelationshipTable(PromptID);
+CREATE INDEX IF NOT EXISTS IX_CentralRelationshipTable_UserID ON CentralRelationshipTable(UserID);
+CREATE TABLE IF NOT EXISTS PromptStringsChanges (
+    ChangeID INTEGER PRIMARY KEY AUTOINCREMENT,
+    PromptName TEXT NOT NULL,
+    ChangedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS PromptStringRevisions (
+    PromptName TEXT NOT NULL,
+    Revision INTEGER NOT NULL,
+    IsCheckpoint INTEGER NOT NULL,
+    Body TEXT NOT NULL,
+    CreatedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (PromptName, Revision)
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    id INTEGER PRIMARY KEY,
+    app_name TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    thread_id TEXT NOT NULL,
+    conversation TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS IX_conversations_thread_id ON conversations(thread_id);
+"""
+
+# Change log written by PromptDatabase's own write methods; the ChangeID is the delta sync high-water mark.
+CHANGE_LOG_DDL = {
+    'mssql': """
+    IF OBJECT_ID('PromptStringsChanges', 'U') IS NULL
+    CREATE TABLE PromptStringsChanges (
+        ChangeID BIGINT IDENTITY(1,1) PRIMARY KEY,
+        PromptName NVARCHAR(255) NOT NULL,
+        ChangedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+    )
+    """,
+    'sqlite': """
+    CREATE TABLE IF NOT EXISTS PromptStringsChanges (
+        ChangeID INTEGER PRIMARY KEY AUTOINCREMENT,
+        PromptName TEXT NOT NULL,
+        ChangedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+}
+
+# Prompt revision history (see promptrevisions): full text at checkpoints, deltas in between.
+REVISION_LOG_DDL = {
+    'mssql': """
+    IF OBJECT_ID('PromptStringRevisions', 'U') IS NULL
+    CREATE TABLE PromptStringRevisions (
+        PromptName NVARCHAR(255) NOT NULL,
+        Revision INT NOT NULL,
+        IsCheckpoint BIT NOT NULL,
+        Body NVARCHAR(MAX) NOT NULL,
+        CreatedAt DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+        CONSTRAINT PK_PromptStringRevisions PRIMARY KEY (PromptName, Revision)
+    )
+    """,
+    'sqlite': """
+    CREATE TABLE IF NOT EXISTS PromptStringRevisions (
+        PromptName TEXT NOT NULL,
+        Revision INTEGER NOT NULL,
+        IsCheckpoint INTEGER NOT NULL,
+        Body TEXT NOT NULL,
+        CreatedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (PromptName, Revision)
+    )
+    """,
+}
+
+# Change log of the conversations table, filled by triggers so that writes from every client are recorded;
+# the change_id is the high-water mark of the conversation search index. Statements run one at a time.
+CONVERSATION_CHANGE_LOG_DDL = {
+    'mssql': [
+        """
+        IF OBJECT_ID('conversation_changes', 'U') IS NULL
+        CREATE TABLE conversation_changes (
+            change_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+            thread_id NVARCHAR(255) NOT NULL,
+            changed_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME()
+        )
+        """,
+        """
+        CREATE OR ALTER TRIGGER TR_conversations_changes ON conversations
+        AFTER INSERT, UPDATE, DELETE AS
+        BEGIN
+            SET NOCOUNT ON;
+            INSERT INTO conversation_changes (thread_id)
+            SELECT thread_id FROM inserted UNION SELECT thread_id FROM deleted;
+        END
+        """,
+    ],
+    'sqlite': [
+        """
+        CREATE TABLE IF NOT EXISTS conversation_changes (
+            change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            thread_id TEXT NOT NULL,
+            changed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS conversation_changes_insert AFTER INSERT ON conversations
+        BEGIN INSERT INTO conversation_changes (thread_id) VALUES (NEW.thread_id); END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS conversation_changes_update AFTER UPDATE ON conversations
+        BEGIN INSERT INTO conversation_changes (thread_id) SELECT NEW.thread_id UNION SELECT OLD.thread_id; END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS conversation_changes_delete AFTER DELETE ON conversations
+        BEGIN INSERT INTO conversation_changes (thread_id) VALUES (OLD.thread_id); END
+        """,
+    ],
+}
+
+
+class SQLiteBackend:
+    """
+    A local SQLite stand-in for the MSSQL database, used for benchmarks and local development.
+    It creates the same tables the library works with: PromptStrings, Users, PromptVariables,
+    PythonFiles, CentralRelationshipTable and conversations.
+    """
+    dialect = 'sqlite'
+
+    def __init__(self, path, create_schema=True):
+        """
+        :param path: The SQLite database file. Every connection opens the same file, so an
+                     in-memory database cannot be shared between pooled connections.
+        :param create_schema: Whether to create the tables if they do not exist yet.
+        """
+        self.path = path
+        if create_schema:
+            self.create_schema()
+
+    @property
+    def key(self):
+        return (self.dialect, self.path)
+
+    @property
+    def error(self):
+        import sqlite3
+        return sqlite3.Error
+
+    def connect(self):
+        import sqlite3
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def create_schema(self):
+        """
+        Creates the library's tables in the SQLite file.
+        """
+        conn = self.connect()
+        try:
+            conn.executescript(SQLITE_SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
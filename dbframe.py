@@ -0,0 +1,86 @@
+from operator import itemgetter
+
+# Rows requested per fetchmany call when filling the column buffers.
+DEFAULT_BATCH_SIZE = 5000
+
+
+def _value_type(types):
+    """
+    The type shared by all non-NULL values of a column, given the set of their types: float for a mix of
+    int and float, None for any other mix.
+    """
+    if types == {int, float}:
+        return float
+    return next(iter(types)) if len(types) == 1 else None
+
+
+def _column_array(values, type_code):
+    """
+    Turns one column's values into a NumPy array or pandas extension array with a native dtype.
+    ``type_code`` is the Python type from cursor.description (pyodbc); SQLite reports None, in which case
+    the type shared by all non-NULL values is used, so a column is only int64 when every value is an int.
+    """
+    import datetime
+    import numpy as np
+    import pandas as pd
+
+    types = set(map(type, values))
+    has_null = type(None) in types
+    types.discard(type(None))
+    if not isinstance(type_code, type):
+        type_code = _value_type(types)
+    try:
+        if type_code is bool:
+            return pd.array(values, dtype="boolean") if has_null else np.array(values, dtype=bool)
+        if type_code is int:
+            return pd.array(values, dtype="Int64") if has_null else np.array(values, dtype=np.int64)
+        if type_code is float:
+            return np.array(values, dtype=np.float64)
+        if type_code in (datetime.datetime, datetime.date):
+            return np.array(values, dtype="datetime64[us]")
+    except (TypeError, ValueError, OverflowError):
+        pass  # mixed types in a SQLite column: keep the Python objects
+    array = np.empty(len(values), dtype=object)
+    array[:] = values  # str, Decimal, bytes and anything else stay exact Python objects
+    return array
+
+
+def _build_frame(columns, buffers, type_codes):
+    import pandas as pd
+
+    return pd.DataFrame({column: _column_array(buffer, type_code)
+                         for column, buffer, type_code in zip(columns, buffers, type_codes)},
+                        columns=columns)
+
+
+def frame_from_rows(rows, description):
+    """
+    Builds a DataFrame from already fetched rows, one column at a time.
+
+    :param rows: The rows returned by fetchall/fetchmany.
+    :param description: The cursor.description of the query that produced them.
+    """
+    columns = [desc[0] for desc in description]
+    buffers = [list(map(itemgetter(index), rows)) for index in range(len(columns))]
+    return _build_frame(columns, buffers, [desc[1] for desc in description])
+
+
+def fetch_frame(cursor, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Fetches the rest of the result of the last query executed on ``cursor`` into a DataFrame.
+
+    Rows are read ``batch_size`` at a time and transposed straight into per-column buffers, which are
+    converted to int64/float64/bool/datetime64 arrays (nullable Int64/boolean when the column has NULLs).
+    Strings and Decimals stay Python objects so no precision or text is changed. The row objects of each
+    batch are dropped as soon as they are transposed, instead of being kept and walked again by pandas.
+    """
+    description = cursor.description
+    columns = [desc[0] for desc in description]
+    buffers = [[] for _ in columns]
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        for index, buffer in enumerate(buffers):
+            buffer.extend(map(itemgetter(index), rows))
+    return _build_frame(columns, buffers, [desc[1] for desc in description])
@@ -0,0 +1,197 @@
+import re
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+from functools import lru_cache
+
+_default_instrumentation = None
+
+
+def set_default_instrumentation(instrumentation):
+    """
+    Installs a hook used by every PromptDatabase and ConversationDatabaseManager created without an explicit
+    ``instrumentation`` argument. Pass None to switch instrumentation off again.
+    """
+    global _default_instrumentation
+    _default_instrumentation = instrumentation
+
+
+def get_default_instrumentation():
+    return _default_instrumentation
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Normalizes a statement so that calls differing only in literals, whitespace or IN-list length share a key.
+    """
+    sql = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    sql = re.sub(r"\b\d+\b", "?", sql)
+    sql = re.sub(r"\s+", " ", sql).strip()
+    return re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(?+)", sql)
+
+
+def _caller_method(instrumentation):
+    """
+    Returns the name of the first public method of a DB class instrumented by ``instrumentation`` on the
+    stack above the cursor, e.g. 'add_new_record' rather than the private helper it called.
+    """
+    frame = sys._getframe(3)
+    fallback = frame.f_code.co_name
+    while frame is not None:
+        name = frame.f_code.co_name
+        owner = frame.f_locals.get('self')
+        if name.isidentifier() and not name.startswith('_') and getattr(owner, 'instrumentation', None) is instrumentation:
+            return name
+        frame = frame.f_back
+    return fallback
+
+
+class QueryInstrumentation:
+    """
+    Collects per-call query metrics: method name, SQL fingerprint, parameter count, rows returned,
+    execute time and fetch time. Keeps a bounded sample of timings per method and fingerprint for
+    percentiles, and a log of the calls slower than ``slow_query_ms``.
+    """
+    def __init__(self, slow_query_ms=500.0, max_samples=10000, slow_log_size=100):
+        self.slow_query_ms = slow_query_ms
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=self.max_samples))
+        self._counts = defaultdict(lambda: {"calls": 0, "rows": 0})
+        self._slow = deque(maxlen=slow_log_size)
+
+    def record(self, method, sql, params_count, rows, execute_time, fetch_time):
+        """
+        Records one query. Times are in seconds.
+        """
+        key = (method, fingerprint(sql))
+        total_ms = (execute_time + fetch_time) * 1000
+        with self._lock:
+            counts = self._counts[key]
+            counts["calls"] += 1
+            counts["rows"] += rows or 0
+            self._samples[key].append((total_ms, execute_time * 1000, fetch_time * 1000))
+            if total_ms >= self.slow_query_ms:
+                self._slow.append({
+                    "method": method,
+                    "fingerprint": key[1],
+                    "params": params_count,
+                    "rows": rows,
+                    "execute_ms": execute_time * 1000,
+                    "fetch_ms": fetch_time * 1000,
+                    "at": time.time(),
+                })
+
+    def stats(self):
+        """
+        Returns one dict per (method, fingerprint) with call and row counts and p50/p95/p99 of the total,
+        execute and fetch times in milliseconds, slowest first.
+        """
+        with self._lock:
+            items = [(key, dict(self._counts[key]), list(samples)) for key, samples in self._samples.items()]
+        result = []
+        for (method, sql), counts, samples in items:
+            entry = {"method": method, "fingerprint": sql, **counts}
+            for index, label in enumerate(("total", "execute", "fetch")):
+                values = sorted(sample[index] for sample in samples)
+                for pct in (50, 95, 99):
+                    entry[f"{label}_p{pct}_ms"] = values[min(len(values) - 1, len(values) * pct // 100)]
+            result.append(entry)
+        result.sort(key=lambda entry: entry["total_p95_ms"], reverse=True)
+        return result
+
+    def slow_queries(self):
+        """
+        Returns the most recent calls slower than ``slow_query_ms``, oldest first.
+        """
+        with self._lock:
+            return list(self._slow)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+            self._slow.clear()
+
+
+class InstrumentedCursor:
+    """
+    Wraps a DB-API cursor and reports every statement to a QueryInstrumentation. A statement is reported when
+    the next one is executed or the cursor is closed, so its fetch time and row count are complete.
+    Only used when instrumentation is enabled; otherwise the DB classes use the plain cursor.
+    """
+    def __init__(self, cursor, instrumentation):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_instrumentation", instrumentation)
+        object.__setattr__(self, "_pending", None)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def execute(self, sql, *params):
+        return self._run(self._cursor.execute, sql, params, len(params[0]) if params and params[0] else 0)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        count = sum(len(params) for params in seq_of_params)
+        return self._run(self._cursor.executemany, sql, (seq_of_params,), count)
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone, lambda row: 0 if row is None else 1)
+
+    def fetchmany(self, *args):
+        return self._fetch(lambda: self._cursor.fetchmany(*args), len)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall, len)
+
+    def close(self):
+        self._flush()
+        return self._cursor.close()
+
+    def _run(self, execute, sql, params, params_count):
+        self._flush()
+        method = _caller_method(self._instrumentation)
+        started = time.perf_counter()
+        try:
+            return execute(sql, *params)
+        finally:
+            pending = {"method": method, "sql": sql, "params": params_count, "rows": None,
+                       "execute": time.perf_counter() - started, "fetch": 0.0}
+            object.__setattr__(self, "_pending", pending)
+
+    def _fetch(self, fetch, count):
+        started = time.perf_counter()
+        result = fetch()
+        pending = self._pending
+        if pending is not None:
+            pending["fetch"] += time.perf_counter() - started
+            pending["rows"] = (pending["rows"] or 0) + count(result)
+        return result
+
+    def _flush(self):
+        pending = self._pending
+        if pending is None:
+            return
+        object.__setattr__(self, "_pending", None)
+        rows = pending["rows"]
+        if rows is None:
+            rowcount = getattr(self._cursor, "rowcount", -1)
+            rows = rowcount if rowcount is not None and rowcount >= 0 else None
+        self._instrumentation.record(pending["method"], pending["sql"], pending["params"], rows,
+                                     pending["execute"], pending["fetch"])
+
+
+def instrument_cursor(cursor, instrumentation):
+    """
+    Returns ``cursor`` wrapped for ``instrumentation``, or unchanged when instrumentation is None.
+    """
+    return cursor if instrumentation is None else InstrumentedCursor(cursor, instrumentation)
@@ -0,0 +1,31 @@
+import os
+
+from sqlstatements import placeholders
+
+# IDENTITY / AUTOINCREMENT values are handed out when a row is inserted, not when its transaction commits, so
+# a reader that already sees id 11 may not see id 10 yet. Readers that follow a table by id remember the ids
+# at or below their high-water mark they have not seen (the gaps) and look for them again on every read, for
+# as long as they are within GAP_WINDOW ids of the mark. Ids of rolled-back or deleted rows never show up and
+# age out of the window. Kept below SQL Server's 2100-parameter limit, as every gap is a parameter.
+GAP_WINDOW = min(int(os.getenv('DB_GAP_WINDOW', '1000')), 2000)
+
+
+def after_mark(column, mark, gaps=()):
+    """
+    Returns a (condition, params) tuple matching the ids above ``mark`` and the ids in ``gaps``.
+    """
+    if not gaps:
+        return f"{column} > ?", [mark]
+    gaps = sorted(gaps)
+    return f"({column} > ? OR {column} IN ({placeholders(len(gaps))}))", [mark] + gaps
+
+
+def open_gaps(gaps, seen, mark, new_mark, window=GAP_WINDOW):
+    """
+    Returns the gaps left after a read that moved the mark from ``mark`` to ``new_mark``: the earlier gaps
+    and the ids in between that were not ``seen``, except those more than ``window`` ids below the new mark.
+    """
+    oldest = new_mark - window
+    candidates = {gap for gap in gaps if gap > oldest}
+    candidates.update(range(max(mark, oldest) + 1, new_mark + 1))
+    return candidates - set(seen)
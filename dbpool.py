@@ -0,0 +1,232 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out of a pool within the timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of database connections.
+
+    Connections are created lazily by the ``connect`` callable, handed out by ``checkout`` and
+    returned by ``checkin``. Idle connections are evicted after ``max_idle`` seconds and every
+    connection is recycled once it is older than ``max_lifetime`` seconds.
+    """
+    def __init__(self, connect, max_size=8, timeout=30.0, max_idle=300.0, max_lifetime=1800.0, ping_after=5.0):
+        """
+        :param connect: A callable returning a new DB-API connection.
+        :param max_size: The maximum number of open connections (idle plus checked out).
+        :param timeout: Seconds to wait for a free connection before raising PoolTimeout.
+        :param max_idle: Seconds an unused connection may stay in the pool.
+        :param max_lifetime: Seconds after which a connection is closed instead of reused.
+        :param ping_after: Connections idle for longer than this are checked with a cheap query before reuse.
+        """
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_after = ping_after
+        self._cond = threading.Condition()
+        self._idle = deque()  # (conn, created_at, last_used), most recently used on the right
+        self._created = {}  # id(conn) -> created_at for checked out connections
+        self._size = 0
+        self._stats = {"hits": 0, "waits": 0, "creates": 0, "evictions": 0, "recycles": 0, "failed_pings": 0,
+                       "ignored_checkins": 0}
+
+    def checkout(self):
+        """
+        Returns an open connection, reusing an idle one when possible.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+        while True:
+            expired = []
+            entry = None
+            create = False
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    expired.extend(self._evict_idle_locked(now))
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        create = True
+                        break
+                    if not waited:
+                        waited = True
+                        self._stats["waits"] += 1
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(f"No connection available within {self.timeout} seconds.")
+                    self._cond.wait(remaining)
+            for conn in expired:
+                self._close(conn)
+
+            if create:
+                try:
+                    conn = self.connect()
+                except Exception:
+                    self._release_slot()
+                    raise
+                with self._cond:
+                    self._stats["creates"] += 1
+                    self._created[id(conn)] = time.monotonic()
+                return conn
+
+            conn, created_at, last_used = entry
+            if time.monotonic() - last_used > self.ping_after and not self._ping(conn):
+                with self._cond:
+                    self._stats["failed_pings"] += 1
+                self._close(conn)
+                self._release_slot()
+                continue
+            with self._cond:
+                self._stats["hits"] += 1
+                self._created[id(conn)] = created_at
+            return conn
+
+    def checkin(self, conn, discard=False):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back first; connections that
+        fail the rollback, are past their lifetime or are explicitly discarded are closed instead.
+        Connections that are not checked out of this pool, e.g. returned a second time, are ignored: the
+        connection may already be idle in the pool and handed out again.
+        """
+        with self._cond:
+            created_at = self._created.pop(id(conn), None)
+            if created_at is None:
+                self._stats["ignored_checkins"] += 1
+                return
+        if not discard:
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        now = time.monotonic()
+        if not discard and now - created_at > self.max_lifetime:
+            discard = True
+            with self._cond:
+                self._stats["recycles"] += 1
+        if discard:
+            self._close(conn)
+            self._release_slot()
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, now))
+            self._cond.notify()
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters together with the current idle and in-use sizes.
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = len(self._created)
+            stats["size"] = self._size
+        return stats
+
+    def clear(self):
+        """
+        Closes all idle connections. Checked out connections are closed when they are returned.
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._close(conn)
+
+    def _evict_idle_locked(self, now):
+        expired = []
+        kept = deque()
+        for conn, created_at, last_used in self._idle:
+            if now - last_used > self.max_idle:
+                self._stats["evictions"] += 1
+                expired.append(conn)
+            elif now - created_at > self.max_lifetime:
+                self._stats["recycles"] += 1
+                expired.append(conn)
+            else:
+                kept.append((conn, created_at, last_used))
+        if expired:
+            self._idle = kept
+            self._size -= len(expired)
+            self._cond.notify(len(expired))
+        return expired
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _ping(conn):
+        cursor = None
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key, connect):
+    """
+    Returns the process-wide pool for ``key``, creating it with ``connect`` on first use.
+    Pool limits can be tuned with the MSSQL_POOL_SIZE, MSSQL_POOL_TIMEOUT, MSSQL_POOL_MAX_IDLE
+    and MSSQL_POOL_MAX_LIFETIME environment variables.
+    """
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(
+                connect,
+                max_size=int(os.getenv('MSSQL_POOL_SIZE', 8)),
+                timeout=float(os.getenv('MSSQL_POOL_TIMEOUT', 30)),
+                max_idle=float(os.getenv('MSSQL_POOL_MAX_IDLE', 300)),
+                max_lifetime=float(os.getenv('MSSQL_POOL_MAX_LIFETIME', 1800)),
+            )
+            _pools[key] = pool
+    return pool
+
+
+def pool_stats():
+    """
+    Returns the stats of every process-wide pool, keyed by the start of its backend key joined with '/':
+    dialect/server/database for MSSQL (leaving out the credentials) and dialect/path for SQLite.
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {"/".join(str(part) for part in key[:3]): pool.stats() for key, pool in pools}
@@ -0,0 +1,160 @@
+import contextlib
+import functools
+import os
+import threading
+import time
+
+from dbinstrument import instrument_cursor
+from dbpool import get_pool
+
+# Seconds a session keeps reading from the primary after it wrote, so it sees its own writes even when the
+# replica lags behind.
+DEFAULT_PIN_SECONDS = float(os.getenv('DB_READ_PIN_SECONDS', '5'))
+
+_pins = {}  # (primary backend key, session) -> time.monotonic() deadline
+_pins_lock = threading.Lock()
+_stats = {"replica_reads": 0, "primary_reads": 0, "pins": 0}
+
+
+def pin_primary(primary_key, session=None, seconds=DEFAULT_PIN_SECONDS):
+    """
+    Sends the reads of ``session`` (of every session when None) to the primary for the next ``seconds``.
+    """
+    deadline = time.monotonic() + seconds
+    with _pins_lock:
+        _stats["pins"] += 1
+        if _pins.get((primary_key, session), 0) < deadline:
+            _pins[(primary_key, session)] = deadline
+
+
+def is_pinned(primary_key, session=None):
+    now = time.monotonic()
+    with _pins_lock:
+        return (_pins.get((primary_key, session), 0) > now
+                or (session is not None and _pins.get((primary_key, None), 0) > now))
+
+
+def routing_stats():
+    """
+    Returns the process-wide number of reads served by replicas and by primaries, and of write pins.
+    """
+    with _pins_lock:
+        return dict(_stats)
+
+
+class ReadRouting:
+    """
+    The read side of a PromptDatabase or ConversationDatabaseManager: a lazily checked-out connection to the
+    read backend, used by the read-only methods unless the session is pinned to the primary after a write.
+    """
+    def __init__(self, primary_backend, read_backend=None, session=None, pin_seconds=None, instrumentation=None):
+        """
+        :param primary_backend: The backend writes go to.
+        :param read_backend: The replica backend, or None to send everything to the primary.
+        :param session: Scopes read-your-writes pinning, e.g. a Streamlit session ID. With None a write pins
+                        every session of this process.
+        :param pin_seconds: How long a write pins reads to the primary (default DB_READ_PIN_SECONDS).
+        """
+        self.primary_backend = primary_backend
+        self.read_backend = read_backend
+        self.session = session
+        self.pin_seconds = pin_seconds if pin_seconds is not None else DEFAULT_PIN_SECONDS
+        self.instrumentation = instrumentation
+        self.conn = None
+        self._cursor = None
+        self.primary_cursor = None  # the primary cursor while a routed read runs on the replica, see on_primary
+
+    def _pool(self):
+        return get_pool(self.read_backend.key, self.read_backend.connect)
+
+    def pin(self):
+        """
+        Called after a committed write.
+        """
+        if self.read_backend is not None:
+            pin_primary(self.primary_backend.key, self.session, self.pin_seconds)
+
+    def use_replica(self):
+        use = self.read_backend is not None and not is_pinned(self.primary_backend.key, self.session)
+        with _pins_lock:
+            _stats["replica_reads" if use else "primary_reads"] += 1
+        return use
+
+    def cursor(self):
+        """
+        Returns the replica cursor for a read, or None if the read has to go to the primary.
+        """
+        if not self.use_replica():
+            return None
+        if self._cursor is None:
+            self._cursor = self.new_cursor()
+        return self._cursor
+
+    def new_cursor(self):
+        """
+        Returns a new cursor on the replica connection, checking the connection out on first use.
+        """
+        if self.conn is None:
+            self.conn = self._pool().checkout()
+        return instrument_cursor(self.conn.cursor(), self.instrumentation)
+
+    def close(self):
+        if self._cursor is not None:
+            try:
+                self._cursor.close()
+            except Exception:
+                pass
+            self._cursor = None
+        if self.conn is not None:
+            self._pool().checkin(self.conn)
+            self.conn = None
+
+
+def routed_read(method):
+    """
+    Wraps a read-only method so that it runs with ``self.cursor`` pointing at the replica when the instance's
+    ReadRouting allows it.
+    """
+    @functools.wraps(method)
+    def read(self, *args, **kwargs):
+        cursor = self.routing.cursor() if self.conn is not None else None
+        if cursor is None:
+            return method(self, *args, **kwargs)
+        primary = self.cursor
+        outermost = self.routing.primary_cursor is None
+        if outermost:
+            self.routing.primary_cursor = primary
+        self.cursor = cursor
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self.cursor = primary
+            if outermost:
+                self.routing.primary_cursor = None
+    return read
+
+
+@contextlib.contextmanager
+def on_primary(db):
+    """
+    Points ``db.cursor`` at the primary for the block, also inside a routed read. Process-wide caches are
+    filled this way: every session reads them, including sessions pinned to the primary after a write, so
+    they must not hold rows from a lagging replica.
+    """
+    primary = db.routing.primary_cursor
+    if primary is None:
+        yield
+        return
+    cursor, db.cursor = db.cursor, primary
+    try:
+        yield
+    finally:
+        db.cursor = cursor
+
+
+def route_reads(cls, method_names):
+    """
+    Replaces the named methods of ``cls`` with replica-routed versions.
+    """
+    for name in method_names:
+        setattr(cls, name, routed_read(getattr(cls, name)))
@@ -0,0 +1,97 @@
+import threading
+
+# Dimension tables with their ID and name columns.
+DIMENSION_TABLES = {
+    'Users': ('UserID', 'Username'),
+    'PromptVariables': ('VariableID', 'VariableName'),
+    'PythonFiles': ('FileID', 'Filename'),
+}
+
+
+class DimensionTable:
+    """
+    The full contents of one dimension table, indexed by ID and by name.
+    """
+    def __init__(self, table, columns, rows):
+        self.table = table
+        self.id_column, self.name_column = DIMENSION_TABLES[table]
+        self.columns = columns
+        self.rows = [dict(zip(columns, row)) for row in rows]
+        self.by_id = {row[self.id_column]: row for row in self.rows}
+        self.by_name = {row[self.name_column]: row for row in self.rows}
+
+    def id_for(self, name):
+        """
+        Returns the ID for a name, or None if the name is unknown.
+        """
+        row = self.by_name.get(name)
+        return row[self.id_column] if row is not None else None
+
+    def name_for(self, id_value):
+        """
+        Returns the name for an ID, or None if the ID is unknown.
+        """
+        row = self.by_id.get(id_value)
+        return row[self.name_column] if row is not None else None
+
+    def find(self, column, value):
+        """
+        Returns a copy of the first row whose ``column`` equals ``value``, or None.
+        """
+        if column == self.name_column:
+            row = self.by_name.get(value)
+        elif column == self.id_column:
+            row = self.by_id.get(value)
+        else:
+            row = next((row for row in self.rows if row.get(column) == value), None)
+        return dict(row) if row is not None else None
+
+
+class DimensionCache:
+    """
+    Loaded-once, in-memory copies of Users, PromptVariables and PythonFiles for one database.
+
+    Each table is read with a single query the first time it is needed and kept until a write through
+    PromptDatabase invalidates it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._generation = 0  # bumped by invalidate() so a load racing with a write is not kept
+        self._stats = {"loads": 0, "invalidations": 0}
+
+    def table(self, cursor, table):
+        """
+        Returns the DimensionTable for ``table``, loading it with ``cursor`` if it is not cached.
+        """
+        cached = self._tables.get(table)
+        if cached is not None:
+            return cached
+        generation = self._generation
+        cursor.execute(f"SELECT * FROM {table}")
+        rows = cursor.fetchall()
+        columns = [desc[0] for desc in cursor.description]
+        loaded = DimensionTable(table, columns, rows)
+        with self._lock:
+            self._stats["loads"] += 1
+            if generation == self._generation:
+                self._tables[table] = loaded
+        return loaded
+
+    def invalidate(self, table=None):
+        """
+        Drops one cached table, or all of them when ``table`` is None.
+        """
+        with self._lock:
+            self._stats["invalidations"] += 1
+            self._generation += 1
+            if table is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(table, None)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["tables"] = sorted(self._tables)
+        return stats
@@ -1,29 +1,29 @@
+import os
 from datetime import datetime
 from myfunc.prompts import ConversationDatabase
- 
+from tokenrollup import TokenRollupStore, daily_totals_loader, grouped_query_loader
+
 current_date = datetime.now()
 start_date = current_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 end_date = current_date.replace(hour=23, minute=59, second=59, microsecond=999999)
- 
+
 start_date_str = start_date.strftime('%Y-%m-%d %H:%M:%S')
 end_date_str = end_date.strftime('%Y-%m-%d %H:%M:%S')
- 
-with ConversationDatabase() as db:
-    all_tokens = db.extract_token_sums_between_dates("2024-01-01", end_date_str)
-    embedding_cost = all_tokens["total_embedding_tokens"] / 10**6 * 0.13
-    prompt_cost = all_tokens["total_prompt_tokens"] / 10**6 * 5.0
-    completion_cost = all_tokens["total_completion_tokens"] / 10**6 * 15.0
-    stt_cost = all_tokens["total_stt_tokens"] / 10**6 / 60 * 0.006
-    tts_cost = all_tokens["total_tts_tokens"] / 10**6 * 15.0
-    
+
+# Daily totals are kept locally; only the days not aggregated yet (and today) are read from the database
+with TokenRollupStore(os.getenv('TOKEN_ROLLUP_PATH', 'token_rollup.sqlite')) as rollup:
+    with ConversationDatabase() as db:
+        # TOKEN_ROLLUP_QUERY: a grouped query per day, app and user (see grouped_query_loader), which loads the
+        # missing days with one query instead of one per day
+        query = os.getenv('TOKEN_ROLLUP_QUERY')
+        rollup.refresh(grouped_query_loader(db, query) if query else daily_totals_loader(db), "2024-01-01", end_date)
+    costs = rollup.cost_breakdown("2024-01-01", end_date)[0]
+
     print(f"""Cost in USD:
-            embedding: {embedding_cost}
-            prompt: {prompt_cost}
-            completion: {completion_cost}
-            stt: {stt_cost}
-            tts: {tts_cost}
-            total: {embedding_cost + prompt_cost + completion_cost + stt_cost + tts_cost}
+            embedding: {costs["embedding_cost"]}
+            prompt: {costs["prompt_cost"]}
+            completion: {costs["completion_cost"]}
+            stt: {costs["stt_cost"]}
+            tts: {costs["tts_cost"]}
+            total: {costs["total_cost"]}
             """)
-    
-# Pa Vi sad razmisljajte o npr. decimalama
-
@@ -0,0 +1,187 @@
+import threading
+import time
+
+
+class _Entry:
+    __slots__ = ("value", "loaded_at")
+
+    def __init__(self, value, loaded_at):
+        self.value = value
+        self.loaded_at = loaded_at
+
+
+class PromptCache:
+    """
+    A process-wide, TTL-bounded cache of prompt strings keyed by PromptName.
+
+    Entries younger than ``ttl`` are served from memory. Entries older than ``ttl`` but younger than
+    ``ttl + stale_ttl`` are still served while a single background refresh reloads them
+    (stale-while-revalidate). Missing, expired and invalidated entries are loaded synchronously,
+    with concurrent readers of the same names waiting on one shared load instead of each querying
+    the database.
+    """
+    def __init__(self, loader, ttl=300.0, stale_ttl=3600.0):
+        """
+        :param loader: A callable taking a list of prompt names and returning a dict of name -> prompt string.
+                       Names missing from the result are cached as not found.
+        :param ttl: Seconds an entry is considered fresh.
+        :param stale_ttl: Seconds after ``ttl`` during which a stale entry is served while it is refreshed.
+        """
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._versions = {}  # bumped by invalidate() so in-flight loads cannot store outdated values
+        self._loading = {}  # name -> threading.Event for synchronous loads in flight
+        self._refreshing = set()
+        self._executor = None  # started on the first background refresh
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "loads": 0, "refreshes": 0, "invalidations": 0}
+
+    def get(self, name, default=None):
+        """
+        Returns the prompt string for ``name`` or ``default`` if there is no such prompt.
+        """
+        value = self.get_many([name]).get(name)
+        return default if value is None else value
+
+    def get_many(self, names):
+        """
+        Returns a dict of name -> prompt string for the given names. Names that do not exist are left out.
+        """
+        names = list(dict.fromkeys(names))
+        result = {}
+        stale = []
+        to_load = []
+        to_wait = {}
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                entry = self._entries.get(name)
+                age = now - entry.loaded_at if entry is not None else None
+                if entry is not None and age < self.ttl:
+                    self._stats["hits"] += 1
+                    result[name] = entry.value
+                elif entry is not None and age < self.ttl + self.stale_ttl:
+                    self._stats["stale_hits"] += 1
+                    result[name] = entry.value
+                    if name not in self._refreshing and name not in self._loading:
+                        self._refreshing.add(name)
+                        stale.append(name)
+                elif name in self._loading:
+                    to_wait[name] = self._loading[name]
+                else:
+                    self._stats["misses"] += 1
+                    self._loading[name] = threading.Event()
+                    to_load.append(name)
+
+        if stale:
+            self._submit_refresh(stale)
+        if to_load:
+            result.update(self._load(to_load))
+        for name, event in to_wait.items():
+            event.wait()
+            with self._lock:
+                entry = self._entries.get(name)
+            if entry is None:
+                # The shared load failed or was invalidated meanwhile; load it ourselves.
+                result.update(self.get_many([name]))
+            else:
+                result[name] = entry.value
+        return {name: result[name] for name in names if result.get(name) is not None}
+
+    def invalidate(self, names=None):
+        """
+        Drops the given names from the cache, or every entry when ``names`` is None.
+        The next read of an invalidated name loads it from the database.
+        """
+        with self._lock:
+            self._stats["invalidations"] += 1
+            if names is None:
+                for name in self._entries:
+                    self._versions[name] = self._versions.get(name, 0) + 1
+                for name in self._loading:
+                    self._versions[name] = self._versions.get(name, 0) + 1
+                self._entries.clear()
+                return
+            for name in names:
+                self._entries.pop(name, None)
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def prime(self, prompts):
+        """
+        Stores already known prompt strings, e.g. from a snapshot, as fresh entries.
+        """
+        now = time.monotonic()
+        with self._lock:
+            for name, value in prompts.items():
+                self._entries[name] = _Entry(value, now)
+
+    def refresh(self, names):
+        """
+        Reloads the given names in the background while their current entries keep being served.
+        """
+        with self._lock:
+            names = [name for name in dict.fromkeys(names) if name not in self._refreshing and name not in self._loading]
+            self._refreshing.update(names)
+        if names:
+            self._submit_refresh(names)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        """
+        Returns a snapshot of the cache counters and its current size.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        return stats
+
+    def _submit_refresh(self, names):
+        with self._lock:
+            if self._executor is None:
+                from concurrent.futures import ThreadPoolExecutor
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prompt-cache-refresh")
+            executor = self._executor
+        executor.submit(self._refresh, names)
+
+    def _load(self, names):
+        with self._lock:
+            versions = {name: self._versions.get(name, 0) for name in names}
+            self._stats["loads"] += 1
+        try:
+            loaded = self.loader(names)
+        except Exception:
+            with self._lock:
+                for name in names:
+                    self._loading.pop(name).set()
+            raise
+        self._store(names, loaded, versions)
+        with self._lock:
+            for name in names:
+                self._loading.pop(name).set()
+        return {name: loaded.get(name) for name in names}
+
+    def _refresh(self, names):
+        with self._lock:
+            versions = {name: self._versions.get(name, 0) for name in names}
+            self._stats["refreshes"] += 1
+        try:
+            loaded = self.loader(names)
+        except Exception as e:
+            print(f"Failed to refresh prompts {names}: {e}")
+            return
+        finally:
+            with self._lock:
+                self._refreshing.difference_update(names)
+        self._store(names, loaded, versions)
+
+    def _store(self, names, loaded, versions):
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                if self._versions.get(name, 0) == versions[name]:
+                    self._entries[name] = _Entry(loaded.get(name), now)
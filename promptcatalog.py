@@ -0,0 +1,50 @@
+class PromptCatalog:
+    """
+    An in-memory copy of PromptStrings keyed by PromptName, kept current by PromptDatabase.sync_prompt_catalog.
+
+    The catalog remembers the ChangeID of the last change it has applied (its high-water mark), so every
+    sync after the first one only transfers the prompts that changed since, and the ChangeIDs below the mark
+    it has not seen yet (see dbmarks), which the next sync looks for again.
+    """
+    def __init__(self):
+        self.prompts = {}
+        self.high_water_mark = None
+        self.gaps = set()
+
+    def __len__(self):
+        return len(self.prompts)
+
+    def __contains__(self, name):
+        return name in self.prompts
+
+    def get(self, name, default=None):
+        """
+        Returns the row dict for a prompt name, or ``default`` if the catalog does not contain it.
+        """
+        return self.prompts.get(name, default)
+
+    def prompt_string(self, name, default=None):
+        """
+        Returns only the PromptString of a prompt, or ``default`` if the catalog does not contain it.
+        """
+        record = self.prompts.get(name)
+        return record['PromptString'] if record is not None else default
+
+    def apply(self, changed, deleted, high_water_mark, gaps=()):
+        """
+        Applies a delta: ``changed`` is a list of row dicts to upsert, ``deleted`` the names to drop.
+        """
+        for record in changed:
+            self.prompts[record['PromptName']] = record
+        for name in deleted:
+            self.prompts.pop(name, None)
+        self.high_water_mark = high_water_mark
+        self.gaps = set(gaps)
+
+    def reset(self, records, high_water_mark, gaps=()):
+        """
+        Replaces the whole catalog, e.g. after a full reload.
+        """
+        self.prompts = {record['PromptName']: record for record in records}
+        self.high_water_mark = high_water_mark
+        self.gaps = set(gaps)
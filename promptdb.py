@@ -1,100 +1,588 @@
+import contextlib
+import itertools
 import os
-import pyodbc
+from dbbackend import CHANGE_LOG_DDL, REVISION_LOG_DDL, MSSQLBackend, read_backend_from_env
+from dbframe import DEFAULT_BATCH_SIZE, fetch_frame, frame_from_rows
+from dbinstrument import get_default_instrumentation, instrument_cursor
+from dbmarks import GAP_WINDOW, after_mark, open_gaps
+from dbpool import get_pool
+from dbrouting import ReadRouting, on_primary, route_reads
+from dimcache import DIMENSION_TABLES, DimensionCache
+from promptcache import PromptCache
+from promptrevisions import is_checkpoint, make_delta, reconstruct
+from promptsearch import PromptSearchIndex
+from promptsnapshot import PromptSnapshot, write_snapshot
+from relationgraph import KIND_BY_TABLE, RELATION_KINDS, RELATIONSHIP_COLUMNS, RelationshipGraph
+from sqlstatements import insert_sql, pad_values, placeholders, select_in, statement_cache, update_sql
+
+# The column identifying a row in each table, as reported to write listeners.
+KEY_COLUMNS = {
+    'PromptStrings': 'PromptName',
+    'Users': 'Username',
+    'PromptVariables': 'VariableName',
+    'PythonFiles': 'Filename',
+    'CentralRelationshipTable': 'ID',
+}
+
+# Primary key of each table, used for keyset pagination.
+PRIMARY_KEYS = {
+    'PromptStrings': 'PromptID',
+    'Users': 'UserID',
+    'PromptVariables': 'VariableID',
+    'PythonFiles': 'FileID',
+    'CentralRelationshipTable': 'ID',
+}
+
+# Keys of the dictionaries returned by get_relationships_by_user_id.
+RELATIONSHIP_FIELDS = ['ID', 'PromptName', 'Username', 'VariableName', 'Filename']
+
+# Columns kept for each prompt in a PromptCatalog.
+CATALOG_COLUMNS = ['PromptID', 'PromptName', 'PromptString', 'Comment', 'UserID', 'VariableID', 'VariableFileID']
+
+# Columns a bulk upsert can set besides PromptName.
+UPSERT_COLUMNS = ['PromptString', 'Comment', 'UserID', 'VariableID', 'VariableFileID']
+
+# (table, name column, ID column, record field) used to resolve the foreign keys of a new prompt.
+RECORD_ID_LOOKUPS = (
+    ('Users', 'Username', 'UserID', 'username'),
+    ('PromptVariables', 'VariableName', 'VariableID', 'variablename'),
+    ('PythonFiles', 'Filename', 'FileID', 'filename'),
+)
+
+# SQL Server rejects statements with more than 2100 parameters; stay safely below that.
+MAX_QUERY_PARAMS = 2000
+
+_write_listeners = []
+_key_consumers = {}  # listener -> needs_keys(db, table), see add_write_listener
+_change_log_available = {}  # backend key -> whether PromptStringsChanges exists
+_revision_log_available = {}  # backend key -> whether PromptStringRevisions exists
+_search_indexes = {}  # backend key -> PromptSearchIndex, see PromptDatabase.enable_search_index
+_relationship_graphs = {}  # backend key -> RelationshipGraph, see PromptDatabase.enable_relationship_graph
+_dimension_caches = {}  # backend key -> DimensionCache
+
+# Set PROMPTDB_DIMENSION_CACHE=0 to always read Users, PromptVariables and PythonFiles from the database.
+DIMENSION_CACHE_ENABLED = os.getenv('PROMPTDB_DIMENSION_CACHE', '1') != '0'
+
+
+def add_write_listener(listener, needs_keys=None):
+    """
+    Registers a callable that is invoked after every committed write made through PromptDatabase.
+
+    The listener is called as listener(db, table, keys), where keys is a list of the KEY_COLUMNS values
+    of the affected rows, or None when they are not known. Finding the keys of an UPDATE or DELETE costs
+    an extra SELECT, so it is only done when a listener wants them: pass needs_keys(db, table) returning
+    whether the listener would use the keys of a write to ``table`` right now (e.g. only while its cache
+    holds anything). Without it the listener always gets the keys.
+    """
+    if listener not in _write_listeners:
+        _write_listeners.append(listener)
+        if needs_keys is not None:
+            _key_consumers[listener] = needs_keys
+
+
+def remove_write_listener(listener):
+    """
+    Unregisters a listener added with add_write_listener.
+    """
+    if listener in _write_listeners:
+        _write_listeners.remove(listener)
+        _key_consumers.pop(listener, None)
+
+
+def _always(db, table):
+    return True
+
+
+def _missing_ids_error(record, ids):
+    """
+    Builds the add_new_record error message naming each username, variable or file that did not resolve.
+    """
+    missing = [f"{label} for '{record.get(field)}'" for label, field, key in (
+        ('UserID', 'username', 'UserID'), ('VariableID', 'variablename', 'VariableID'), ('VariableFileID', 'filename', 'FileID')
+    ) if ids[key] is None]
+    return f"Error: Missing {', '.join(missing)}."
+
+
+def _chunked(values, size):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
 
 class PromptDatabase:
     """
     A class to interact with an MSSQL database for storing and retrieving prompt templates.
     """
-    def __init__(self, host=None, user=None, password=None, database=None):
+    def __init__(self, host=None, user=None, password=None, database=None, backend=None, instrumentation=None,
+                 read_backend=None, session=None, pin_seconds=None):
         """
         Initializes the connection details for the database, with the option to use environment variables as defaults.
+        A backend (e.g. dbbackend.SQLiteBackend) can be passed instead to run against another database, and a
+        dbinstrument.QueryInstrumentation to record per-query metrics (defaults to the process-wide hook, if any).
+
+        The read-only methods (READ_METHODS) go to ``read_backend`` when one is given (by default the replica in
+        MSSQL_READ_HOST, if set; False for none); writes always go to the primary. After a write, the reads of ``session`` stay
+        on the primary for ``pin_seconds`` (see dbrouting.ReadRouting).
         """
         self.host = host if host is not None else os.getenv('MSSQL_HOST')
         self.user = user if user is not None else os.getenv('MSSQL_USER')
         self.password = password if password is not None else os.getenv('MSSQL_PASS')
         self.database = database if database is not None else os.getenv('MSSQL_DB')
+        self.backend = backend if backend is not None else MSSQLBackend(self.host, self.user, self.password, self.database)
+        self.instrumentation = instrumentation if instrumentation is not None else get_default_instrumentation()
+        if read_backend is None and backend is None:
+            read_backend = read_backend_from_env(self.user, self.password, self.database)
+        self.routing = ReadRouting(self.backend, read_backend or None, session, pin_seconds, self.instrumentation)
         self.conn = None
         self.cursor = None
-        print(f"Host1: {self.host}")
-        print(f"User1: {self.user}")
-        print(f"Database1: {self.database}")
-        
+
     def __enter__(self):
         """
-        Establishes the database connection and returns the instance itself when entering the context.
+        Checks a connection out of the shared pool and returns the instance itself when entering the context.
         """
-        self.conn = pyodbc.connect(
-            driver='{ODBC Driver 18 for SQL Server}',
-            server=self.host,
-            database=self.database,
-            uid=self.user,
-            pwd=self.password,
-            TrustServerCertificate='yes'
-        )
-        self.cursor = self.conn.cursor()
+        self.conn = self._pool().checkout()
+        self.cursor = self._new_cursor()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
-        Closes the database connection and cursor when exiting the context.
+        Closes the cursor and returns the connection to the pool when exiting the context.
         Handles any exceptions that occurred within the context.
         """
-        if self.cursor is not None:
-            self.cursor.close()
-        if self.conn is not None:
-            self.conn.close()
+        self.close()
         if exc_type or exc_val or exc_tb:
             pass
 
-    def query_sql_prompt_strings(self, prompt_names):
+    def _pool(self):
+        return get_pool(self.backend.key, self.backend.connect)
+
+    @contextlib.contextmanager
+    def _autoconnect(self):
         """
-        Fetches the existing prompt strings for a given list of prompt names, maintaining the order of prompt_names.
+        Runs a block on this instance's connection. Outside a ``with`` block, a connection is checked out of
+        the pool for the block only and returned afterwards, so it cannot leak from the bounded pool.
+        """
+        if self.conn is not None:
+            yield
+            return
+        self.__enter__()
+        try:
+            yield
+        finally:
+            self.close()
+
+    def _new_cursor(self, read=False):
+        """
+        Returns a new cursor on the primary connection, or on the replica for ``read`` when routing allows it.
         """
-        order_clause = "ORDER BY CASE PromptName "
-        for idx, name in enumerate(prompt_names):
-            order_clause += f"WHEN ? THEN {idx} "
-        order_clause += "END"
+        if read and self.routing.use_replica():
+            return self.routing.new_cursor()
+        return instrument_cursor(self.conn.cursor(), self.instrumentation)
 
-        query = f"""
-        SELECT PromptString FROM PromptStrings
-        WHERE PromptName IN ({','.join(['?'] * len(prompt_names))})
-        """ + order_clause
+    def _notify_write(self, table, keys=None):
+        """
+        Tells the registered write listeners which rows of a table a committed write touched, and pins this
+        session's reads to the primary.
+        """
+        self.routing.pin()
+        for listener in list(_write_listeners):
+            try:
+                listener(self, table, keys)
+            except Exception as e:
+                print(f"Write listener failed for {table}: {e}")
 
-        params = tuple(prompt_names) + tuple(prompt_names)  # prompt_names repeated for both IN and ORDER BY
-        self.cursor.execute(query, params)
-        results = self.cursor.fetchall()
-        return [result[0] for result in results] if results else []
+    def _affected_keys(self, table, condition):
+        """
+        Returns the key values of the rows matching a (condition, params) tuple, or None if they cannot be
+        determined. Only queried when a write listener needs them (see add_write_listener).
+        """
+        key_column = KEY_COLUMNS.get(table)
+        if key_column is None or not any(_key_consumers.get(listener, _always)(self, table)
+                                         for listener in list(_write_listeners)):
+            return None
+        try:
+            self.cursor.execute(f"SELECT {key_column} FROM {table} WHERE {condition[0]}", condition[1])
+            return [row[0] for row in self.cursor.fetchall()]
+        except Exception:
+            return None
+
+    def _dimension(self, table):
+        """
+        Returns the cached DimensionTable for Users, PromptVariables or PythonFiles, or None if the
+        dimension cache is disabled or the table could not be loaded.
+        """
+        if not DIMENSION_CACHE_ENABLED or table not in DIMENSION_TABLES:
+            return None
+        cache = _dimension_caches.get(self.backend.key)
+        if cache is None:
+            cache = _dimension_caches.setdefault(self.backend.key, DimensionCache())
+        try:
+            with on_primary(self):
+                return cache.table(self.cursor, table)
+        except Exception as e:
+            print(f"Failed to load {table} into the dimension cache: {e}")
+            return None
+
+    def _has_change_log(self):
+        """
+        Whether the PromptStringsChanges table exists. Checked once per backend, before any write of the
+        current transaction, so databases that have not been migrated keep working without change tracking.
+        """
+        available = _change_log_available.get(self.backend.key)
+        if available is None:
+            try:
+                self.cursor.execute("SELECT COUNT(*) FROM PromptStringsChanges WHERE 1 = 0")
+                self.cursor.fetchall()
+                available = True
+            except Exception:
+                available = False
+            _change_log_available[self.backend.key] = available
+        return available
+
+    def _log_prompt_changes(self, names=None, condition=None):
+        """
+        Records changed prompt names in PromptStringsChanges as part of the current transaction, either the
+        given names or those of the rows matching a (condition, params) tuple.
+        """
+        if not self._has_change_log():
+            return
+        if condition is not None:
+            self.cursor.execute(
+                f"INSERT INTO PromptStringsChanges (PromptName) SELECT PromptName FROM PromptStrings WHERE {condition[0]}",
+                condition[1]
+            )
+        if names:
+            self.cursor.executemany("INSERT INTO PromptStringsChanges (PromptName) VALUES (?)", [(name,) for name in names])
+
+    def create_change_log(self):
+        """
+        Creates the PromptStringsChanges table used for delta syncs, if it does not exist yet.
+        """
+        try:
+            self.cursor.execute(CHANGE_LOG_DDL[self.backend.dialect])
+            self.conn.commit()
+            _change_log_available[self.backend.key] = True
+            return "Change log is ready."
+        except Exception as e:
+            self.conn.rollback()
+            return f"Error creating the change log: {e}"
+
+    def _has_revision_log(self):
+        """
+        Whether the PromptStringRevisions table exists; checked once per backend like _has_change_log.
+        """
+        available = _revision_log_available.get(self.backend.key)
+        if available is None:
+            try:
+                self.cursor.execute("SELECT COUNT(*) FROM PromptStringRevisions WHERE 1 = 0")
+                self.cursor.fetchall()
+                available = True
+            except Exception:
+                available = False
+            _revision_log_available[self.backend.key] = available
+        return available
+
+    def create_revision_log(self):
+        """
+        Creates the PromptStringRevisions table that keeps the edit history of update_prompt_record, if it
+        does not exist yet.
+        """
+        try:
+            self.cursor.execute(REVISION_LOG_DDL[self.backend.dialect])
+            self.conn.commit()
+            _revision_log_available[self.backend.key] = True
+            return "Revision log is ready."
+        except Exception as e:
+            self.conn.rollback()
+            return f"Error creating the revision log: {e}"
+
+    def _revision_chain(self, promptname, revision=None):
+        """
+        Returns (Revision, IsCheckpoint, Body) rows of a prompt from the nearest checkpoint up to ``revision``
+        (the latest revision when None), in revision order.
+        """
+        if revision is None:
+            self.cursor.execute("SELECT MAX(Revision) FROM PromptStringRevisions WHERE PromptName = ?", (promptname,))
+            revision = self.cursor.fetchone()[0]
+            if revision is None:
+                return []
+        self.cursor.execute("""
+            SELECT Revision, IsCheckpoint, Body FROM PromptStringRevisions
+            WHERE PromptName = ? AND Revision <= ? AND Revision >= (
+                SELECT MAX(Revision) FROM PromptStringRevisions
+                WHERE PromptName = ? AND IsCheckpoint = 1 AND Revision <= ?
+            )
+            ORDER BY Revision
+        """, (promptname, revision, promptname, revision))
+        return self.cursor.fetchall()
+
+    def _record_prompt_revision(self, promptname, new_promptstring):
+        """
+        Adds the revisions for an edit of a prompt to PromptStringRevisions as part of the current
+        transaction, before PromptStrings is updated. Checkpoints store the full text, every other revision a
+        delta against the one before it. The current text is recorded first if it is not the latest revision,
+        i.e. on the first tracked edit of a prompt or after an edit made through another method.
+        """
+        if not self._has_revision_log():
+            return
+        # Lock the prompt's row before reading its revisions, so concurrent edits of one prompt take turns
+        # instead of both numbering their revision MAX(Revision) + 1.
+        self.cursor.execute("UPDATE PromptStrings SET PromptString = PromptString WHERE PromptName = ?", (promptname,))
+        self.cursor.execute("SELECT PromptString FROM PromptStrings WHERE PromptName = ?", (promptname,))
+        row = self.cursor.fetchone()
+        if row is None:
+            return
+        current = row[0] or ''
+        chain = self._revision_chain(promptname)
+        revision = chain[-1][0] if chain else 0
+        last_checkpoint = chain[0][0] if chain else None
+        previous = reconstruct((checkpoint, body) for _, checkpoint, body in chain) if chain else None
+        new_promptstring = new_promptstring or ''
+        texts = [current] if current != previous else []
+        if new_promptstring != current:
+            texts.append(new_promptstring)
+        for text in texts:
+            revision += 1
+            body, checkpoint = text, True
+            if not is_checkpoint(revision, last_checkpoint):
+                delta = make_delta(previous, text)
+                if len(delta) < len(text):
+                    body, checkpoint = delta, False
+            if checkpoint:
+                last_checkpoint = revision
+            self.cursor.execute(insert_sql('PromptStringRevisions', ('PromptName', 'Revision', 'IsCheckpoint', 'Body')),
+                                (promptname, revision, int(checkpoint), body))
+            previous = text
+
+    def get_prompt_revision(self, promptname, revision=None):
+        """
+        Rebuilds a revision of a prompt from the nearest checkpoint and the deltas after it.
+
+        :param promptname: The name of the prompt.
+        :param revision: The revision number (see get_prompt_revisions); the latest when None.
+        :return: The prompt text of that revision, or None if it does not exist or an error occurs.
+        """
+        try:
+            chain = self._revision_chain(promptname, revision)
+            if not chain or (revision is not None and chain[-1][0] != revision):
+                return None
+            return reconstruct((checkpoint, body) for _, checkpoint, body in chain)
+        except Exception as e:
+            print(f"Error occurred: {e}")
+            return None
+
+    def get_prompt_revisions(self, promptname):
+        """
+        Lists the revisions recorded for a prompt.
+
+        :param promptname: The name of the prompt.
+        :return: A list of dictionaries with 'Revision', 'IsCheckpoint', 'StoredChars' and 'CreatedAt', oldest
+                 first, or an empty list if there are none or an error occurs.
+        """
+        length = 'LEN' if self.backend.dialect == 'mssql' else 'length'
+        try:
+            self.cursor.execute(f"""
+                SELECT Revision, IsCheckpoint, {length}(Body), CreatedAt FROM PromptStringRevisions
+                WHERE PromptName = ? ORDER BY Revision
+            """, (promptname,))
+            return [{'Revision': row[0], 'IsCheckpoint': bool(row[1]), 'StoredChars': row[2], 'CreatedAt': row[3]}
+                    for row in self.cursor.fetchall()]
+        except Exception as e:
+            print(f"Error occurred: {e}")
+            return []
+
+    def revert_prompt_to_revision(self, promptname, revision):
+        """
+        Sets the PromptString of a prompt back to an earlier revision, keeping its Comment. The revert is
+        recorded as a new revision.
+
+        :param promptname: The name of the prompt.
+        :param revision: The revision to restore.
+        :return: A success message or an error message.
+        """
+        text = self.get_prompt_revision(promptname, revision)
+        if text is None:
+            return f"Revision {revision} of prompt '{promptname}' does not exist."
+        try:
+            self.cursor.execute("SELECT Comment FROM PromptStrings WHERE PromptName = ?", (promptname,))
+            row = self.cursor.fetchone()
+        except Exception as e:
+            return f"Error occurred while reverting the prompt record: {e}"
+        if row is None:
+            return f"Prompt '{promptname}' does not exist."
+        return self.update_prompt_record(promptname, text, row[0])
+
+    def sync_prompt_catalog(self, catalog):
+        """
+        Brings a PromptCatalog up to date. The first sync loads every prompt; later syncs only fetch the
+        prompts recorded in PromptStringsChanges after the catalog's high-water mark, so the cost grows with
+        the number of changes rather than with the size of the catalog. Changes below the mark that were not
+        committed yet when it moved are picked up by a later sync (see dbmarks). Without the
+        PromptStringsChanges table (see create_change_log) every sync is a full load.
+
+        :param catalog: The promptcatalog.PromptCatalog to update in place.
+        :return: A dict with the number of 'changed' and 'deleted' prompts, the PromptStrings
+                 'rows_transferred' and whether a 'full' reload was needed.
+        """
+        columns = ', '.join(CATALOG_COLUMNS)
+        if self._has_change_log():
+            self.cursor.execute("SELECT MIN(ChangeID), MAX(ChangeID) FROM PromptStringsChanges")
+            min_change, max_change = self.cursor.fetchone()
+            max_change = max_change or 0
+        else:
+            min_change = max_change = None
+
+        # A catalog that was never synced, or whose changes were pruned from the log, needs a full reload.
+        hwm = catalog.high_water_mark
+        if hwm is None or max_change is None or (min_change is not None and min_change > hwm + 1):
+            gaps = ()
+            if max_change is not None:
+                # Read before the prompts: the changes committed by now are in the prompts read below, the
+                # others are gaps that later syncs look for.
+                self.cursor.execute("SELECT ChangeID FROM PromptStringsChanges WHERE ChangeID > ? AND ChangeID <= ?",
+                                    (max_change - GAP_WINDOW, max_change))
+                gaps = open_gaps((), [row[0] for row in self.cursor.fetchall()], 0, max_change)
+            self.cursor.execute(f"SELECT {columns} FROM PromptStrings")
+            records = [dict(zip(CATALOG_COLUMNS, row)) for row in self.cursor.fetchall()]
+            catalog.reset(records, max_change, gaps)
+            return {'changed': len(records), 'deleted': 0, 'rows_transferred': len(records), 'full': True}
+
+        if max_change <= hwm and not catalog.gaps:
+            return {'changed': 0, 'deleted': 0, 'rows_transferred': 0, 'full': False}
+
+        # Changes with a lower ChangeID can commit after a higher one was synced: look for the gaps again.
+        condition, params = after_mark('ChangeID', hwm, catalog.gaps)
+        self.cursor.execute(f"SELECT ChangeID, PromptName FROM PromptStringsChanges WHERE {condition} AND ChangeID <= ?",
+                            params + [max_change])
+        rows = self.cursor.fetchall()
+        names = list(dict.fromkeys(row[1] for row in rows))
+        changed = []
+        for chunk in _chunked(names, MAX_QUERY_PARAMS):
+            self.cursor.execute(*select_in(columns, 'PromptStrings', 'PromptName', chunk))
+            changed.extend(dict(zip(CATALOG_COLUMNS, row)) for row in self.cursor.fetchall())
+        found = {record['PromptName'] for record in changed}
+        deleted = [name for name in names if name not in found]
+        new_hwm = max(hwm, max_change)
+        catalog.apply(changed, deleted, new_hwm, open_gaps(catalog.gaps, [row[0] for row in rows], hwm, new_hwm))
+        return {'changed': len(changed), 'deleted': len(deleted), 'rows_transferred': len(changed), 'full': False}
+
+    def export_prompt_snapshot(self, path):
+        """
+        Writes every prompt string to a promptsnapshot file that work_prompts() can start from without the
+        database. The snapshot version is the change log high-water mark (0 without a change log).
+
+        :param path: Where to write the snapshot.
+        :return: The number of prompts written.
+        """
+        version = 0
+        if self._has_change_log():
+            self.cursor.execute("SELECT MAX(ChangeID) FROM PromptStringsChanges")
+            version = self.cursor.fetchone()[0] or 0
+        self.cursor.execute("SELECT PromptName, PromptString FROM PromptStrings")
+        return write_snapshot(path, dict(self.cursor.fetchall()), version)
+
+    def prune_change_log(self, keep_last=100000):
+        """
+        Deletes all but the newest ``keep_last`` entries of PromptStringsChanges. Catalogs whose high-water
+        mark falls into the pruned range do a full reload on their next sync.
+        """
+        try:
+            self.cursor.execute("SELECT MAX(ChangeID) FROM PromptStringsChanges")
+            max_change = self.cursor.fetchone()[0] or 0
+            self.cursor.execute("DELETE FROM PromptStringsChanges WHERE ChangeID <= ?", (max_change - keep_last,))
+            self.conn.commit()
+            return "Change log pruned successfully."
+        except Exception as e:
+            self.conn.rollback()
+            return f"Error pruning the change log: {e}"
+
+    def resolve_prompt_strings(self, prompt_names):
+        """
+        Fetches the prompt strings for any number of prompt names.
+
+        Names are de-duplicated and sent in chunks of at most MAX_QUERY_PARAMS parameters, so thousands of
+        names take only a few round trips and never hit SQL Server's 2100-parameter limit.
+
+        :param prompt_names: The prompt names to resolve.
+        :return: A dictionary of PromptName -> PromptString. Names that do not exist are left out.
+        """
+        names = [name for name in dict.fromkeys(prompt_names) if name is not None]
+        resolved = {}
+        for chunk in _chunked(names, MAX_QUERY_PARAMS):
+            self.cursor.execute(*select_in('PromptName, PromptString', 'PromptStrings', 'PromptName', chunk))
+            resolved.update((row[0], row[1]) for row in self.cursor.fetchall())
+        return resolved
+
+    def query_sql_prompt_strings(self, prompt_names):
+        """
+        Fetches the existing prompt strings for a given list of prompt names, maintaining the order of prompt_names.
+        Names that do not exist are skipped.
+        """
+        resolved = self.resolve_prompt_strings(prompt_names)
+        return [resolved[name] for name in prompt_names if name in resolved]
 
     def get_records(self, query, params=None):
         try:
-            if self.conn is None:
-                self.__enter__()
-            self.cursor.execute(query, params)
-            records = self.cursor.fetchall()
-            return records
+            with self._autoconnect():
+                self.cursor.execute(query, params)
+                records = self.cursor.fetchall()
+                return records
         except Exception as e:
             return []
 
 
+    def statement_stats(self):
+        """
+        Reports how much SQL generation and compilation the library causes.
+        :return: A dictionary with 'statements', the process-wide statement cache counters (hits, builds,
+                 build_seconds, padded_values, ...), and 'server': on MSSQL the cumulative 'compilations' and
+                 're_compilations' counters and the cached 'plans' of PromptDatabase's tables with their use
+                 counts, or None if unavailable (e.g. without VIEW SERVER STATE, or on SQLite).
+        """
+        server = None
+        if self.backend.dialect == 'mssql':
+            try:
+                self.cursor.execute("""
+                SELECT counter_name, cntr_value FROM sys.dm_os_performance_counters
+                WHERE counter_name IN ('SQL Compilations/sec', 'SQL Re-Compilations/sec')
+                """)
+                counters = {row[0].strip(): row[1] for row in self.cursor.fetchall()}
+                self.cursor.execute("""
+                SELECT cp.usecounts, cp.objtype, st.text
+                FROM sys.dm_exec_cached_plans cp
+                CROSS APPLY sys.dm_exec_sql_text(cp.plan_handle) st
+                WHERE st.text LIKE '%PromptStrings%' OR st.text LIKE '%CentralRelationshipTable%'
+                   OR st.text LIKE '%Users%' OR st.text LIKE '%PromptVariables%' OR st.text LIKE '%PythonFiles%'
+                ORDER BY cp.usecounts DESC
+                """)
+                server = {
+                    'compilations': counters.get('SQL Compilations/sec'),
+                    're_compilations': counters.get('SQL Re-Compilations/sec'),
+                    'plans': [{'use_count': row[0], 'type': row[1], 'text': row[2]} for row in self.cursor.fetchall()],
+                }
+            except Exception as e:
+                print(f"Failed to read plan cache statistics: {e}")
+        return {'statements': statement_cache.stats(), 'server': server}
+
     def get_records_from_column(self, table, column):
         """
         Fetch records from a specified column in a specified table.
         """
         query = f"SELECT DISTINCT {column} FROM {table}"
         try:
-            print(f"Executing query: {query}")  # Debug print
             self.cursor.execute(query)
             records = self.cursor.fetchall()
-            print(f"Fetched records from column {column}: {records}")  # Debug print
             return [record[0] for record in records] if records else []
         except Exception as e:
             print(f"Failed to fetch records from column {column}: {e}")
             return []
 
     def get_prompts_by_names(self, variable_names, prompt_names):
-        prompt_strings = self.query_sql_prompt_strings(prompt_names)
-        prompt_variables = dict(zip(variable_names, prompt_strings))
-        return prompt_variables
+        """
+        Maps each variable name to the prompt string of the prompt name at the same position.
+        Variables whose prompt does not exist are left out instead of shifting the remaining values.
+        """
+        resolved = self.resolve_prompt_strings(prompt_names)
+        return {variable: resolved[name] for variable, name in zip(variable_names, prompt_names) if name in resolved}
 
     def get_all_records_from_table(self, table_name):
         """
@@ -107,25 +595,140 @@ class PromptDatabase:
             self.cursor.execute(query)
             records = self.cursor.fetchall()
             columns = [desc[0] for desc in self.cursor.description]
-            
-            # Debugging prints to inspect the fetched data
-            print(f"Fetched {len(records)} records from {table_name}")
-            print(f"Columns: {columns}")
-            
-            # Ensure records are a list of tuples
-            if records and all(isinstance(record, tuple) for record in records):
-                print("Records are in the correct format (list of tuples).")
-            else:
-                print("Records are not in the expected format.")
-            
             return records, columns
-        except pyodbc.Error as e:
+        except self.backend.error as e:
             print(f"Database error: {e}")
             return [], []
         except Exception as e:
             print(f"Failed to fetch records: {e}")
             return [], []
 
+    def query_frame(self, query, params=None, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Runs a query and returns its result as a pandas DataFrame built column by column
+        (see dbframe.fetch_frame), without materializing a list of row objects first.
+        :param query: The SQL query to run.
+        :param params: The query parameters, if any.
+        :param batch_size: The number of rows fetched per round trip.
+        :return: A DataFrame, or None if the query failed.
+        """
+        try:
+            if params:
+                self.cursor.execute(query, params)
+            else:
+                self.cursor.execute(query)
+            return fetch_frame(self.cursor, batch_size)
+        except Exception as e:
+            print(f"Failed to fetch records: {e}")
+            return None
+
+    def get_all_records_frame(self, table_name, batch_size=DEFAULT_BATCH_SIZE):
+        """
+        Columnar version of get_all_records_from_table: all records and columns of a table as a DataFrame.
+        :param table_name: The name of the table from which to fetch records.
+        :return: A DataFrame, or None if the query failed.
+        """
+        return self.query_frame(f"SELECT * FROM {table_name}", batch_size=batch_size)
+
+    def _select_top(self, table, where, order, limit):
+        """
+        Builds a SELECT * limited to ``limit`` rows in the backend's dialect. Returns the query and the
+        position of the limit parameter ('first' or 'last').
+        """
+        if self.backend.dialect == 'mssql':
+            return f"SELECT TOP (?) * FROM {table} {where} ORDER BY {order}", 'first'
+        return f"SELECT * FROM {table} {where} ORDER BY {order} LIMIT ?", 'last'
+
+    def _key_column(self, table_name, key_column):
+        key_column = key_column or PRIMARY_KEYS.get(table_name)
+        if key_column is None:
+            raise ValueError(f"No primary key known for table {table_name}; pass key_column.")
+        return key_column
+
+    def get_table_page(self, table_name, after=None, before=None, page_size=50, key_column=None, as_frame=False):
+        """
+        Fetches one page of a table using keyset pagination on its primary key, so every page costs the
+        same no matter how far into the table it is.
+
+        :param table_name: The name of the table to page through.
+        :param after: Return the page following this key (the last key of the current page).
+        :param before: Return the page preceding this key (the first key of the current page).
+        :param page_size: The number of records per page.
+        :param key_column: The key to page on; defaults to the table's primary key from PRIMARY_KEYS.
+        :param as_frame: Return the records as a DataFrame instead of a list of rows.
+        :return: A dictionary with 'records', 'columns', 'first_key', 'last_key', 'has_next' and 'has_previous'.
+        """
+        key_column = self._key_column(table_name, key_column)
+        if before is not None:
+            query, limit_at = self._select_top(table_name, f"WHERE {key_column} < ?", f"{key_column} DESC", page_size + 1)
+            params = [before]
+        elif after is not None:
+            query, limit_at = self._select_top(table_name, f"WHERE {key_column} > ?", key_column, page_size + 1)
+            params = [after]
+        else:
+            query, limit_at = self._select_top(table_name, "", key_column, page_size + 1)
+            params = []
+        params = [page_size + 1] + params if limit_at == 'first' else params + [page_size + 1]
+
+        self.cursor.execute(query, params)
+        records = self.cursor.fetchall()
+        columns = [desc[0] for desc in self.cursor.description]
+        more = len(records) > page_size
+        records = records[:page_size]
+        if before is not None:
+            records.reverse()
+        key_index = columns.index(key_column)
+        first_key = records[0][key_index] if records else None
+        last_key = records[-1][key_index] if records else None
+        if as_frame:
+            records = frame_from_rows(records, self.cursor.description)
+        return {
+            'records': records,
+            'columns': columns,
+            'first_key': first_key,
+            'last_key': last_key,
+            'has_next': more if before is None else True,
+            'has_previous': more if before is not None else after is not None,
+        }
+
+    def iter_table_records(self, table_name, page_size=5000, array_size=500, key_column=None):
+        """
+        Streams every record of a table in primary key order without holding the whole table in memory.
+        Pages of ``page_size`` rows are read with keyset pagination and fetched ``array_size`` rows at a time.
+        Uses its own cursor, so other queries can run on this instance while the generator is consumed.
+
+        :return: A generator of (columns, records) tuples with at most ``array_size`` records each.
+        """
+        key_column = self._key_column(table_name, key_column)
+        cursor = self._new_cursor(read=True)
+        cursor.arraysize = array_size
+        try:
+            last_key = None
+            columns = None
+            while True:
+                if last_key is None:
+                    query, limit_at = self._select_top(table_name, "", key_column, page_size)
+                    params = [page_size]
+                else:
+                    query, limit_at = self._select_top(table_name, f"WHERE {key_column} > ?", key_column, page_size)
+                    params = [page_size, last_key] if limit_at == 'first' else [last_key, page_size]
+                cursor.execute(query, params)
+                if columns is None:
+                    columns = [desc[0] for desc in cursor.description]
+                    key_index = columns.index(key_column)
+                count = 0
+                while True:
+                    rows = cursor.fetchmany(array_size)
+                    if not rows:
+                        break
+                    count += len(rows)
+                    last_key = rows[-1][key_index]
+                    yield columns, rows
+                if count < page_size:
+                    break
+        finally:
+            cursor.close()
+
     def get_prompts_for_username(self, username):
         """
         Fetch all prompt texts and matching variable names for a given username.
@@ -145,53 +748,269 @@ class PromptDatabase:
         return records
 
     def add_record(self, table, **fields):
-        columns = ', '.join(fields.keys())
-        placeholders = ', '.join(['?'] * len(fields))
-        query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
+        query = insert_sql(table, fields.keys())
         try:
+            if table == 'PromptStrings' and 'PromptName' in fields:
+                self._log_prompt_changes([fields['PromptName']])
             self.cursor.execute(query, tuple(fields.values()))
             self.conn.commit()
+            key_column = KEY_COLUMNS.get(table)
+            self._notify_write(table, [fields[key_column]] if key_column in fields else None)
             return self.cursor.lastrowid
         except Exception as e:
             self.conn.rollback()
             print(f"Error in add_record: {e}")
             return None
 
+    def bulk_upsert_prompts(self, records, batch_size=1000):
+        """
+        Inserts or updates many prompts, matched by PromptName, in batches of ``batch_size`` rows with one
+        commit per batch. On MSSQL each batch is sent with fast_executemany into a temporary table and
+        applied with a single MERGE.
+
+        :param records: An iterable of dictionaries with a 'PromptName' and any of UPSERT_COLUMNS. Columns
+                        that are missing or None keep their current value when the prompt already exists.
+        :return: A list of (PromptName, outcome) tuples in input order, where outcome is 'inserted',
+                 'updated', 'duplicate' (superseded by a later record with the same name in its batch)
+                 or an error message.
+        """
+        outcomes = []
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if not batch:
+                break
+            # Only the last record per name in a batch is applied; MERGE cannot touch a row twice.
+            latest = {record['PromptName']: index for index, record in enumerate(batch)}
+            rows = [tuple([record['PromptName']] + [record.get(column) for column in UPSERT_COLUMNS])
+                    for index, record in enumerate(batch) if latest[record['PromptName']] == index]
+            try:
+                if self.backend.dialect == 'mssql':
+                    applied = self._merge_prompt_batch(rows)
+                else:
+                    applied = self._upsert_prompt_batch(rows)
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                outcomes.extend((record['PromptName'], f"Error in bulk_upsert_prompts: {e}") for record in batch)
+                continue
+            self._notify_write('PromptStrings', list(latest))
+            outcomes.extend(
+                (record['PromptName'], applied[record['PromptName']] if latest[record['PromptName']] == index else 'duplicate')
+                for index, record in enumerate(batch)
+            )
+        return outcomes
+
+    def _merge_prompt_batch(self, rows):
+        """
+        Loads a batch into #PromptUpsert with fast_executemany and MERGEs it into PromptStrings.
+        Returns a dict of PromptName -> 'inserted' or 'updated'.
+        """
+        log_changes = self._has_change_log()
+        self.cursor.execute("""
+        IF OBJECT_ID('tempdb..#PromptUpsert') IS NULL
+        CREATE TABLE #PromptUpsert (
+            PromptName NVARCHAR(255) PRIMARY KEY, PromptString NVARCHAR(MAX), Comment NVARCHAR(MAX),
+            UserID INT, VariableID INT, VariableFileID INT
+        )
+        """)
+        self.cursor.execute("TRUNCATE TABLE #PromptUpsert")
+        self.cursor.fast_executemany = True
+        try:
+            self.cursor.executemany(
+                "INSERT INTO #PromptUpsert (PromptName, PromptString, Comment, UserID, VariableID, VariableFileID) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        finally:
+            self.cursor.fast_executemany = False
+        if log_changes:
+            self.cursor.execute("INSERT INTO PromptStringsChanges (PromptName) SELECT PromptName FROM #PromptUpsert")
+        self.cursor.execute("""
+        MERGE PromptStrings WITH (HOLDLOCK) AS target
+        USING #PromptUpsert AS source
+        ON target.PromptName = source.PromptName
+        WHEN MATCHED THEN UPDATE SET
+            PromptString = COALESCE(source.PromptString, target.PromptString),
+            Comment = COALESCE(source.Comment, target.Comment),
+            UserID = COALESCE(source.UserID, target.UserID),
+            VariableID = COALESCE(source.VariableID, target.VariableID),
+            VariableFileID = COALESCE(source.VariableFileID, target.VariableFileID)
+        WHEN NOT MATCHED THEN
+            INSERT (PromptName, PromptString, Comment, UserID, VariableID, VariableFileID)
+            VALUES (source.PromptName, source.PromptString, source.Comment, source.UserID, source.VariableID, source.VariableFileID)
+        OUTPUT source.PromptName, $action;
+        """)
+        return {row[0]: 'inserted' if row[1] == 'INSERT' else 'updated' for row in self.cursor.fetchall()}
+
+    def _upsert_prompt_batch(self, rows):
+        """
+        Applies a batch with INSERT ... ON CONFLICT for backends without MERGE (the SQLite stand-in).
+        Returns a dict of PromptName -> 'inserted' or 'updated'.
+        """
+        names = [row[0] for row in rows]
+        existing = set()
+        for chunk in _chunked(names, MAX_QUERY_PARAMS):
+            self.cursor.execute(*select_in('PromptName', 'PromptStrings', 'PromptName', chunk))
+            existing.update(row[0] for row in self.cursor.fetchall())
+        self._log_prompt_changes(names)
+        self.cursor.executemany("""
+        INSERT INTO PromptStrings (PromptName, PromptString, Comment, UserID, VariableID, VariableFileID)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (PromptName) DO UPDATE SET
+            PromptString = COALESCE(excluded.PromptString, PromptString),
+            Comment = COALESCE(excluded.Comment, Comment),
+            UserID = COALESCE(excluded.UserID, UserID),
+            VariableID = COALESCE(excluded.VariableID, VariableID),
+            VariableFileID = COALESCE(excluded.VariableFileID, VariableFileID)
+        """, rows)
+        return {name: 'updated' if name in existing else 'inserted' for name in names}
+
     def add_new_record(self, username, filename, variablename, promptstring, promptname, comment):
         """
         Adds a new record to the database, handling the relationships between users, files, variables, and prompts.
+        The UserID, VariableID and FileID come from the dimension cache when it knows all three names; otherwise
+        they are resolved by the INSERT itself, so a successful insert is a single statement. On SQL Server that
+        statement also writes the change log entry (OUTPUT INTO). Only when it inserts nothing is a follow-up
+        query made to report which name is unknown.
         """
+        insert = "INSERT INTO PromptStrings (PromptString, PromptName, Comment, UserID, VariableID, VariableFileID)"
+        log_separately = self._has_change_log() and self.backend.dialect != 'mssql'
+        if self._has_change_log() and not log_separately:
+            insert += " OUTPUT inserted.PromptName INTO PromptStringsChanges (PromptName)"
         try:
-            # Fetch UserID based on username
-            self.cursor.execute("SELECT UserID FROM Users WHERE Username = ?", (username,))
-            user_result = self.cursor.fetchone()
-            user_id = user_result[0] if user_result else None
+            record = {'username': username, 'variablename': variablename, 'filename': filename}
+            ids = self._cached_record_ids([record])[0]
+            if None not in ids.values():
+                self.cursor.execute(f"{insert} VALUES (?, ?, ?, ?, ?, ?)",
+                                    (promptstring, promptname, comment, ids['UserID'], ids['VariableID'], ids['FileID']))
+            else:
+                self.cursor.execute(
+                    f"""
+                    {insert}
+                    SELECT ?, ?, ?, u.UserID, pv.VariableID, pf.FileID
+                    FROM Users u, PromptVariables pv, PythonFiles pf
+                    WHERE u.Username = ? AND pv.VariableName = ? AND pf.Filename = ?
+                    """,
+                    (promptstring, promptname, comment, username, variablename, filename)
+                )
+                if self.cursor.rowcount == 0:
+                    self.conn.rollback()
+                    return _missing_ids_error(record, self.resolve_record_ids([record])[0])
+            if log_separately:
+                self._log_prompt_changes([promptname])
+            self.conn.commit()
+            self._notify_write('PromptStrings', [promptname])
+            return "Record added successfully."
+        except Exception as e:
+            self.conn.rollback()
+            return f"Failed to add the record: {e}"
 
-            # Fetch VariableID based on variablename
-            self.cursor.execute("SELECT VariableID FROM PromptVariables WHERE VariableName = ?", (variablename,))
-            variable_result = self.cursor.fetchone()
-            variable_id = variable_result[0] if variable_result else None
+    def resolve_record_ids(self, records):
+        """
+        Resolves the UserID, VariableID and FileID of many records from the dimension cache, and the names the
+        cache does not know in a single query (or one per MAX_QUERY_PARAMS distinct names).
 
-            # Fetch FileID based on filename
-            self.cursor.execute("SELECT FileID FROM PythonFiles WHERE Filename = ?", (filename,))
-            file_result = self.cursor.fetchone()
-            file_id = file_result[0] if file_result else None
+        :param records: An iterable of dictionaries with 'username', 'variablename' and 'filename'.
+        :return: A list of dictionaries with 'UserID', 'VariableID' and 'FileID' (None where a name is unknown),
+                 in the order of records.
+        """
+        records = list(records)
+        resolved = self._cached_record_ids(records)
+        missing = list(dict.fromkeys(
+            (table, record[field]) for table, _, id_column, field in RECORD_ID_LOOKUPS
+            for record, ids in zip(records, resolved) if ids[id_column] is None and record.get(field) is not None
+        ))
+        if missing:
+            found = self._query_record_ids(missing)
+            for record, ids in zip(records, resolved):
+                for table, _, id_column, field in RECORD_ID_LOOKUPS:
+                    if ids[id_column] is None:
+                        ids[id_column] = found.get((table, record.get(field)))
+        return resolved
 
-            # Ensure all IDs are found
-            if not all([user_id, variable_id, file_id]):
-                return "Error: Missing UserID, VariableID, or VariableFileID."
+    def _cached_record_ids(self, records):
+        """
+        Resolves record IDs from the dimension cache only; unknown names (or a disabled cache) give None.
+        """
+        lookups = [(self._dimension(table), id_column, field) for table, _, id_column, field in RECORD_ID_LOOKUPS]
+        return [{id_column: dimension.id_for(record.get(field)) if dimension is not None else None
+                 for dimension, id_column, field in lookups}
+                for record in records]
 
-            # Correctly include FileID in the insertion command
-            self.cursor.execute(
+    def _query_record_ids(self, pairs):
+        """
+        Looks up the IDs of (table, name) pairs the dimension cache did not know, with one UNION ALL query per
+        MAX_QUERY_PARAMS / 2 pairs; each table's IN list is padded to its bucket size, which at most doubles
+        it, so a query stays within MAX_QUERY_PARAMS. Returns a dict of (table, name) -> ID for the names found.
+        """
+        ids = {}
+        for chunk in _chunked(pairs, MAX_QUERY_PARAMS // 2):
+            shape = []
+            params = []
+            for table, name_column, id_column, _ in RECORD_ID_LOOKUPS:
+                names = [name for chunk_table, name in chunk if chunk_table == table]
+                if names:
+                    names = pad_values(names)
+                    shape.append((table, name_column, id_column, len(names)))
+                    params.extend(names)
+            query = statement_cache.get(('record_ids', tuple(shape)), lambda: " UNION ALL ".join(
+                f"SELECT '{table}', {name_column}, {id_column} FROM {table} WHERE {name_column} IN ({placeholders(count)})"
+                for table, name_column, id_column, count in shape
+            ))
+            self.cursor.execute(query, params)
+            ids.update(((row[0], row[1]), row[2]) for row in self.cursor.fetchall())
+        # A name the database knows but the dimension cache did not means that table's copy is out of date.
+        cache = _dimension_caches.get(self.backend.key)
+        if cache is not None:
+            for table in {table for table, _ in ids}:
+                cache.invalidate(table)
+        return ids
+
+    def add_new_records(self, records):
+        """
+        Adds many new prompt records at once: the foreign keys of all records are resolved in a single query and
+        the resolved records are inserted in one transaction.
+
+        :param records: An iterable of dictionaries with the arguments of add_new_record ('username', 'filename',
+                        'variablename', 'promptstring', 'promptname', 'comment').
+        :return: A list with one result message per record, in input order.
+        """
+        records = list(records)
+        if not records:
+            return []
+        try:
+            resolved = self.resolve_record_ids(records)
+        except Exception as e:
+            return [f"Failed to add the record: {e}"] * len(records)
+        messages = []
+        rows = []
+        for record, ids in zip(records, resolved):
+            if None in ids.values():
+                messages.append(_missing_ids_error(record, ids))
+            else:
+                messages.append(None)
+                rows.append((record['promptstring'], record['promptname'], record.get('comment'),
+                             ids['UserID'], ids['VariableID'], ids['FileID']))
+        if not rows:
+            return messages
+        try:
+            self._log_prompt_changes([row[1] for row in rows])
+            if self.backend.dialect == 'mssql':
+                self.cursor.fast_executemany = True
+            self.cursor.executemany(
                 "INSERT INTO PromptStrings (PromptString, PromptName, Comment, UserID, VariableID, VariableFileID) VALUES (?, ?, ?, ?, ?, ?)",
-                (promptstring, promptname, comment, user_id, variable_id, file_id)
+                rows
             )
-
             self.conn.commit()
-            return "Record added successfully."
         except Exception as e:
             self.conn.rollback()
-            return f"Failed to add the record: {e}"
+            return [message or f"Failed to add the record: {e}" for message in messages]
+        finally:
+            if self.backend.dialect == 'mssql':
+                self.cursor.fast_executemany = False
+        self._notify_write('PromptStrings', [row[1] for row in rows])
+        return [message or "Record added successfully." for message in messages]
 
     def update_record(self, table, fields, condition):
         """
@@ -201,14 +1020,20 @@ class PromptDatabase:
         :param fields: A dictionary of column names and their new values.
         :param condition: A tuple containing the condition string and its values (e.g., ("UserID = ?", [user_id])).
         """
-        set_clause = ', '.join([f"{key} = ?" for key in fields.keys()])
         values = list(fields.values()) + condition[1]
-    
-        query = f"UPDATE {table} SET {set_clause} WHERE {condition[0]}"
+        query = update_sql(table, fields.keys(), condition[0])
     
         try:
+            keys = self._affected_keys(table, condition)
+            if table == 'PromptStrings':
+                self._log_prompt_changes(condition=condition)
+                if 'PromptName' in fields:
+                    self._log_prompt_changes([fields['PromptName']])
             self.cursor.execute(query, values)
             self.conn.commit()
+            if keys is not None and KEY_COLUMNS[table] in fields:
+                keys.append(fields[KEY_COLUMNS[table]])
+            self._notify_write(table, keys)
             return "Record updated successfully"
         except Exception as e:
             self.conn.rollback()
@@ -220,15 +1045,16 @@ class PromptDatabase:
         This method also handles deletions or updates in related tables if necessary.
         """
         delete_query = "DELETE FROM PromptStrings WHERE PromptName = ?"
-        try:
-            if self.conn is None:
-                self.__enter__()
-            self.cursor.execute(delete_query, (promptname,))
-            self.conn.commit()
-            return f"Prompt '{promptname}' deleted successfully."
-        except Exception as e:
-            self.conn.rollback()
-            return f"Error deleting prompt '{promptname}': {e}"
+        with self._autoconnect():
+            try:
+                self._log_prompt_changes([promptname])
+                self.cursor.execute(delete_query, (promptname,))
+                self.conn.commit()
+                self._notify_write('PromptStrings', [promptname])
+                return f"Prompt '{promptname}' deleted successfully."
+            except Exception as e:
+                self.conn.rollback()
+                return f"Error deleting prompt '{promptname}': {e}"
     
     def update_prompt_record(self, promptname, new_promptstring, new_comment):
         """
@@ -238,27 +1064,86 @@ class PromptDatabase:
         :param new_promptstring: The new value for the PromptString field.
         :param new_comment: The new value for the Comment field.
         """
+        sql_update_query = """
+        UPDATE PromptStrings 
+        SET PromptString = ?, Comment = ? 
+        WHERE PromptName = ?
+        """
+        with self._autoconnect():
+            try:
+                self._log_prompt_changes([promptname])
+                self._record_prompt_revision(promptname, new_promptstring)
+                self.cursor.execute(sql_update_query, (new_promptstring, new_comment, promptname))
+                self.conn.commit()
+                self._notify_write('PromptStrings', [promptname])
+                return "Prompt record updated successfully."
+            except Exception as e:
+                self.conn.rollback()
+                return f"Error occurred while updating the prompt record: {e}"
+
+    def enable_search_index(self):
+        """
+        Builds the in-memory trigram index over PromptName and PromptString for this database, once per
+        process. Afterwards search_for_string_in_prompt_text and get_prompts_contain_in_name are answered from
+        memory, and the library's add/update/delete methods keep the index current.
+        """
+        if self.backend.key not in _search_indexes:
+            index = PromptSearchIndex()
+            self.cursor.execute("SELECT PromptID, PromptName, PromptString, Comment FROM PromptStrings")
+            index.load(self.cursor.fetchall())
+            _search_indexes[self.backend.key] = index
+            add_write_listener(_update_search_index, _search_index_needs_keys)
+        return _search_indexes[self.backend.key]
+
+    def enable_relationship_graph(self):
+        """
+        Loads CentralRelationshipTable and the prompt, user, variable and file names into an in-memory
+        relationship graph for this database, once per process. Afterwards get_relationships_by_user_id,
+        fetch_relationship_data and get_related_names are answered from memory, and the library's
+        add/update/delete methods keep the graph current.
+        """
+        if self.backend.key not in _relationship_graphs:
+            graph = RelationshipGraph()
+            _load_relationship_graph(self, graph)
+            _relationship_graphs[self.backend.key] = graph
+            add_write_listener(_update_relationship_graph, _relationship_graph_needs_keys)
+        return _relationship_graphs[self.backend.key]
+
+    def get_related_names(self, kind, name, related_kind):
+        """
+        Lists the names of the entities of one kind linked to a named entity through CentralRelationshipTable,
+        e.g. get_related_names('file', 'app.py', 'prompt') for all prompts used by app.py, or
+        get_related_names('variable', 'x', 'user') for all users of variable x.
+        Uses the relationship graph if enable_relationship_graph was called.
+
+        :param kind: The kind of the named entity: 'prompt', 'user', 'variable' or 'file'.
+        :param name: Its PromptName, Username, VariableName or Filename.
+        :param related_kind: The kind of the entities to list.
+        :return: A list of names, or an empty list if the entity is unknown or an error occurs.
+        """
+        graph = _relationship_graphs.get(self.backend.key)
+        if graph is not None:
+            return graph.related_names(kind, name, related_kind)
+        table, id_column, name_column = RELATION_KINDS[kind]
+        related_table, related_id_column, related_name_column = RELATION_KINDS[related_kind]
+        query = f"""
+        SELECT DISTINCT r.{related_name_column}
+        FROM CentralRelationshipTable crt
+        JOIN {table} e ON crt.{id_column} = e.{id_column}
+        JOIN {related_table} r ON crt.{related_id_column} = r.{related_id_column}
+        WHERE e.{name_column} = ?
+        """
         try:
-            if self.conn is None:
-                self.__enter__()
-        
-            sql_update_query = """
-            UPDATE PromptStrings 
-            SET PromptString = ?, Comment = ? 
-            WHERE PromptName = ?
-            """
-        
-            self.cursor.execute(sql_update_query, (new_promptstring, new_comment, promptname))
-            self.conn.commit()
-            return "Prompt record updated successfully."
-        
+            self.cursor.execute(query, (name,))
+            return [row[0] for row in self.cursor.fetchall()]
         except Exception as e:
-            self.conn.rollback()
-            return f"Error occurred while updating the prompt record: {e}"
+            print(f"Error occurred: {e}")
+            return []
 
     def search_for_string_in_prompt_text(self, search_string):
         """
         Lists all prompt_name and prompt_text where a specific string is part of the prompt_text.
+        Uses the search index if enable_search_index was called.
 
         Parameters:
         - search_string: The string to search for within prompt_text.
@@ -266,6 +1151,11 @@ class PromptDatabase:
         Returns:
         - A list of dictionaries, each containing 'prompt_name' and 'prompt_text' for records matching the search criteria.
         """
+        index = _search_indexes.get(self.backend.key)
+        if index is not None:
+            records = index.search_text(search_string)
+            if records is not None:
+                return records
         self.cursor.execute('''
         SELECT PromptName, PromptString
         FROM PromptStrings
@@ -323,6 +1213,7 @@ class PromptDatabase:
     
             self.cursor.execute(sql_update_query, (new_value, original_value))
             self.conn.commit()
+            self._notify_write(table, [original_value, new_value] if column == KEY_COLUMNS[table] else None)
             return f"Record updated successfully in {table}."
     
         except Exception as e:
@@ -345,6 +1236,11 @@ class PromptDatabase:
             print("Invalid table or column name.")
             return None
 
+        dimension = self._dimension(table)
+        cached = dimension.find(column, value) if dimension is not None else None
+        if cached is not None:
+            return cached
+
         query = f"SELECT * FROM {table} WHERE {column} = ?"
     
         try:
@@ -361,14 +1257,18 @@ class PromptDatabase:
 
     def close(self):
         """
-        Closes the database connection and cursor, if they exist.
+        Closes the cursor and returns the connection to the pool, if they exist.
         """
         if self.cursor is not None:
-            self.cursor.close()
+            try:
+                self.cursor.close()
+            except Exception:
+                pass
             self.cursor = None
         if self.conn is not None:
-            self.conn.close()
+            self._pool().checkin(self.conn)
             self.conn = None
+        self.routing.close()
 
     def query_sql_record(self, prompt_name):
         """
@@ -397,6 +1297,11 @@ class PromptDatabase:
         :param filename: The name of the file to fetch the path for.
         :return: The FilePath of the file if found, otherwise None.
         """
+        dimension = self._dimension('PythonFiles')
+        cached = dimension.find('Filename', filename) if dimension is not None else None
+        if cached is not None:
+            return cached['FilePath']
+
         query = "SELECT FilePath FROM PythonFiles WHERE Filename = ?"
         try:
             self.cursor.execute(query, (filename,))
@@ -419,6 +1324,7 @@ class PromptDatabase:
         try:
             self.cursor.execute(query, (new_filename, new_file_path, original_filename))
             self.conn.commit()
+            self._notify_write('PythonFiles', [original_filename, new_filename])
             return "File record updated successfully."
         except Exception as e:
             self.conn.rollback()
@@ -431,8 +1337,15 @@ class PromptDatabase:
         VALUES (?, ?, ?, ?);
         """
         try:
-            self.cursor.execute(query, (prompt_id, user_id, variable_id, file_id))
+            if self.backend.dialect == 'mssql':
+                self.cursor.execute("SET NOCOUNT ON;" + query + "SELECT CAST(SCOPE_IDENTITY() AS INT);",
+                                    (prompt_id, user_id, variable_id, file_id))
+                record_id = self.cursor.fetchone()[0]
+            else:
+                self.cursor.execute(query, (prompt_id, user_id, variable_id, file_id))
+                record_id = self.cursor.lastrowid
             self.conn.commit()
+            self._notify_write('CentralRelationshipTable', [record_id])
             return f"Record added successfully"
         except Exception as e:
             self.conn.rollback()
@@ -443,27 +1356,28 @@ class PromptDatabase:
         params = []
 
         if prompt_id:
-            updates.append("PromptID = ?")
+            updates.append("PromptID")
             params.append(prompt_id)
         if user_id:
-            updates.append("UserID = ?")
+            updates.append("UserID")
             params.append(user_id)
         if variable_id:
-            updates.append("VariableID = ?")
+            updates.append("VariableID")
             params.append(variable_id)
         if file_id:
-            updates.append("FileID = ?")
+            updates.append("FileID")
             params.append(file_id)
 
         if not updates:
             return "No updates provided."
 
-        query = f"UPDATE CentralRelationshipTable SET {', '.join(updates)} WHERE ID = ?;"
+        query = update_sql('CentralRelationshipTable', updates, "ID = ?")
         params.append(record_id)
 
         try:
             self.cursor.execute(query, tuple(params))
             self.conn.commit()
+            self._notify_write('CentralRelationshipTable', [record_id])
             return "Record updated successfully"
         except Exception as e:
             self.conn.rollback()
@@ -472,8 +1386,12 @@ class PromptDatabase:
     def delete_record(self, table, condition):
         query = f"DELETE FROM {table} WHERE {condition[0]}"
         try:
+            keys = self._affected_keys(table, condition)
+            if table == 'PromptStrings':
+                self._log_prompt_changes(condition=condition)
             self.cursor.execute(query, condition[1])
             self.conn.commit()
+            self._notify_write(table, keys)
             return f"Record deleted successfully"
         except Exception as e:
             self.conn.rollback()
@@ -490,15 +1408,18 @@ class PromptDatabase:
         """
         query = f"SELECT * FROM {table} WHERE {name_column} = ?"
         try:
-            if self.conn is None:
-                self.__enter__()
-            self.cursor.execute(query, (value,))
-            result = self.cursor.fetchone()
-            if result:
-                columns = [desc[0] for desc in self.cursor.description]
-                return dict(zip(columns, result))
-            else:
-                return None
+            with self._autoconnect():
+                dimension = self._dimension(table)
+                cached = dimension.find(name_column, value) if dimension is not None else None
+                if cached is not None:
+                    return cached
+                self.cursor.execute(query, (value,))
+                result = self.cursor.fetchone()
+                if result:
+                    columns = [desc[0] for desc in self.cursor.description]
+                    return dict(zip(columns, result))
+                else:
+                    return None
         except Exception as e:
             print(f"Error occurred: {e}")
             return None
@@ -513,6 +1434,9 @@ class PromptDatabase:
         Returns:
         - A list of dictionaries containing relationship details.
         """
+        graph = _relationship_graphs.get(self.backend.key)
+        if graph is not None:
+            return [dict(zip(RELATIONSHIP_FIELDS, row)) for row in graph.relationships('user', user_id)]
         relationships = []
         query = """
         SELECT crt.ID, ps.PromptName, u.Username, pv.VariableName, pf.Filename
@@ -543,6 +1467,9 @@ class PromptDatabase:
         return relationships
     
     def fetch_relationship_data(self, prompt_id=None):
+        graph = _relationship_graphs.get(self.backend.key)
+        if graph is not None:
+            return graph.relationships('prompt', prompt_id) if prompt_id is not None else graph.relationships()
         query = """
         SELECT crt.ID, ps.PromptName, u.Username, pv.VariableName, pf.Filename
         FROM CentralRelationshipTable crt
@@ -565,9 +1492,16 @@ class PromptDatabase:
         """
         Fetches the details of prompt records where the PromptName contains the given string.
 
+        Uses the search index if enable_search_index was called.
+
         :param promptname: The string to search for in the prompt names.
         :return: A list of dictionaries with the details of the matching prompt records, or an empty list if none are found.
         """
+        index = _search_indexes.get(self.backend.key)
+        if index is not None:
+            records = index.search_names(promptname)
+            if records is not None:
+                return records
         query = """
         SELECT PromptName, PromptString, Comment
         FROM PromptStrings
@@ -584,8 +1518,154 @@ class PromptDatabase:
             print(f"Error occurred: {e}")
             return []
 
-import streamlit as st
-@st.cache_data
+# Methods that only read; they run on the read backend when one is configured.
+READ_METHODS = [
+    'resolve_prompt_strings', 'query_sql_prompt_strings', 'get_records', 'get_records_from_column',
+    'get_prompts_by_names', 'get_all_records_from_table', 'query_frame', 'get_all_records_frame', 'get_table_page',
+    'get_prompts_for_username', 'search_for_string_in_prompt_text', 'get_prompt_details_by_name',
+    'query_sql_record', 'get_relationships_by_user_id', 'fetch_relationship_data', 'get_prompts_contain_in_name',
+    'export_prompt_snapshot', 'get_related_names', 'get_prompt_revision', 'get_prompt_revisions',
+]
+# resolve_record_ids, get_prompt_details_for_all, get_file_path_by_name and get_record_by_name are served from
+# the process-wide dimension cache and stay on the primary, like everything that fills a shared cache.
+route_reads(PromptDatabase, READ_METHODS)
+
+
+def _invalidate_dimension_cache(db, table, keys):
+    cache = _dimension_caches.get(db.backend.key)
+    if cache is not None and table in DIMENSION_TABLES:
+        cache.invalidate(table)
+
+
+add_write_listener(_invalidate_dimension_cache, lambda db, table: False)
+
+
+def _search_index_needs_keys(db, table):
+    return table == 'PromptStrings' and db.backend.key in _search_indexes
+
+
+def _update_search_index(db, table, keys):
+    """
+    Write listener that re-reads the written prompts into the search index of the database they belong to.
+    """
+    index = _search_indexes.get(db.backend.key)
+    if index is None or table != 'PromptStrings':
+        return
+    if keys is None:
+        db.cursor.execute("SELECT PromptID, PromptName, PromptString, Comment FROM PromptStrings")
+        index.load(db.cursor.fetchall())
+        return
+    names = list(dict.fromkeys(keys))
+    found = set()
+    for chunk in _chunked(names, MAX_QUERY_PARAMS):
+        db.cursor.execute(*select_in('PromptID, PromptName, PromptString, Comment', 'PromptStrings', 'PromptName', chunk))
+        for row in db.cursor.fetchall():
+            index.upsert(*row)
+            found.add(row[1])
+    for name in names:
+        if name not in found:
+            index.remove(name)
+
+
+def _load_relationship_graph(db, graph):
+    names = {}
+    for kind, (table, id_column, name_column) in RELATION_KINDS.items():
+        db.cursor.execute(f"SELECT {id_column}, {name_column} FROM {table}")
+        names[kind] = db.cursor.fetchall()
+    db.cursor.execute(f"SELECT {', '.join(RELATIONSHIP_COLUMNS)} FROM CentralRelationshipTable")
+    graph.load(db.cursor.fetchall(), names)
+
+
+def _relationship_graph_needs_keys(db, table):
+    return db.backend.key in _relationship_graphs and (table == 'CentralRelationshipTable' or table in KIND_BY_TABLE)
+
+
+def _update_relationship_graph(db, table, keys):
+    """
+    Write listener that re-reads the written relationship rows, or the written names of prompts, users,
+    variables and files, into the relationship graph of the database they belong to.
+    """
+    graph = _relationship_graphs.get(db.backend.key)
+    if graph is None or (table != 'CentralRelationshipTable' and table not in KIND_BY_TABLE):
+        return
+    if keys is None:
+        _load_relationship_graph(db, graph)
+        return
+    keys = list(dict.fromkeys(keys))
+    if table == 'CentralRelationshipTable':
+        found = set()
+        for chunk in _chunked(keys, MAX_QUERY_PARAMS):
+            db.cursor.execute(*select_in(', '.join(RELATIONSHIP_COLUMNS), table, 'ID', chunk))
+            for row in db.cursor.fetchall():
+                graph.upsert(*row)
+                found.add(row[0])
+        for key in keys:
+            if key not in found:
+                graph.remove(key)
+        return
+    kind = KIND_BY_TABLE[table]
+    _, id_column, name_column = RELATION_KINDS[kind]
+    rows = []
+    for chunk in _chunked(keys, MAX_QUERY_PARAMS):
+        db.cursor.execute(*select_in(f"{id_column}, {name_column}", table, name_column, chunk))
+        rows.extend(db.cursor.fetchall())
+    found = {row[1] for row in rows}
+    graph.set_names(kind, rows, [key for key in keys if key not in found])
+
+
+def _load_prompt_strings(prompt_names):
+    """
+    Loads the prompt strings for the given names from the primary database. Used by prompt_cache, which is
+    shared by every session and so must not be filled from a lagging replica.
+    """
+    with PromptDatabase(read_backend=False) as db:
+        return db.resolve_prompt_strings(prompt_names)
+
+
+# Process-wide prompt cache. Writes made through PromptDatabase invalidate the affected names.
+prompt_cache = PromptCache(
+    _load_prompt_strings,
+    ttl=float(os.getenv('PROMPT_CACHE_TTL', 300)),
+    stale_ttl=float(os.getenv('PROMPT_CACHE_STALE_TTL', 3600)),
+)
+
+
+def _invalidate_prompt_cache(db, table, keys):
+    if table == 'PromptStrings':
+        prompt_cache.invalidate(keys)
+
+
+# Nothing to invalidate by name while the cache is empty; a load racing with the write is dropped by the
+# full invalidation that keys=None causes.
+add_write_listener(_invalidate_prompt_cache, lambda db, table: table == 'PromptStrings' and len(prompt_cache) > 0)
+
+# Snapshot written by PromptDatabase.export_prompt_snapshot that work_prompts() starts from; empty to disable.
+PROMPT_SNAPSHOT_PATH = os.getenv('PROMPT_SNAPSHOT_PATH', 'prompt_catalog.snapshot')
+_snapshot_primed = False
+
+
+def _prime_from_snapshot(prompt_names):
+    """
+    On the first call in a process, fills prompt_cache with the given prompts from the snapshot file and
+    refreshes them from the database in the background, so startup does not wait for (or need) the database.
+    Prompts missing from the snapshot are loaded from the database as before.
+    """
+    global _snapshot_primed
+    if _snapshot_primed:
+        return
+    _snapshot_primed = True
+    if not PROMPT_SNAPSHOT_PATH or not os.path.exists(PROMPT_SNAPSHOT_PATH):
+        return
+    try:
+        with PromptSnapshot(PROMPT_SNAPSHOT_PATH) as snapshot:
+            prompts = snapshot.get_many(prompt_names)
+    except (OSError, ValueError) as e:
+        print(f"Ignoring the prompt snapshot: {e}")
+        return
+    prompt_cache.prime(prompts)
+    prompt_cache.refresh(prompts)
+
+
 def work_prompts():
     default_prompt = "You are a helpful assistant that always writes in Serbian."
 
@@ -631,11 +1711,11 @@ def work_prompts():
 
     prompt_names = list(all_prompts.keys())
 
-    with PromptDatabase() as db:
-        env_vars = [os.getenv(name.upper()) for name in prompt_names]
-        prompt_map = db.get_prompts_by_names(prompt_names, env_vars)
+    env_vars = {name: os.getenv(name.upper()) for name in prompt_names}
+    _prime_from_snapshot([value for value in env_vars.values() if value])
+    prompt_map = prompt_cache.get_many([value for value in env_vars.values() if value])
 
-        for name in prompt_names:
-            all_prompts[name] = prompt_map.get(name, default_prompt)
-    
-    return all_prompts
\ No newline at end of file
+    for name in prompt_names:
+        all_prompts[name] = prompt_map.get(env_vars[name], default_prompt)
+
+    return all_prompts
@@ -0,0 +1,69 @@
+import json
+import os
+import re
+from difflib import SequenceMatcher
+
+# Every CHECKPOINT_INTERVAL-th revision of a prompt stores the full text; the ones in between store a delta
+# against the revision before them. Rebuilding any revision therefore applies at most CHECKPOINT_INTERVAL - 1
+# deltas to the nearest checkpoint.
+CHECKPOINT_INTERVAL = int(os.getenv('PROMPT_REVISION_CHECKPOINT', '20'))
+
+# Deltas are computed over words, runs of whitespace and runs of punctuation rather than characters, which
+# keeps the diff fast on long prompts and the copy ranges few.
+_TOKENS = re.compile(r'\w+|\s+|[^\w\s]+')
+
+
+def _tokens(text):
+    tokens = _TOKENS.findall(text)
+    offsets = [0]
+    for token in tokens:
+        offsets.append(offsets[-1] + len(token))
+    return tokens, offsets
+
+
+def make_delta(old, new):
+    """
+    Returns a delta that turns ``old`` into ``new``: a JSON list whose items are either [start, end], a
+    character range to copy from ``old``, or a string to insert. Its size grows with the changed text,
+    not with the length of the prompt.
+    """
+    old_tokens, old_offsets = _tokens(old)
+    new_tokens, new_offsets = _tokens(new)
+    ops = []
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            start, end = old_offsets[i1], old_offsets[i2]
+            if ops and isinstance(ops[-1], list) and ops[-1][1] == start:
+                ops[-1][1] = end
+            else:
+                ops.append([start, end])
+        elif j2 > j1:
+            ops.append(new[new_offsets[j1]:new_offsets[j2]])
+    return json.dumps(ops, ensure_ascii=False, separators=(',', ':'))
+
+
+def apply_delta(old, delta):
+    """
+    Rebuilds the text a delta from make_delta was computed for.
+    """
+    return ''.join(old[op[0]:op[1]] if isinstance(op, list) else op for op in json.loads(delta))
+
+
+def is_checkpoint(revision, last_checkpoint):
+    """
+    Whether ``revision`` should be stored in full, given the number of the prompt's latest checkpoint
+    (None if it has none yet).
+    """
+    return last_checkpoint is None or revision - last_checkpoint >= CHECKPOINT_INTERVAL
+
+
+def reconstruct(rows):
+    """
+    Rebuilds a revision from its (IsCheckpoint, Body) rows, ordered from the nearest checkpoint up to the
+    revision itself.
+    """
+    text = None
+    for checkpoint, body in rows:
+        text = body if checkpoint else apply_delta(text, body)
+    return text
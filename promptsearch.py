@@ -0,0 +1,153 @@
+import itertools
+import re
+import threading
+from collections import defaultdict
+
+
+def trigrams(text):
+    """
+    Returns the set of three-character substrings of an already lower-cased ``text``.
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _TrigramPostings:
+    """
+    Maps every trigram of one field to the ids of the prompts whose value contains it.
+    """
+    def __init__(self):
+        self.postings = defaultdict(set)
+
+    def add(self, doc_id, value):
+        if value:
+            postings = self.postings
+            for gram in trigrams(value):
+                postings[gram].add(doc_id)
+
+    def remove(self, doc_id, value):
+        if value:
+            for gram in trigrams(value):
+                ids = self.postings.get(gram)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self.postings[gram]
+
+    def candidates(self, fragments):
+        """
+        Returns the ids of the prompts containing every trigram of the literal ``fragments``
+        (a superset of the real matches).
+        """
+        sets = []
+        for gram in set().union(*(trigrams(fragment) for fragment in fragments)):
+            ids = self.postings.get(gram)
+            if not ids:
+                return set()
+            sets.append(ids)
+        sets.sort(key=len)
+        result = set(sets[0])
+        for ids in sets[1:]:
+            result &= ids
+            if not result:
+                break
+        return result
+
+
+class PromptSearchIndex:
+    """
+    An in-memory trigram index over PromptName and PromptString for case-insensitive substring search.
+
+    It answers the same questions as ``LIKE '%x%'`` on PromptStrings, including the ``%`` and ``_``
+    wildcards: candidates come from the trigram postings of the literal parts of the query and are
+    verified against the stored text, so results match the SQL path. Queries without a literal part of
+    three or more characters are answered by scanning the stored prompts.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._ids = itertools.count()
+        self._clear()
+
+    def __len__(self):
+        return len(self._by_name)
+
+    def load(self, rows):
+        """
+        Replaces the index contents with (PromptID, PromptName, PromptString, Comment) rows.
+        """
+        with self._lock:
+            self._clear()
+            for row in rows:
+                self._add(*row)
+
+    def upsert(self, prompt_id, name, text, comment):
+        """
+        Adds a prompt or replaces the indexed version of it.
+        """
+        with self._lock:
+            self.remove(name)
+            self._add(prompt_id, name, text, comment)
+
+    def remove(self, name):
+        """
+        Removes a prompt from the index, if present.
+        """
+        with self._lock:
+            doc_id = self._by_name.pop(name, None)
+            if doc_id is not None:
+                doc = self._docs.pop(doc_id)
+                self._names.remove(doc_id, doc[4])
+                self._texts.remove(doc_id, doc[5])
+
+    def search_text(self, query):
+        """
+        Returns [{'PromptName', 'PromptString'}] for prompts whose text contains ``query``,
+        or None if the query uses a LIKE character class and has to be answered by the database.
+        """
+        docs = self._search(query, self._texts, 5)
+        if docs is None:
+            return None
+        return [{'PromptName': doc[1], 'PromptString': doc[2]} for doc in docs]
+
+    def search_names(self, query):
+        """
+        Returns [{'PromptName', 'PromptString', 'Comment'}] for prompts whose name contains ``query``,
+        or None if the query uses a LIKE character class and has to be answered by the database.
+        """
+        docs = self._search(query, self._names, 4)
+        if docs is None:
+            return None
+        return [{'PromptName': doc[1], 'PromptString': doc[2], 'Comment': doc[3]} for doc in docs]
+
+    def _clear(self):
+        self._docs = {}  # id -> (PromptID, PromptName, PromptString, Comment, lower name, lower text)
+        self._by_name = {}
+        self._names = _TrigramPostings()
+        self._texts = _TrigramPostings()
+
+    def _add(self, prompt_id, name, text, comment):
+        doc_id = next(self._ids)
+        lower_name = name.lower() if name is not None else None
+        lower_text = text.lower() if text is not None else None
+        self._docs[doc_id] = (prompt_id, name, text, comment, lower_name, lower_text)
+        self._by_name[name] = doc_id
+        self._names.add(doc_id, lower_name)
+        self._texts.add(doc_id, lower_text)
+
+    def _search(self, query, postings, field):
+        if '[' in query:
+            return None
+        needle = query.lower()
+        if '%' in needle or '_' in needle:
+            fragments = [fragment for fragment in re.split('[%_]', needle) if len(fragment) >= 3]
+            pattern = re.compile('.*'.join('.'.join(map(re.escape, part.split('_'))) for part in needle.split('%')), re.DOTALL)
+            matches_value = pattern.search
+        else:
+            fragments = [needle] if len(needle) >= 3 else []
+            matches_value = lambda value: needle in value
+        with self._lock:
+            docs = self._docs
+            candidates = postings.candidates(fragments) if fragments else docs.keys()
+            matches = [docs[doc_id] for doc_id in candidates
+                       if docs[doc_id][field] is not None and matches_value(docs[doc_id][field])]
+        matches.sort(key=lambda doc: doc[0])
+        return matches
@@ -0,0 +1,153 @@
+import mmap
+import os
+import struct
+import time
+
+# A snapshot file is:
+#   header | index entry per prompt, sorted by UTF-8 name | UTF-8 names and prompt strings
+# Every index entry holds the offsets and lengths of its name and string, so a lookup is a binary search
+# over the memory-mapped index that only decodes the one string it returns; opening a snapshot reads
+# nothing but the header.
+MAGIC = b'PCSN'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHqdI')  # magic, format version, reserved, catalog version, created at, count
+ENTRY = struct.Struct('<QIQI')  # name offset, name length, string offset, string length
+
+
+def write_snapshot(path, prompts, version=0):
+    """
+    Writes a snapshot of prompt name -> prompt string. The file is written next to ``path`` and moved into
+    place, so readers never see a partial snapshot.
+
+    :param prompts: A dict of prompt name -> prompt string; prompts without a string are left out.
+    :param version: The catalog version the snapshot was taken at, e.g. the change log high-water mark.
+    :return: The number of prompts written.
+    """
+    items = sorted((name.encode('utf-8'), value.encode('utf-8'))
+                   for name, value in prompts.items() if value is not None)
+    entries = []
+    offset = HEADER.size + ENTRY.size * len(items)
+    for name, value in items:
+        entries.append(ENTRY.pack(offset, len(name), offset + len(name), len(value)))
+        offset += len(name) + len(value)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, version or 0, time.time(), len(items)))
+        f.writelines(entries)
+        for name, value in items:
+            f.write(name)
+            f.write(value)
+    os.replace(temp_path, path)
+    return len(items)
+
+
+class PromptSnapshot:
+    """
+    A read-only, memory-mapped prompt snapshot written by write_snapshot.
+
+    ``version`` is the catalog version the snapshot was taken at and ``created_at`` its Unix timestamp.
+    """
+    def __init__(self, path):
+        """
+        :raises ValueError: If the file is not a snapshot or was written in another format version.
+        """
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mm) < HEADER.size:
+                raise ValueError(f"{path} is not a prompt snapshot")
+            magic, format_version, _, self.version, self.created_at, self._count = HEADER.unpack_from(self._mm)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a prompt snapshot")
+            if format_version != FORMAT_VERSION:
+                raise ValueError(f"{path} has snapshot format {format_version}; expected {FORMAT_VERSION}")
+            # Names and strings are written in index order, so the last entry ends where the file does.
+            if len(self._mm) < HEADER.size + ENTRY.size * self._count or (
+                    self._count and sum(self._entry(self._count - 1)[2:]) > len(self._mm)):
+                raise ValueError(f"{path} is truncated")
+        except Exception:
+            self._mm.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, name):
+        return self._find(name) is not None
+
+    def close(self):
+        self._mm.close()
+
+    def _entry(self, index):
+        return ENTRY.unpack_from(self._mm, HEADER.size + ENTRY.size * index)
+
+    def _find(self, name):
+        key = name.encode('utf-8')
+        mm = self._mm
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            entry = self._entry(middle)
+            found = mm[entry[0]:entry[0] + entry[1]]
+            if found == key:
+                return entry
+            if found < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def get(self, name, default=None):
+        """
+        Returns the prompt string for ``name``, or ``default`` if the snapshot does not contain it.
+        """
+        entry = self._find(name)
+        if entry is None:
+            return default
+        return self._mm[entry[2]:entry[2] + entry[3]].decode('utf-8')
+
+    def get_many(self, names):
+        """
+        Returns a dict of name -> prompt string for the given names. Names that are not in the snapshot are left out.
+        """
+        result = {}
+        for name in names:
+            value = self.get(name)
+            if value is not None:
+                result[name] = value
+        return result
+
+    def names(self):
+        """
+        Yields the prompt names in the snapshot, in sorted UTF-8 order.
+        """
+        for index in range(self._count):
+            entry = self._entry(index)
+            yield self._mm[entry[0]:entry[0] + entry[1]].decode('utf-8')
+
+
+def main():
+    """
+    Deploy step: python promptsnapshot.py [path] exports the prompt catalog of the configured database.
+    """
+    import argparse
+    from promptdb import PROMPT_SNAPSHOT_PATH, PromptDatabase
+
+    parser = argparse.ArgumentParser(description="Export the prompt catalog to a snapshot file.")
+    parser.add_argument("path", nargs="?", default=PROMPT_SNAPSHOT_PATH or 'prompt_catalog.snapshot',
+                        help="Where to write the snapshot (default: PROMPT_SNAPSHOT_PATH).")
+    args = parser.parse_args()
+    with PromptDatabase() as db:
+        count = db.export_prompt_snapshot(args.path)
+    print(f"Exported {count} prompts to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import threading
+
+# The entities CentralRelationshipTable links, with their table, ID column and name column. The ID column
+# is also the entity's column in CentralRelationshipTable.
+RELATION_KINDS = {
+    'prompt': ('PromptStrings', 'PromptID', 'PromptName'),
+    'user': ('Users', 'UserID', 'Username'),
+    'variable': ('PromptVariables', 'VariableID', 'VariableName'),
+    'file': ('PythonFiles', 'FileID', 'Filename'),
+}
+KINDS = tuple(RELATION_KINDS)
+KIND_BY_TABLE = {table: kind for kind, (table, _, _) in RELATION_KINDS.items()}
+
+# Columns of a relationship row, in the order of RelationshipGraph.upsert.
+RELATIONSHIP_COLUMNS = ['ID'] + [id_column for _, id_column, _ in RELATION_KINDS.values()]
+
+
+class RelationshipGraph:
+    """
+    An in-memory copy of CentralRelationshipTable with the names of the prompts, users, variables and files
+    it links, kept as adjacency maps between every pair of entity kinds.
+
+    For each entity the graph keeps the IDs of its relationship rows and, per other kind, a count of the
+    entities it is linked to, so "all prompts used by file X" or "all users of variable Y" is a dictionary
+    lookup whose cost grows with the size of the answer rather than with the table.
+    """
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clear()
+
+    def __len__(self):
+        return len(self._edges)
+
+    def _clear(self):
+        self._edges = {}  # relationship ID -> (PromptID, UserID, VariableID, FileID)
+        self._rows = {kind: {} for kind in KINDS}  # kind -> entity ID -> {relationship ID: None}
+        self._adjacent = {kind: {} for kind in KINDS}  # kind -> entity ID -> other kind -> {other ID: count}
+        self._names = {kind: {} for kind in KINDS}  # kind -> entity ID -> name
+        self._ids = {kind: {} for kind in KINDS}  # kind -> name -> entity ID
+
+    def load(self, relationships, names):
+        """
+        Replaces the graph contents.
+
+        :param relationships: (ID, PromptID, UserID, VariableID, FileID) rows.
+        :param names: A dict of kind -> (ID, name) rows for every kind in RELATION_KINDS.
+        """
+        with self._lock:
+            self._clear()
+            for kind, rows in names.items():
+                self.set_names(kind, rows)
+            for row in relationships:
+                self.upsert(*row)
+
+    def set_names(self, kind, rows, missing=()):
+        """
+        Stores (ID, name) rows of one kind, and forgets the ``missing`` names, e.g. of deleted rows.
+        """
+        with self._lock:
+            names, ids = self._names[kind], self._ids[kind]
+            for name in missing:
+                id_value = ids.pop(name, None)
+                if id_value is not None and names.get(id_value) == name:
+                    del names[id_value]
+            for id_value, name in rows:
+                previous = names.get(id_value)
+                if previous is not None and ids.get(previous) == id_value:
+                    del ids[previous]
+                names[id_value] = name
+                ids[name] = id_value
+
+    def upsert(self, relationship_id, *entity_ids):
+        """
+        Adds a relationship row, or replaces the row with the same ID.
+        """
+        with self._lock:
+            if relationship_id in self._edges:
+                self.remove(relationship_id)
+            self._edges[relationship_id] = entity_ids
+            pairs = tuple(zip(KINDS, entity_ids))
+            for kind, id_value in pairs:
+                rows = self._rows[kind].get(id_value)
+                if rows is None:
+                    rows = self._rows[kind][id_value] = {}
+                    self._adjacent[kind][id_value] = {other_kind: {} for other_kind in KINDS if other_kind != kind}
+                rows[relationship_id] = None
+                adjacent = self._adjacent[kind][id_value]
+                for other_kind, other_id in pairs:
+                    if other_kind != kind:
+                        counts = adjacent[other_kind]
+                        counts[other_id] = counts.get(other_id, 0) + 1
+
+    def remove(self, relationship_id):
+        """
+        Drops a relationship row; unknown IDs are ignored.
+        """
+        with self._lock:
+            entity_ids = self._edges.pop(relationship_id, None)
+            if entity_ids is None:
+                return
+            for kind, id_value in zip(KINDS, entity_ids):
+                rows = self._rows[kind][id_value]
+                del rows[relationship_id]
+                if not rows:
+                    del self._rows[kind][id_value]
+                    del self._adjacent[kind][id_value]
+                    continue
+                adjacent = self._adjacent[kind][id_value]
+                for other_kind, other_id in zip(KINDS, entity_ids):
+                    if other_kind != kind:
+                        counts = adjacent[other_kind]
+                        if counts[other_id] > 1:
+                            counts[other_id] -= 1
+                        else:
+                            del counts[other_id]
+
+    def id_for(self, kind, name):
+        """
+        Returns the ID of a named entity, or None if the graph does not know the name.
+        """
+        return self._ids[kind].get(name)
+
+    def name_for(self, kind, id_value):
+        return self._names[kind].get(id_value)
+
+    def related(self, kind, id_value, related_kind):
+        """
+        Returns the IDs of the ``related_kind`` entities linked to an entity, e.g.
+        related('file', file_id, 'prompt') for the prompts used by a file.
+        """
+        with self._lock:
+            return list(self._adjacent[kind].get(id_value, {}).get(related_kind, ()))
+
+    def related_names(self, kind, name, related_kind):
+        """
+        Like related(), but takes and returns names. Returns an empty list for unknown names.
+        """
+        with self._lock:
+            id_value = self._ids[kind].get(name)
+            names = self._names[related_kind]
+            return [names[other_id] for other_id in self.related(kind, id_value, related_kind) if other_id in names]
+
+    def relationships(self, kind=None, id_value=None):
+        """
+        Returns (ID, PromptName, Username, VariableName, Filename) rows for the relationships of one entity,
+        or for all relationships when ``kind`` is None. Like the join they replace, rows referring to an
+        unknown entity are left out.
+        """
+        with self._lock:
+            if kind is None:
+                relationship_ids = list(self._edges)
+            else:
+                relationship_ids = list(self._rows[kind].get(id_value, ()))
+            result = []
+            for relationship_id in relationship_ids:
+                row = [relationship_id]
+                for entity_kind, entity_id in zip(KINDS, self._edges[relationship_id]):
+                    name = self._names[entity_kind].get(entity_id)
+                    if name is None:
+                        break
+                    row.append(name)
+                else:
+                    result.append(tuple(row))
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = {"relationships": len(self._edges)}
+            for kind in KINDS:
+                stats[f"{kind}_names"] = len(self._names[kind])
+        return stats
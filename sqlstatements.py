@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Largest IN-list bucket; stays below SQL Server's 2100-parameter limit.
+MAX_BUCKET = 2048
+
+
+def bucket_size(count):
+    """
+    Returns the power of two an IN list of ``count`` values is padded to (capped at MAX_BUCKET), so that
+    every list length maps to one of a dozen statements.
+    """
+    if count <= 1:
+        return 1
+    return min(1 << (count - 1).bit_length(), MAX_BUCKET)
+
+
+def pad_values(values):
+    """
+    Pads a non-empty list of IN-list values to its bucket size by repeating the last value, which does not
+    change the rows the IN matches.
+    """
+    values = list(values)
+    if len(values) > MAX_BUCKET:
+        raise ValueError(f"IN lists are limited to {MAX_BUCKET} values; got {len(values)}.")
+    padding = bucket_size(len(values)) - len(values)
+    statement_cache.count_padding(padding)
+    return values + [values[-1]] * padding
+
+
+class StatementCache:
+    """
+    A bounded LRU cache of generated SQL text keyed by statement shape, e.g. ('insert', table, columns).
+    Counts hits, builds and the time spent building, so the Python-side cost of SQL generation is visible.
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._statements = OrderedDict()
+        self._stats = {"hits": 0, "builds": 0, "build_seconds": 0.0, "evictions": 0, "padded_values": 0}
+
+    def get(self, key, build):
+        """
+        Returns the SQL for ``key``, calling ``build()`` to generate it the first time.
+        """
+        with self._lock:
+            sql = self._statements.get(key)
+            if sql is not None:
+                self._statements.move_to_end(key)
+                self._stats["hits"] += 1
+                return sql
+        started = time.perf_counter()
+        sql = build()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["build_seconds"] += elapsed
+            self._statements[key] = sql
+            if len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+                self._stats["evictions"] += 1
+        return sql
+
+    def count_padding(self, padded):
+        with self._lock:
+            self._stats["padded_values"] += padded
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["statements"] = len(self._statements)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+
+statement_cache = StatementCache()
+
+
+def placeholders(count):
+    return ', '.join(['?'] * count)
+
+
+def insert_sql(table, columns):
+    """
+    INSERT INTO table (columns) VALUES (?, ...).
+    """
+    columns = tuple(columns)
+    return statement_cache.get(('insert', table, columns),
+                               lambda: f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders(len(columns))})")
+
+
+def update_sql(table, columns, where):
+    """
+    UPDATE table SET column = ?, ... WHERE where.
+    """
+    columns = tuple(columns)
+    return statement_cache.get(('update', table, columns, where),
+                               lambda: f"UPDATE {table} SET {', '.join(f'{column} = ?' for column in columns)} WHERE {where}")
+
+
+def select_in(select_list, table, column, values):
+    """
+    Builds SELECT select_list FROM table WHERE column IN (...) for up to MAX_BUCKET values, with the IN list
+    padded to its bucket size.
+
+    :return: The SQL and the padded parameter list.
+    """
+    params = pad_values(values)
+    sql = statement_cache.get(('select_in', select_list, table, column, len(params)),
+                              lambda: f"SELECT {select_list} FROM {table} WHERE {column} IN ({placeholders(len(params))})")
+    return sql, params
@@ -0,0 +1,22 @@
+import os
+
+import streamlit as st
+
+import promptdb
+
+# Streamlit integration for the prompt cache. promptdb itself does not import Streamlit; apps that want the
+# prompts in Streamlit's cache, shared by all sessions and cleared from the UI like any other cached data,
+# import work_prompts from here instead.
+
+
+@st.cache_data(ttl=float(os.getenv('PROMPT_CACHE_TTL', 300)), show_spinner=False)
+def work_prompts():
+    return promptdb.work_prompts()
+
+
+def _clear_cached_prompts(db, table, keys):
+    if table == 'PromptStrings':
+        work_prompts.clear()
+
+
+promptdb.add_write_listener(_clear_cached_prompts, lambda db, table: False)
@@ -14,7 +14,6 @@ def handle_table_update(table_name, id_column, name_column, additional_fields=No
     with col1:
         with PromptDatabase() as db:
             prompt_names = db.get_records_from_column(table_name, name_column)
-            print(f"Prompt names fetched: {prompt_names}")  # Debug print
 
             selected_name = st.selectbox(f"Select {name_column} to Update", [''] + prompt_names)
             existing_details = db.get_record_by_name(table=table_name, name_column=name_column, value=selected_name) if selected_name else None
@@ -99,31 +98,39 @@ def add_new_record(form_id, header, table_name, input_fields):
 
 def show_all_table_data2(table_name):
     with PromptDatabase() as db: 
-        records, columns = db.get_all_records_from_table(table_name) 
-    df = pd.DataFrame(records, columns=columns)
+        df = db.get_all_records_frame(table_name)
     st.caption("To see entire text: Double Click on actual text, or move slider, or enlarge the table view")
     st.dataframe(df, use_container_width=True, hide_index=True)                
 
 import pandas as pd
 
+PAGE_SIZE = 50
+
+def _set_page(state_key, after=None, before=None):
+    st.session_state[state_key] = {"after": after, "before": before}
+
 def show_all_table_data(table_name):
+    # Only the visible page is loaded; next/previous move by primary key (keyset pagination)
+    state_key = f"{table_name}_page"
+    position = st.session_state.get(state_key, {"after": None, "before": None})
     with PromptDatabase() as db:
-        records, columns = db.get_all_records_from_table(table_name)
-    
-    # Convert records to tuples explicitly to avoid any hidden issues
-    records = [tuple(record) for record in records]
-    
-    # Ensure each record is a tuple and has the correct length
-    if records and all(len(record) == len(columns) for record in records):
-        try:
-            df = pd.DataFrame(records, columns=columns)
-            st.caption("To see entire text: Double Click on actual text, or move slider, or enlarge the table view")
-            st.dataframe(df, use_container_width=True, hide_index=True)
-        except Exception as e:
-            st.error(f"Failed to create DataFrame: {e}")
-            print(f"Failed to create DataFrame: {e}")
+        page = db.get_table_page(table_name, after=position["after"], before=position["before"], page_size=PAGE_SIZE,
+                                 as_frame=True)
+
+    if not page["records"].empty:
+        df = page["records"]
+        st.caption("To see entire text: Double Click on actual text, or move slider, or enlarge the table view")
+        st.dataframe(df, use_container_width=True, hide_index=True)
     else:
-        st.error("Mismatch between record data and column definitions. Please check the database schema and data consistency.")
+        st.info("No records on this page.")
+
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        st.button("Previous", key=f"{state_key}_previous", disabled=not page["has_previous"],
+                  on_click=_set_page, args=(state_key,), kwargs={"before": page["first_key"]})
+    with next_col:
+        st.button("Next", key=f"{state_key}_next", disabled=not page["has_next"],
+                  on_click=_set_page, args=(state_key,), kwargs={"after": page["last_key"]})
 
         
 if operation == "Create New Record":
@@ -170,6 +177,7 @@ elif operation == "Search Prompt Records":
         if submit_search:
             st.caption("To see entire text: Double Click on actual text, or move slider, or enlarge the table view")
             with PromptDatabase() as db:
+                db.enable_search_index()
                 records = db.search_for_string_in_prompt_text(search_string)
             
             if records:
@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dbbackend import SQLiteBackend  # noqa: E402
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """
+    A SQLiteBackend on a fresh file with the library's tables.
+    """
+    return SQLiteBackend(str(tmp_path / "test.sqlite"))
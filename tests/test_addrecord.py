@@ -0,0 +1,34 @@
+from promptdb import PromptDatabase
+
+
+def add_names(db):
+    db.add_record('Users', Username="ana")
+    db.add_record('PromptVariables', VariableName="x")
+    db.add_record('PythonFiles', Filename="app.py", FilePath="app.py")
+
+
+def changes(db):
+    db.cursor.execute("SELECT PromptName FROM PromptStringsChanges ORDER BY ChangeID")
+    return [row[0] for row in db.cursor.fetchall()]
+
+
+def test_add_new_record_resolves_the_names_and_logs_the_change(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_names(db)
+        assert db.add_new_record("ana", "app.py", "x", "text", "p", "comment") == "Record added successfully."
+        db.cursor.execute("SELECT u.Username, v.VariableName, f.Filename FROM PromptStrings p "
+                          "JOIN Users u ON u.UserID = p.UserID JOIN PromptVariables v ON v.VariableID = p.VariableID "
+                          "JOIN PythonFiles f ON f.FileID = p.VariableFileID WHERE p.PromptName = 'p'")
+        assert tuple(db.cursor.fetchone()) == ("ana", "x", "app.py")
+        assert changes(db) == ["p"]
+
+
+def test_add_new_record_names_every_name_that_did_not_resolve(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_names(db)
+        assert db.add_new_record("bob", "app.py", "x", "text", "p", "") == "Error: Missing UserID for 'bob'."
+        assert db.add_new_record("ana", "other.py", "y", "text", "p", "") == \
+            "Error: Missing VariableID for 'y', VariableFileID for 'other.py'."
+        db.cursor.execute("SELECT COUNT(*) FROM PromptStrings")
+        assert db.cursor.fetchone()[0] == 0
+        assert changes(db) == []
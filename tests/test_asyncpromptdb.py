@@ -0,0 +1,18 @@
+import asyncio
+
+from asyncpromptdb import ASYNC_METHODS, AsyncPromptDatabase
+
+
+def test_maintenance_methods_are_exposed():
+    for name in ('create_change_log', 'create_revision_log', 'prune_change_log', 'export_prompt_snapshot'):
+        assert name in ASYNC_METHODS
+    assert 'close' not in ASYNC_METHODS and 'iter_table_records' not in ASYNC_METHODS
+
+
+def test_methods_run_on_the_worker_pool(backend):
+    async def main():
+        async with AsyncPromptDatabase(backend=backend) as db:
+            await db.add_record('PromptStrings', PromptName="a", PromptString="text of a", Comment="")
+            return await db.resolve_prompt_strings(["a"])
+
+    assert asyncio.run(main()) == {"a": "text of a"}
@@ -0,0 +1,42 @@
+from promptdb import PromptDatabase
+
+
+def prompts(db):
+    db.cursor.execute("SELECT PromptName, PromptString, Comment FROM PromptStrings ORDER BY PromptName")
+    return [tuple(row) for row in db.cursor.fetchall()]
+
+
+def test_outcomes_follow_input_order(backend):
+    with PromptDatabase(backend=backend) as db:
+        db.add_record('PromptStrings', PromptName="a", PromptString="old a", Comment="kept")
+        outcomes = db.bulk_upsert_prompts([
+            {'PromptName': "a", 'PromptString': "new a"},
+            {'PromptName': "b", 'PromptString': "first b", 'Comment': "first"},
+            {'PromptName': "c", 'PromptString': "c"},
+            {'PromptName': "b", 'PromptString': "second b"},
+            {'PromptName': "c", 'PromptString': "c again", 'Comment': "in the next batch"},
+        ], batch_size=4)
+        assert outcomes == [("a", 'updated'), ("b", 'duplicate'), ("c", 'inserted'), ("b", 'inserted'),
+                            ("c", 'updated')]
+        # Only the last record per name in a batch is applied; missing columns keep their value.
+        assert prompts(db) == [("a", "new a", "kept"), ("b", "second b", None), ("c", "c again", "in the next batch")]
+
+
+def test_a_failing_batch_is_reported_per_row_and_rolled_back(backend):
+    with PromptDatabase(backend=backend) as db:
+        db.cursor.execute("SELECT COUNT(*) FROM PromptStringsChanges")
+        changes = db.cursor.fetchone()[0]
+        outcomes = db.bulk_upsert_prompts([
+            {'PromptName': "a", 'PromptString': "a"},
+            {'PromptName': "b", 'PromptString': "b"},
+            {'PromptName': "c", 'PromptString': "c"},
+            {'PromptName': None, 'PromptString': "no name"},
+            {'PromptName': "d", 'PromptString': "d"},
+        ], batch_size=2)
+        assert outcomes[:2] == [("a", 'inserted'), ("b", 'inserted')]
+        assert [name for name, _ in outcomes[2:4]] == ["c", None]
+        assert all(outcome.startswith("Error in bulk_upsert_prompts:") for _, outcome in outcomes[2:4])
+        assert outcomes[4] == ("d", 'inserted')
+        assert [row[0] for row in prompts(db)] == ["a", "b", "d"]
+        db.cursor.execute("SELECT PromptName FROM PromptStringsChanges WHERE ChangeID > ? ORDER BY ChangeID", (changes,))
+        assert [row[0] for row in db.cursor.fetchall()] == ["a", "b", "d"]
@@ -0,0 +1,50 @@
+import pytest
+
+import conversationdb
+from conversationdb import ConversationDatabaseManager
+
+
+@pytest.fixture
+def db(backend, monkeypatch):
+    monkeypatch.setattr(conversationdb, 'FACETS_REFRESH_INTERVAL', 0)
+    with ConversationDatabaseManager(backend=backend) as db:
+        yield db
+    conversationdb._facet_indexes.pop(backend.key, None)
+
+
+def insert_row(backend, row_id, app_name, thread_id):
+    # A row written by another client with the id its INSERT was given.
+    conn = backend.connect()
+    conn.execute("INSERT INTO conversations (id, app_name, user_name, thread_id, conversation) VALUES (?, ?, 'u', ?, 'x')",
+                 (row_id, app_name, thread_id))
+    conn.commit()
+    conn.close()
+
+
+def test_new_rows_are_merged_once(db):
+    db.insert_conversation("app", "ana", "t1", "hello")
+    facets = db.facets()
+    assert facets.counts('app_name') == {"app": 1}
+    db.insert_conversation("app", "ana", "t1", "again")
+    db.insert_conversation("other", "bob", "t2", "hi")
+    db.facets()
+    db.facets()
+    assert facets.counts('app_name') == {"app": 2, "other": 1}
+    assert facets.thread_counts('user_name', "ana") == {"t1": 2}
+
+
+def test_rows_committed_below_the_mark_are_merged_later(db, backend):
+    insert_row(backend, 1, "app", "t1")
+    insert_row(backend, 3, "app", "t3")
+    facets = db.facets()
+    assert facets.gaps == {2}
+    insert_row(backend, 5, "app", "t5")
+    db.facets()
+    assert facets.gaps == {2, 4}
+    insert_row(backend, 2, "late", "t2")
+    insert_row(backend, 4, "late", "t4")
+    db.facets()
+    assert facets.counts('app_name') == {"app": 3, "late": 2}
+    assert facets.gaps == set()
+    db.facets()
+    assert facets.counts('app_name') == {"app": 3, "late": 2}
@@ -0,0 +1,122 @@
+import pytest
+
+import conversationdb
+from conversationdb import ConversationDatabaseManager
+from conversationindex import ConversationSearchIndex, fts_query, like_fts_query
+
+
+@pytest.fixture
+def db(backend):
+    with ConversationDatabaseManager(backend=backend) as db:
+        yield db
+    conversationdb._search_indexes.pop(backend.key, None)
+    conversationdb._change_log_available.pop(backend.key, None)
+
+
+@pytest.fixture
+def index(tmp_path):
+    with ConversationSearchIndex(str(tmp_path / "index.sqlite")) as index:
+        yield index
+
+
+def found(index, query):
+    return sorted(thread_id for thread_id, _ in index.search(query))
+
+
+def execute(backend, *statements):
+    # Writes made by another client, straight to the database.
+    conn = backend.connect()
+    for statement, params in statements:
+        conn.execute(statement, params)
+    conn.commit()
+    conn.close()
+
+
+def test_fts_query():
+    assert fts_query('invoice "please send" it') == '"invoice" "please send" "it"'
+    assert fts_query('NOT invoice* OR') == '"NOT" "invoice*" "OR"'
+    assert fts_query('   ') is None
+    assert like_fts_query("%send the invoice%") == '"the" "invoice"*'
+
+
+def test_inserts_updates_and_deletes_are_indexed_with_the_change_log(db, index):
+    db.create_change_log()
+    db.insert_conversation("app", "ana", "t1", "please send the invoice")
+    db.insert_conversation("app", "bob", "t2", "hello there")
+    assert db.refresh_search_index(index) == {'indexed': 2, 'deleted': 0}
+    assert found(index, "invoice") == ["t1"]
+
+    db.update_conversation("t2", "the invoice is late")
+    db.insert_conversation("app", "bob", "t3", "another invoice")
+    db.refresh_search_index(index)
+    assert found(index, "invoice") == ["t1", "t2", "t3"]
+    assert found(index, "hello") == []
+
+    db.delete_conversation("t1")
+    assert db.refresh_search_index(index)['deleted'] == 1
+    assert found(index, "invoice") == ["t2", "t3"]
+
+
+def test_phrase_queries_match_words_in_order(db, index):
+    db.insert_conversation("app", "ana", "t1", "please send the invoice")
+    db.insert_conversation("app", "bob", "t2", "the invoice, please send it")
+    db.refresh_search_index(index)
+    assert found(index, '"send the invoice"') == ["t1"]
+    assert found(index, 'send invoice') == ["t1", "t2"]
+
+
+def test_ranked_search_returns_previews_best_first(db, tmp_path):
+    db.insert_conversation("app", "ana", "t1", "invoice")
+    db.insert_conversation("app", "bob", "t2", "invoice invoice invoice, about the invoice")
+    db.search_index(str(tmp_path / "ranked.sqlite"))
+    df = db.search_conversations_ranked("invoice")
+    assert list(df["thread_id"]) == ["t2", "t1"]
+    assert df["score"].is_monotonic_decreasing
+    assert db.search_conversations_ranked("missing").empty
+
+
+def test_like_candidates_are_a_superset_of_sql_like(db, index):
+    texts = ["Please send the invoice", "invoices sent", "sendinvoice", "the invoice, please", "Čačak invoice",
+             "re-send: THE INVOICE", "no match here", "send_the_invoice", "send  the invoice"]
+    for number, text in enumerate(texts):
+        db.insert_conversation("app", "ana", f"t{number}", text)
+    db.refresh_search_index(index)
+    for pattern in ["%send the invoice%", "%invoice%", "%invoice please%", "%the invoice,%", "%end the inv%",
+                    "%send_the%", "%s%d the%", "%čačak%", "%THE%INVOICE%"]:
+        db.cursor.execute("SELECT thread_id FROM conversations WHERE conversation LIKE ?", (pattern,))
+        expected = {row[0] for row in db.cursor.fetchall()}
+        assert expected <= set(index.like_threads(pattern)), pattern
+
+
+def test_rows_committed_below_the_mark_are_indexed_later(db, index):
+    db.insert_conversation("app", "ana", "t1", "first")
+    # Row 3 commits while row 2 is still being written.
+    execute(db.backend, ("INSERT INTO conversations (id, app_name, user_name, thread_id, conversation) "
+                         "VALUES (3, 'app', 'bob', 't3', 'third')", ()))
+    db.refresh_search_index(index)
+    assert index.gaps('last_id') == {2}
+    execute(db.backend, ("INSERT INTO conversations (id, app_name, user_name, thread_id, conversation) "
+                         "VALUES (2, 'app', 'bob', 't2', 'late arrival')", ()))
+    db.refresh_search_index(index)
+    assert found(index, "late") == ["t2"]
+    assert index.gaps('last_id') == set()
+
+
+def test_changes_committed_below_the_mark_are_indexed_later(db, index):
+    db.create_change_log()
+    db.insert_conversation("app", "ana", "t1", "first")
+    db.insert_conversation("app", "bob", "t2", "second")
+    db.refresh_search_index(index)
+    _, last_change_id = index.high_water_marks()
+    db.cursor.execute("DROP TRIGGER conversation_changes_update")
+    db.conn.commit()
+    # The change with the higher id commits first.
+    execute(db.backend, ("UPDATE conversations SET conversation = 'first edited' WHERE thread_id = 't1'", ()),
+            ("INSERT INTO conversation_changes (change_id, thread_id) VALUES (?, 't1')", (last_change_id + 2,)))
+    db.refresh_search_index(index)
+    assert index.gaps('last_change_id') == {last_change_id + 1}
+    execute(db.backend, ("UPDATE conversations SET conversation = 'second edited' WHERE thread_id = 't2'", ()),
+            ("INSERT INTO conversation_changes (change_id, thread_id) VALUES (?, 't2')", (last_change_id + 1,)))
+    db.refresh_search_index(index)
+    assert found(index, "edited") == ["t1", "t2"]
+    assert index.gaps('last_change_id') == set()
@@ -0,0 +1,73 @@
+import pytest
+
+import conversationdb
+from conversationdb import ConversationDatabaseManager
+from conversationcodec import like_matcher
+from conversationindex import like_fts_query
+
+
+def body(*words):
+    # Long enough to be stored compressed.
+    return " ".join(words) + " " + "filler text " * 60
+
+
+@pytest.fixture
+def db(backend, tmp_path):
+    with ConversationDatabaseManager(backend=backend, compress=True) as db:
+        db.create_change_log()
+        db.insert_conversation("app", "ana", "t1", body("please send the invoice"))
+        db.insert_conversation("app", "bob", "t2", body("invoice please"))
+        db.insert_conversation("app", "bob", "t3", body("Čačak, Beograd"))
+        index = db.search_index(str(tmp_path / "index.sqlite"))
+        yield db
+    index.close()
+    conversationdb._search_indexes.pop(backend.key, None)
+    conversationdb._change_log_available.pop(backend.key, None)
+
+
+def threads(df):
+    return list(df["thread_id"])
+
+
+def test_like_fts_query_skips_partial_words():
+    assert like_fts_query("%invoice please%") == '"please"*'
+    assert like_fts_query("%invoice%") is None
+    assert like_fts_query("% čačak %") == '"čačak"'
+
+
+def test_compressed_search_reads_only_candidate_threads(db):
+    assert db.cursor.execute("SELECT COUNT(*) FROM conversations WHERE conversation LIKE ?",
+                             (f"{conversationdb.conversationcodec.MARKER}%",)).fetchone()[0] == 3
+    index = conversationdb._search_indexes[db.backend.key]
+    assert db._candidate_index() is index
+    assert index.like_threads("%invoice please%") == ["t2"]
+    assert threads(db.search_conversations("invoice please")) == ["t2"]
+    assert threads(db.search_conversations("voice")) == ["t1", "t2"]
+    assert threads(db.search_conversations("čačak")) == ["t3"]
+
+
+def test_compressed_search_sees_updates(db):
+    db.update_conversation("t1", body("invoice please, thanks"))
+    assert threads(db.search_conversations("invoice please")) == ["t1", "t2"]
+    db.update_conversation("t2", body("nothing to see"))
+    assert threads(db.search_conversations("invoice please")) == ["t1"]
+
+
+def test_without_an_index_compressed_rows_are_matched_on_their_head(backend):
+    with ConversationDatabaseManager(backend=backend, compress=True) as db:
+        db.insert_conversation("app", "ana", "t1", body("invoice please"))
+        db.insert_conversation("app", "bob", "t2", body("hello") + " invoice please")
+        db.insert_conversation("app", "bob", "t3", "short invoice please")
+        assert db._candidate_index() is None
+        assert threads(db.search_conversations("invoice please")) == ["t1", "t3"]
+    conversationdb._change_log_available.pop(backend.key, None)
+
+
+def test_like_matcher_character_classes():
+    assert like_matcher("%[ab]c%", char_classes=True)("xxBc")
+    assert not like_matcher("%[^a-c]z%", char_classes=True)("bz")
+    assert like_matcher("%[^a-c]z%", char_classes=True)("dz")
+    assert like_matcher("50[%]", char_classes=True)("50%")
+    # SQLite matches [ literally
+    assert like_matcher("%[ab]c%")("x[ab]c") and not like_matcher("%[ab]c%")("xbc")
+    assert like_fts_query("%invoice [ab]please now%", char_classes=True) == '"now"*'
@@ -0,0 +1,90 @@
+import pytest
+
+from conversationdb import ConversationDatabaseManager
+from conversationwriter import ConversationWriter
+
+
+@pytest.fixture
+def writer(backend):
+    with ConversationDatabaseManager(backend=backend) as db:
+        writer = db.background_writer(max_batch=100, flush_interval=60)
+    yield writer
+    writer.close()
+
+
+def rows(backend):
+    with ConversationDatabaseManager(backend=backend) as db:
+        db.cursor.execute("SELECT thread_id, conversation FROM conversations ORDER BY id")
+        return [tuple(row) for row in db.cursor.fetchall()]
+
+
+def test_update_after_insert_keeps_the_edit(backend, writer):
+    writer.insert("app", "user", "t1", "original row text")
+    writer.update("t1", "edited text")
+    assert writer.flush()
+    assert rows(backend) == [("t1", "edited text")]
+
+
+def test_update_after_insert_replaces_existing_rows(backend, writer):
+    with ConversationDatabaseManager(backend=backend) as db:
+        db.insert_conversation("app", "user", "t1", "existing row")
+    writer.insert("app", "user", "t1", "new row")
+    writer.update("t1", "edited text")
+    assert writer.flush()
+    assert rows(backend) == [("t1", "edited text"), ("t1", "edited text")]
+
+
+def test_insert_after_update_is_written_after_it(backend, writer):
+    with ConversationDatabaseManager(backend=backend) as db:
+        db.insert_conversation("app", "user", "t1", "existing row")
+    writer.update("t1", "edited text")
+    writer.insert("app", "user", "t1", "new row")
+    assert writer.flush()
+    assert rows(backend) == [("t1", "edited text"), ("t1", "new row")]
+
+
+def test_inserts_of_the_same_thread_are_all_written(backend, writer):
+    writer.insert("app", "user", "t1", "msg 1")
+    writer.insert("app", "user", "t1", "msg 2")
+    assert writer.flush()
+    assert rows(backend) == [("t1", "msg 1"), ("t1", "msg 2")]
+
+
+def test_updates_and_saves_are_coalesced(backend, writer):
+    writer.save("app", "user", "t1", "first")
+    writer.update("t1", "second")
+    writer.save("app", "user", "t1", "third")
+    assert writer.stats()["pending"] == 1
+    assert writer.pending_conversation("t1") == "third"
+    assert writer.flush()
+    assert rows(backend) == [("t1", "third")]
+
+
+def test_discard_drops_queued_writes(backend, writer):
+    writer.insert("app", "user", "t1", "msg 1")
+    writer.insert("app", "user", "t2", "other")
+    writer.update("t1", "edited")
+    writer.discard("t1")
+    assert writer.pending_conversation("t1") is None
+    assert writer.flush()
+    assert rows(backend) == [("t2", "other")]
+
+
+def test_failed_flush_reports_the_error_and_keeps_the_write(backend):
+    healthy = lambda: ConversationDatabaseManager(backend=backend)
+
+    def broken():
+        raise RuntimeError("database unavailable")
+
+    writer = ConversationWriter(broken, max_batch=100, flush_interval=60)
+    try:
+        writer.insert("app", "user", "t1", "text")
+        assert not writer.flush(timeout=5)
+        assert str(writer.last_error) == "database unavailable"
+        assert writer.pending_conversation("t1") == "text"
+        writer.manager_factory = healthy
+        assert writer.flush(timeout=5)
+        assert writer.last_error is None
+    finally:
+        writer.close()
+    assert rows(backend) == [("t1", "text")]
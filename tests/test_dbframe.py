@@ -0,0 +1,37 @@
+import sqlite3
+
+import numpy as np
+
+from dbframe import fetch_frame
+
+
+def frame(rows):
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (value)")  # no affinity: values keep their Python type
+    conn.executemany("INSERT INTO t VALUES (?)", [(value,) for value in rows])
+    cursor = conn.execute("SELECT value FROM t ORDER BY rowid")
+    return fetch_frame(cursor, batch_size=2)["value"]
+
+
+def test_int_column_is_int64():
+    column = frame([1, 2, 3])
+    assert column.dtype == np.int64
+    assert column.tolist() == [1, 2, 3]
+
+
+def test_mixed_int_and_float_column_keeps_fractions():
+    column = frame([1, 2.7, 3])
+    assert column.dtype == np.float64
+    assert column.tolist() == [1.0, 2.7, 3.0]
+
+
+def test_int_column_with_nulls_is_nullable():
+    column = frame([1, None, 3])
+    assert str(column.dtype) == "Int64"
+    assert column.isna().tolist() == [False, True, False]
+
+
+def test_mixed_text_and_numbers_stay_objects():
+    column = frame([1, "two", 3.5])
+    assert column.dtype == object
+    assert column.tolist() == [1, "two", 3.5]
@@ -0,0 +1,25 @@
+import sqlite3
+
+from dbpool import ConnectionPool, get_pool
+from promptdb import PromptDatabase
+
+
+def test_double_checkin_keeps_the_idle_connection_open():
+    pool = ConnectionPool(lambda: sqlite3.connect(":memory:"), max_size=1)
+    conn = pool.checkout()
+    pool.checkin(conn)
+    pool.checkin(conn)
+    again = pool.checkout()
+    assert again is conn
+    assert again.execute("SELECT 1").fetchone() == (1,)
+    assert pool.stats()["ignored_checkins"] == 1
+
+
+def test_methods_called_outside_with_return_their_connection(backend):
+    db = PromptDatabase(backend=backend)
+    assert db.get_records("SELECT COUNT(*) FROM PromptStrings", ()) == [(0,)]
+    db.update_prompt_record("missing", "text", "comment")
+    db.delete_prompt_by_name("missing")
+    assert db.get_record_by_name("Users", "Username", "nobody") is None
+    assert db.conn is None
+    assert get_pool(backend.key, backend.connect).stats()["in_use"] == 0
@@ -0,0 +1,38 @@
+import shutil
+
+import pytest
+
+import promptdb
+from dbbackend import SQLiteBackend
+from promptdb import PromptDatabase
+
+
+@pytest.fixture
+def replica(backend, tmp_path):
+    """
+    A replica of ``backend`` that has 'alice' in Users and never catches up afterwards.
+    """
+    with PromptDatabase(backend=backend) as db:
+        db.add_record('Users', Username='alice')
+        db.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    path = str(tmp_path / "replica.sqlite")
+    shutil.copy(backend.path, path)
+    yield SQLiteBackend(path, create_schema=False)
+    promptdb._dimension_caches.clear()
+
+
+def test_shared_dimension_cache_is_not_filled_from_the_replica(backend, replica):
+    with PromptDatabase(backend=backend, read_backend=replica, session='writer') as db:
+        assert db.delete_record('Users', ("Username = ?", ('alice',))) == "Record deleted successfully"
+    with PromptDatabase(backend=backend, read_backend=replica, session='reader') as db:
+        assert db.get_record_by_name('Users', 'Username', 'alice') is None
+        assert db.resolve_record_ids([{'username': 'alice'}])[0]['UserID'] is None
+    with PromptDatabase(backend=backend, read_backend=replica, session='writer') as db:
+        assert db.get_record_by_name('Users', 'Username', 'alice') is None
+
+
+def test_routed_reads_still_use_the_replica(backend, replica):
+    with PromptDatabase(backend=backend, read_backend=replica, session='reader') as db:
+        db.cursor.execute("DELETE FROM Users")
+        db.conn.commit()
+        assert db.get_records("SELECT Username FROM Users", ()) == [('alice',)]
@@ -0,0 +1,87 @@
+from promptcatalog import PromptCatalog
+from promptdb import PromptDatabase
+
+
+def add_prompts(db, *names):
+    for name in names:
+        db.add_record('PromptStrings', PromptName=name, PromptString=f"text of {name}", Comment="")
+
+
+def test_first_sync_loads_every_prompt(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_prompts(db, "a", "b")
+        catalog = PromptCatalog()
+        result = db.sync_prompt_catalog(catalog)
+    assert result == {'changed': 2, 'deleted': 0, 'rows_transferred': 2, 'full': True}
+    assert catalog.prompt_string("a") == "text of a"
+    assert catalog.high_water_mark == 2
+
+
+def test_later_syncs_only_fetch_changed_and_deleted_prompts(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_prompts(db, "a", "b", "c")
+        catalog = PromptCatalog()
+        db.sync_prompt_catalog(catalog)
+        assert db.sync_prompt_catalog(catalog) == {'changed': 0, 'deleted': 0, 'rows_transferred': 0, 'full': False}
+
+        db.update_prompt_record("a", "new text", "edited")
+        db.delete_prompt_by_name("b")
+        add_prompts(db, "d")
+        result = db.sync_prompt_catalog(catalog)
+    assert result == {'changed': 2, 'deleted': 1, 'rows_transferred': 2, 'full': False}
+    assert catalog.prompt_string("a") == "new text"
+    assert "b" not in catalog
+    assert sorted(catalog.prompts) == ["a", "c", "d"]
+
+
+def test_sync_without_change_log_falls_back_to_full_loads(backend):
+    conn = backend.connect()
+    conn.execute("DROP TABLE PromptStringsChanges")
+    conn.commit()
+    conn.close()
+    with PromptDatabase(backend=backend) as db:
+        add_prompts(db, "a", "b")
+        catalog = PromptCatalog()
+        assert db.sync_prompt_catalog(catalog)['full']
+        db.delete_prompt_by_name("b")
+        result = db.sync_prompt_catalog(catalog)
+    assert result == {'changed': 1, 'deleted': 0, 'rows_transferred': 1, 'full': True}
+    assert sorted(catalog.prompts) == ["a"]
+
+
+def test_ten_edits_of_a_large_catalog_transfer_ten_rows(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_prompts(db, *(f"p{i}" for i in range(100)))
+        catalog = PromptCatalog()
+        assert db.sync_prompt_catalog(catalog)['rows_transferred'] == 100
+        for i in range(0, 100, 10):
+            db.update_prompt_record(f"p{i}", f"edited {i}", "")
+        result = db.sync_prompt_catalog(catalog)
+    assert result == {'changed': 10, 'deleted': 0, 'rows_transferred': 10, 'full': False}
+    assert catalog.prompt_string("p50") == "edited 50"
+
+
+def commit_change(backend, change_id, name, text):
+    # A write whose change log row got its ChangeID before it committed, as concurrent writers do.
+    conn = backend.connect()
+    conn.execute("INSERT INTO PromptStringsChanges (ChangeID, PromptName) VALUES (?, ?)", (change_id, name))
+    conn.execute("UPDATE PromptStrings SET PromptString = ? WHERE PromptName = ?", (text, name))
+    conn.commit()
+    conn.close()
+
+
+def test_changes_committed_out_of_id_order_are_not_skipped(backend):
+    with PromptDatabase(backend=backend) as db:
+        add_prompts(db, "a", "b")
+        catalog = PromptCatalog()
+        db.sync_prompt_catalog(catalog)
+        commit_change(backend, 4, "b", "b committed first")
+        assert db.sync_prompt_catalog(catalog)['changed'] == 1
+        assert catalog.gaps == {3}
+        commit_change(backend, 3, "a", "a committed late")
+        result = db.sync_prompt_catalog(catalog)
+        assert result == {'changed': 1, 'deleted': 0, 'rows_transferred': 1, 'full': False}
+        assert catalog.gaps == set()
+        assert db.sync_prompt_catalog(catalog)['rows_transferred'] == 0
+    assert catalog.prompt_string("a") == "a committed late"
+    assert catalog.prompt_string("b") == "b committed first"
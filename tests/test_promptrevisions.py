@@ -0,0 +1,82 @@
+import threading
+
+import promptdb
+from promptdb import PromptDatabase
+from promptrevisions import CHECKPOINT_INTERVAL, apply_delta, make_delta
+
+
+def test_delta_round_trip():
+    cases = [("", "new text"), ("old text", ""), ("Hello, world!", "Hello, wide world?"),
+             ("line one\nline two\n", "line zero\nline one\nline two, changed\n"), ("čaj i kafa", "kafa i čaj")]
+    for old, new in cases:
+        assert apply_delta(old, make_delta(old, new)) == new
+
+
+def edit(db, name, text):
+    return db.update_prompt_record(name, text, "")
+
+
+def test_every_revision_is_rebuilt_across_checkpoints(backend):
+    texts = [f"Prompt about topic {i}. " + "Shared instructions that do not change. " * 5 for i in range(45)]
+    with PromptDatabase(backend=backend) as db:
+        db.create_revision_log()
+        db.add_record('PromptStrings', PromptName="p", PromptString=texts[0], Comment="")
+        for text in texts[1:]:
+            assert edit(db, "p", text) == "Prompt record updated successfully."
+        revisions = db.get_prompt_revisions("p")
+        assert [revision['Revision'] for revision in revisions] == list(range(1, len(texts) + 1))
+        assert [revision['Revision'] for revision in revisions if revision['IsCheckpoint']] == \
+            list(range(1, len(texts) + 1, CHECKPOINT_INTERVAL))
+        for number, text in enumerate(texts, 1):
+            assert db.get_prompt_revision("p", number) == text
+        assert db.get_prompt_revision("p") == texts[-1]
+        assert db.get_prompt_revision("p", len(texts) + 1) is None
+
+
+def test_revert_restores_the_text_as_a_new_revision(backend):
+    with PromptDatabase(backend=backend) as db:
+        db.create_revision_log()
+        db.add_record('PromptStrings', PromptName="p", PromptString="first", Comment="old")
+        db.update_prompt_record("p", "second", "kept")
+        assert db.revert_prompt_to_revision("p", 1) == "Prompt record updated successfully."
+        db.cursor.execute("SELECT PromptString, Comment FROM PromptStrings WHERE PromptName = 'p'")
+        assert tuple(db.cursor.fetchone()) == ("first", "kept")
+        assert db.get_prompt_revision("p", 3) == "first"
+        assert db.revert_prompt_to_revision("p", 9) == "Revision 9 of prompt 'p' does not exist."
+
+
+def test_concurrent_edits_of_one_prompt_both_succeed(backend, monkeypatch):
+    conn = backend.connect()
+    conn.execute("DROP TABLE PromptStringsChanges")
+    conn.commit()
+    conn.close()
+    with PromptDatabase(backend=backend) as db:
+        db.create_revision_log()
+        db.add_record('PromptStrings', PromptName="p", PromptString="start", Comment="")
+    first_numbered, second_done = threading.Event(), threading.Event()
+    is_checkpoint = promptdb.is_checkpoint
+
+    def pausing_is_checkpoint(revision, last_checkpoint):
+        # Holds the first edit after it numbered its revision until the second edit is done (or 1 s passed).
+        if threading.current_thread().name == "first" and not first_numbered.is_set():
+            first_numbered.set()
+            second_done.wait(1)
+        return is_checkpoint(revision, last_checkpoint)
+
+    monkeypatch.setattr(promptdb, 'is_checkpoint', pausing_is_checkpoint)
+    results = {}
+
+    def run(name, text):
+        with PromptDatabase(backend=backend) as db:
+            results[name] = edit(db, "p", text)
+
+    first = threading.Thread(target=run, args=("first", "first edit"), name="first")
+    first.start()
+    first_numbered.wait(5)
+    run("second", "second edit")
+    second_done.set()
+    first.join()
+    assert results == {"first": "Prompt record updated successfully.", "second": "Prompt record updated successfully."}
+    with PromptDatabase(backend=backend) as db:
+        assert [revision['Revision'] for revision in db.get_prompt_revisions("p")] == [1, 2, 3]
+        assert db.get_prompt_revision("p") == "second edit"
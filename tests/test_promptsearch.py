@@ -0,0 +1,70 @@
+import pytest
+
+import promptdb
+from promptdb import PromptDatabase
+
+
+TEXTS = {
+    "greeting": "Hello, how can I help you today?",
+    "invoice_reminder": "Please send the invoice by Friday.",
+    "invoice-summary": "Summarize the INVOICE in 3 bullet points.",
+    "sql_helper": "Write a SQL query: SELECT * FROM t WHERE a LIKE 'x%'",
+    "draft_note": "[draft] 100% done, 5_6 left",
+    "short": "ab",
+    "empty": "",
+}
+
+
+@pytest.fixture
+def db(backend):
+    with PromptDatabase(backend=backend) as db:
+        for name, text in TEXTS.items():
+            db.add_record('PromptStrings', PromptName=name, PromptString=text, Comment=f"about {name}")
+        yield db
+    promptdb._search_indexes.pop(backend.key, None)
+
+
+def sql_like(db, column, query):
+    db.cursor.execute(f"SELECT PromptName FROM PromptStrings WHERE {column} LIKE ?", ('%' + query + '%',))
+    return sorted(row[0] for row in db.cursor.fetchall())
+
+
+def names(records):
+    return sorted(record['PromptName'] for record in records)
+
+
+QUERIES = ["invoice", "INVOICE", "the invoice", "send", "help", "nothing like this",
+           "a", "ab", "In", "",
+           "inv%ce", "%", "s_nd", "sum%inv_ice", "invoice%.", "100%", "5_6", "_", "__", "h%o%y"]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_index_matches_sql_like(db, query):
+    index = db.enable_search_index()
+    assert names(index.search_text(query)) == sql_like(db, "PromptString", query)
+    assert names(index.search_names(query)) == sql_like(db, "PromptName", query)
+
+
+def test_character_classes_are_answered_by_the_database(db, backend):
+    index = db.enable_search_index()
+    assert index.search_text("[draft]") is None
+    assert index.search_names("[a-z]") is None
+    # Written by another client, so only the database knows about it.
+    conn = backend.connect()
+    conn.execute("INSERT INTO PromptStrings (PromptName, PromptString, Comment) VALUES ('late', '[draft] late', '')")
+    conn.commit()
+    conn.close()
+    assert names(db.search_for_string_in_prompt_text("[draft]")) == sql_like(db, "PromptString", "[draft]")
+    assert "late" in names(db.search_for_string_in_prompt_text("[draft]"))
+    assert "late" not in names(db.search_for_string_in_prompt_text("draft"))
+
+
+def test_index_follows_add_update_and_delete(db):
+    db.enable_search_index()
+    db.add_record('PromptStrings', PromptName="new_prompt", PromptString="Translate the invoice", Comment="")
+    db.update_prompt_record("greeting", "Goodbye, see you", "edited")
+    db.delete_prompt_by_name("invoice_reminder")
+    for query in ["invoice", "hello", "goodbye", "new_", "tr%late", "ee"]:
+        assert names(db.search_for_string_in_prompt_text(query)) == sql_like(db, "PromptString", query), query
+        assert names(db.get_prompts_contain_in_name(query)) == sql_like(db, "PromptName", query), query
+    assert names(db.search_for_string_in_prompt_text("invoice")) == ["invoice-summary", "new_prompt"]
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+import promptdb
+from promptcache import PromptCache
+from promptsnapshot import HEADER, MAGIC, PromptSnapshot, write_snapshot
+
+
+PROMPTS = {
+    "sys_ragbot": "Ti si asistent koji uvek piše na srpskom.",
+    "čačak_šablon": "Ćirilica: Здраво, свете",
+    "emoji": "🙂 " * 1000,
+    "empty": "",
+    "no_string": None,
+}
+
+
+def test_round_trip_keeps_non_ascii_names_and_strings(tmp_path):
+    path = str(tmp_path / "prompts.snapshot")
+    assert write_snapshot(path, PROMPTS, version=42) == 4
+    with PromptSnapshot(path) as snapshot:
+        assert snapshot.version == 42
+        assert len(snapshot) == 4
+        assert list(snapshot.names()) == sorted((name for name in PROMPTS if name != "no_string"),
+                                                key=lambda name: name.encode('utf-8'))
+        for name, value in PROMPTS.items():
+            assert snapshot.get(name) == value
+        assert "čačak_šablon" in snapshot and "cacak_sablon" not in snapshot
+        assert snapshot.get_many(["emoji", "missing"]) == {"emoji": PROMPTS["emoji"]}
+
+
+def test_truncated_files_are_rejected(tmp_path):
+    path = tmp_path / "prompts.snapshot"
+    write_snapshot(str(path), PROMPTS)
+    data = path.read_bytes()
+    for size in (HEADER.size - 1, HEADER.size + 10, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(ValueError):
+            PromptSnapshot(str(path))
+
+
+def test_other_format_versions_are_rejected(tmp_path):
+    path = tmp_path / "prompts.snapshot"
+    write_snapshot(str(path), PROMPTS)
+    data = bytearray(path.read_bytes())
+    data[len(MAGIC):len(MAGIC) + 2] = (2).to_bytes(2, 'little')
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="format 2"):
+        PromptSnapshot(str(path))
+
+
+def test_work_prompts_start_from_the_snapshot_without_the_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "prompts.snapshot")
+    write_snapshot(path, {"ragbot_prompt": "iz snapshota", "blogger_prompt": "blog"})
+    monkeypatch.setattr(promptdb, '_snapshot_primed', True)
+    monkeypatch.setattr(promptdb, 'prompt_cache', PromptCache(lambda names: {}))
+    for name in promptdb.work_prompts():
+        monkeypatch.delenv(name.upper(), raising=False)
+    monkeypatch.setenv("SYS_RAGBOT", "ragbot_prompt")
+    monkeypatch.setenv("SYS_BLOGGER", "blogger_prompt")
+    monkeypatch.setattr(promptdb, 'PROMPT_SNAPSHOT_PATH', path)
+    monkeypatch.setattr(promptdb, '_snapshot_primed', False)
+    monkeypatch.setattr(promptdb, 'prompt_cache', PromptCache(promptdb._load_prompt_strings))
+    refresh_attempted = threading.Event()
+
+    def unreachable(*args, **kwargs):
+        refresh_attempted.set()
+        raise ConnectionError("database unreachable")
+
+    monkeypatch.setattr(promptdb, 'PromptDatabase', unreachable)
+    prompts = promptdb.work_prompts()
+    assert prompts["sys_ragbot"] == "iz snapshota"
+    assert prompts["sys_blogger"] == "blog"
+    assert prompts["hyde_rag"] == "You are a helpful assistant that always writes in Serbian."
+    # The background refresh fails quietly and the snapshot values keep being served.
+    assert refresh_attempted.wait(5)
+    assert promptdb.prompt_cache.get("ragbot_prompt") == "iz snapshota"
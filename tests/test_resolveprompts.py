@@ -0,0 +1,57 @@
+import promptdb
+from promptdb import PromptDatabase
+
+
+class CountingCursor:
+    """
+    Wraps a cursor and records the parameters of every statement run through it.
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.params = []
+
+    def execute(self, query, params=()):
+        self.params.append(params)
+        return self.cursor.execute(query, params)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def add_prompts(backend, count):
+    conn = backend.connect()
+    conn.executemany("INSERT INTO PromptStrings (PromptName, PromptString, Comment) VALUES (?, ?, '')",
+                     [(f"p{number}", f"text {number}") for number in range(count)])
+    conn.commit()
+    conn.close()
+
+
+def test_thousands_of_names_are_resolved_in_chunks(backend):
+    add_prompts(backend, 4500)
+    with PromptDatabase(backend=backend) as db:
+        db.cursor = counting = CountingCursor(db.cursor)
+        resolved = db.resolve_prompt_strings([f"p{number}" for number in range(4500)])
+    assert len(resolved) == 4500
+    assert resolved["p0"] == "text 0" and resolved["p4499"] == "text 4499"
+    # One statement per chunk; IN lists are padded to their bucket size, still below 2100 parameters.
+    assert [len(set(params)) for params in counting.params] == [2000, 2000, 500]
+    assert max(len(params) for params in counting.params) < 2100
+
+
+def test_duplicate_names_are_sent_once(backend, monkeypatch):
+    add_prompts(backend, 5)
+    monkeypatch.setattr(promptdb, 'MAX_QUERY_PARAMS', 2)
+    with PromptDatabase(backend=backend) as db:
+        db.cursor = counting = CountingCursor(db.cursor)
+        resolved = db.resolve_prompt_strings(["p1", "p2", "p1", None, "p3", "p2", "p1"])
+        strings = db.query_sql_prompt_strings(["p3", "p1", "p3"])
+    assert resolved == {"p1": "text 1", "p2": "text 2", "p3": "text 3"}
+    assert [sorted(set(params)) for params in counting.params[:2]] == [["p1", "p2"], ["p3"]]
+    assert strings == ["text 3", "text 1", "text 3"]
+
+
+def test_missing_prompt_does_not_shift_later_variables(backend):
+    add_prompts(backend, 3)
+    with PromptDatabase(backend=backend) as db:
+        values = db.get_prompts_by_names(["first", "missing", "third", "again"], ["p0", "gone", "p2", "p0"])
+    assert values == {"first": "text 0", "third": "text 2", "again": "text 0"}
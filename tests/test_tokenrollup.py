@@ -0,0 +1,78 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from tokenrollup import TokenRollupStore, token_costs
+
+
+@pytest.fixture
+def rollup(tmp_path):
+    with TokenRollupStore(str(tmp_path / "rollup.sqlite")) as rollup:
+        yield rollup
+
+
+class Loader:
+    """
+    A token source with fixed rows per day, recording the ranges it is asked for.
+    """
+    def __init__(self, rows):
+        self.rows = rows  # day -> [(app_name, user_name, embedding, prompt, completion, stt, tts)]
+        self.calls = []
+
+    def __call__(self, start, end):
+        self.calls.append((start, end))
+        return [(day,) + row for day, rows in self.rows.items() if start[:10] <= day.isoformat() < end[:10]
+                for row in rows]
+
+
+def test_refresh_reads_missing_days_in_one_call_and_always_rereads_today(rollup):
+    today = date.today()
+    days = [today - timedelta(days=offset) for offset in range(3, -1, -1)]
+    loader = Loader({day: [("app", "ana", 0, 10, 0, 0, 0)] for day in days})
+    assert rollup.refresh(loader, days[0]) == 4
+    assert loader.calls == [(f"{days[0]} 00:00:00", f"{today + timedelta(days=1)} 00:00:00")]
+
+    loader.calls.clear()
+    loader.rows[today] = [("app", "ana", 0, 25, 0, 0, 0)]
+    assert rollup.refresh(loader, days[0]) == 1
+    assert loader.calls == [(f"{today} 00:00:00", f"{today + timedelta(days=1)} 00:00:00")]
+    assert rollup.totals(days[0], today)['prompt'].tolist() == [55]
+
+
+def test_refresh_fills_gaps_with_one_call_per_run(rollup):
+    today = date.today()
+    start = today - timedelta(days=10)
+    loader = Loader({})
+    rollup.refresh(loader, start, today - timedelta(days=8))
+    rollup.refresh(loader, today - timedelta(days=5), today - timedelta(days=4))
+    loader.calls.clear()
+    assert rollup.refresh(loader, start, today - timedelta(days=1)) == 5
+    assert [call[0][:10] for call in loader.calls] == [str(today - timedelta(days=7)), str(today - timedelta(days=3))]
+
+
+def test_totals_group_by(rollup):
+    day1, day2 = date(2024, 3, 1), date(2024, 3, 2)
+    rollup.refresh(Loader({
+        day1: [("app", "ana", 1, 2, 3, 4, 5), ("app", "bob", 10, 20, 30, 40, 50)],
+        day2: [("other", "ana", 100, 200, 300, 400, 500)],
+    }), day1, day2)
+    assert rollup.totals(day1, day2).iloc[0].tolist() == [111, 222, 333, 444, 555]
+    by_app = rollup.totals(day1, day2, group_by=['app_name'])
+    assert by_app.values.tolist() == [["app", 11, 22, 33, 44, 55], ["other", 100, 200, 300, 400, 500]]
+    by_day_user = rollup.totals(day1, day1, group_by=['day', 'user_name'])
+    assert by_day_user[['day', 'user_name', 'prompt']].values.tolist() == [["2024-03-01", "ana", 2],
+                                                                            ["2024-03-01", "bob", 20]]
+
+
+def test_cost_breakdown_is_exact(rollup):
+    day = date(2024, 3, 1)
+    rollup.refresh(Loader({day: [("app", "ana", 1234567, 1000000, 333333, 90, 7)]}), day, day)
+    [costs] = rollup.cost_breakdown(day, day)
+    assert costs['embedding_cost'] == Decimal('0.16049371')
+    assert costs['prompt_cost'] == Decimal('5.00000000')
+    assert costs['completion_cost'] == Decimal('4.99999500')
+    assert costs['stt_cost'] == Decimal('0.00000001')
+    assert costs['tts_cost'] == Decimal('0.00010500')
+    assert costs['total_cost'] == Decimal('10.16059372')
+    assert set(token_costs({}).values()) == {Decimal(0)}
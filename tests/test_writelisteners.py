@@ -0,0 +1,62 @@
+import pytest
+
+import promptdb
+from promptdb import PromptDatabase, prompt_cache
+
+
+@pytest.fixture
+def db(backend):
+    prompt_cache.invalidate()
+    with PromptDatabase(backend=backend) as db:
+        for name in ("a", "b"):
+            db.add_record('PromptStrings', PromptName=name, PromptString=f"text of {name}", Comment="")
+        yield db
+    prompt_cache.invalidate()
+
+
+def test_keys_are_not_looked_up_without_a_consumer(db):
+    condition = ("PromptName = ?", ["a"])
+    assert db._affected_keys('PromptStrings', condition) is None
+    assert db._affected_keys('Users', ("Username = ?", ["x"])) is None
+
+
+def test_keys_are_looked_up_while_the_prompt_cache_holds_prompts(db):
+    prompt_cache.prime({"a": "text of a", "b": "text of b"})
+    assert db._affected_keys('PromptStrings', ("PromptName = ?", ["a"])) == ["a"]
+    db.update_record('PromptStrings', {'PromptString': "new text"}, ("PromptName = ?", ["a"]))
+    assert prompt_cache.get_many(["b"]) == {"b": "text of b"}
+    assert prompt_cache.stats()["size"] == 1
+
+
+def test_listeners_without_a_predicate_always_get_keys(db):
+    received = []
+
+    def listener(db, table, keys):
+        received.append(keys)
+
+    promptdb.add_write_listener(listener)
+    try:
+        db.delete_record('PromptStrings', ("PromptName = ?", ["b"]))
+    finally:
+        promptdb.remove_write_listener(listener)
+    assert received == [["b"]]
+    assert db._affected_keys('PromptStrings', ("PromptName = ?", ["a"])) is None
+
+
+def test_record_id_misses_only_invalidate_the_tables_that_missed(backend):
+    with PromptDatabase(backend=backend) as db:
+        db.add_record('Users', Username="ana")
+        db.add_record('PromptVariables', VariableName="x")
+        db.add_record('PythonFiles', Filename="old.py", FilePath="old.py")
+        assert db.resolve_record_ids([{'username': "ana", 'variablename': "x", 'filename': "old.py"}])
+        cache = promptdb._dimension_caches[backend.key]
+        assert cache.stats()["tables"] == ['PromptVariables', 'PythonFiles', 'Users']
+        # Written by another client, so the cached PythonFiles does not know it yet.
+        conn = backend.connect()
+        conn.execute("INSERT INTO PythonFiles (Filename, FilePath) VALUES ('new.py', 'new.py')")
+        conn.commit()
+        conn.close()
+        [ids] = db.resolve_record_ids([{'username': "ana", 'variablename': "x", 'filename': "new.py"}])
+        assert None not in ids.values()
+        assert cache.stats()["tables"] == ['PromptVariables', 'Users']
+    promptdb._dimension_caches.pop(backend.key, None)
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+TOKEN_KINDS = ('embedding', 'prompt', 'completion', 'stt', 'tts')
+
+# USD price and the number of tokens it is quoted for. stt is billed per minute of audio (the token count is
+# in seconds), hence the extra factor of 60.
+TOKEN_PRICES = {
+    'embedding': (Decimal('0.13'), 10**6),
+    'prompt': (Decimal('5.0'), 10**6),
+    'completion': (Decimal('15.0'), 10**6),
+    'stt': (Decimal('0.006'), 10**6 * 60),
+    'tts': (Decimal('15.0'), 10**6),
+}
+
+# Costs are rounded once, at the end, to this many dollars.
+COST_QUANTUM = Decimal('0.00000001')
+
+# app_name / user_name recorded for days whose source only reports overall totals.
+ALL = '*'
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS token_rollup (
+    day TEXT NOT NULL,
+    app_name TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    embedding INTEGER NOT NULL DEFAULT 0,
+    prompt INTEGER NOT NULL DEFAULT 0,
+    completion INTEGER NOT NULL DEFAULT 0,
+    stt INTEGER NOT NULL DEFAULT 0,
+    tts INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, app_name, user_name)
+);
+CREATE TABLE IF NOT EXISTS token_rollup_days (
+    day TEXT PRIMARY KEY,
+    aggregated_at TEXT NOT NULL
+);
+"""
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value[:10], '%Y-%m-%d').date()
+
+
+def _day_start(day):
+    return f"{day.isoformat()} 00:00:00"
+
+
+def daily_totals_loader(db):
+    """
+    Returns a loader for TokenRollupStore.refresh() built on ``db.extract_token_sums_between_dates``.
+    That method only reports overall totals of a range, so the loader asks it once per day, from the day's
+    start to the next day's start, and stores each day under app_name = user_name = ALL. Backfilling a long
+    history this way costs one query per day; grouped_query_loader loads any range with one query.
+    """
+    def load(start, end):
+        rows = []
+        day, end_day = _as_date(start), _as_date(end)
+        while day < end_day:
+            sums = db.extract_token_sums_between_dates(_day_start(day), _day_start(day + timedelta(days=1))) or {}
+            rows.append((day, ALL, ALL) + tuple(int(sums.get(f"total_{kind}_tokens") or 0) for kind in TOKEN_KINDS))
+            day += timedelta(days=1)
+        return rows
+    return load
+
+
+def grouped_query_loader(db, query):
+    """
+    Returns a loader for TokenRollupStore.refresh() that reads a whole range of days with one query on
+    ``db.cursor``. The query takes the start (inclusive) and end (exclusive) timestamps as its parameters
+    and returns (day, app_name, user_name, embedding, prompt, completion, stt, tts) rows grouped by day,
+    app and user, e.g. on SQL Server:
+
+        SELECT CONVERT(char(10), created_at, 23), app_name, user_name, SUM(embedding_tokens), ...
+        FROM token_usage WHERE created_at >= ? AND created_at < ?
+        GROUP BY CONVERT(char(10), created_at, 23), app_name, user_name
+    """
+    def load(start, end):
+        db.cursor.execute(query, (start, end))
+        return db.cursor.fetchall()
+    return load
+
+
+def _runs(days):
+    """
+    Splits sorted days into (first, last) runs of consecutive days.
+    """
+    runs = []
+    for day in days:
+        if runs and runs[-1][1] + timedelta(days=1) == day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def token_costs(totals):
+    """
+    Computes the exact USD cost per token kind, plus 'total', from a mapping of kind -> token count.
+    """
+    costs = {}
+    for kind in TOKEN_KINDS:
+        price, per = TOKEN_PRICES[kind]
+        costs[kind] = Decimal(int(totals.get(kind, 0))) * price / per
+    costs['total'] = sum(costs.values(), Decimal(0))
+    return {kind: cost.quantize(COST_QUANTUM, rounding=ROUND_HALF_UP) for kind, cost in costs.items()}
+
+
+class TokenRollupStore:
+    """
+    A local SQLite store of daily token totals per app and user.
+
+    refresh() asks the source only for the days that have not been aggregated yet (today is always
+    re-read, because it is still incomplete), so a report costs one day of source reads however long
+    the history is. totals() and cost_breakdown() then answer any date range from the rollup.
+    """
+    def __init__(self, path):
+        """
+        :param path: The SQLite file holding the rollup. It is created if it does not exist.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript(ROLLUP_SCHEMA)
+        self.conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def missing_days(self, start_day, end_day):
+        """
+        Returns the days between ``start_day`` and ``end_day`` (inclusive) that still need aggregating.
+        """
+        start_day, end_day = _as_date(start_day), _as_date(end_day)
+        today = date.today()
+        with self._lock:
+            done = {row[0] for row in self.conn.execute(
+                "SELECT day FROM token_rollup_days WHERE day BETWEEN ? AND ?",
+                (start_day.isoformat(), end_day.isoformat()))}
+        days = []
+        day = start_day
+        while day <= end_day:
+            if day.isoformat() not in done or day >= today:
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def refresh(self, loader, start_day, end_day=None):
+        """
+        Aggregates the days that are missing from the rollup, asking the loader once per run of consecutive
+        missing days, so the first refresh of a long history is a single call.
+
+        :param loader: A callable taking the 'YYYY-MM-DD 00:00:00' start (inclusive) of the first day and
+                       start (exclusive) of the day after the last one, and returning (day, app_name,
+                       user_name, embedding, prompt, completion, stt, tts) rows for the days in between.
+        :param start_day: The first day to cover (a date or 'YYYY-MM-DD...').
+        :param end_day: The last day to cover; defaults to today. Future days are never aggregated.
+        :return: The number of days read from the source.
+        """
+        today = date.today()
+        end_day = min(_as_date(end_day), today) if end_day is not None else today
+        days = self.missing_days(start_day, end_day)
+        for first, last in _runs(days):
+            rows = list(loader(_day_start(first), _day_start(last + timedelta(days=1))))
+            aggregated_at = datetime.now().isoformat(timespec='seconds')
+            with self._lock:
+                with self.conn:
+                    self.conn.execute("DELETE FROM token_rollup WHERE day BETWEEN ? AND ?",
+                                      (first.isoformat(), last.isoformat()))
+                    self.conn.executemany(
+                        "INSERT INTO token_rollup (day, app_name, user_name, embedding, prompt, completion, stt, tts) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                        "ON CONFLICT (day, app_name, user_name) DO UPDATE SET "
+                        "embedding = embedding + excluded.embedding, prompt = prompt + excluded.prompt, "
+                        "completion = completion + excluded.completion, stt = stt + excluded.stt, "
+                        "tts = tts + excluded.tts",
+                        [(_as_date(row[0]).isoformat(),) + tuple(row[1:]) for row in rows])
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO token_rollup_days (day, aggregated_at) VALUES (?, ?)",
+                        [(day.isoformat(), aggregated_at) for day in days if first <= day <= last and day < today])
+        return len(days)
+
+    def totals(self, start_day, end_day, group_by=()):
+        """
+        Sums the token counts of a date range from the rollup.
+
+        :param group_by: Any of 'day', 'app_name' and 'user_name'; empty for overall totals.
+        :return: A DataFrame with the group columns and one int64 column per token kind.
+        """
+        import pandas as pd
+
+        group_by = list(group_by)
+        with self._lock:
+            df = pd.read_sql_query(
+                f"SELECT day, app_name, user_name, {', '.join(TOKEN_KINDS)} FROM token_rollup "
+                "WHERE day BETWEEN ? AND ?", self.conn,
+                params=(_as_date(start_day).isoformat(), _as_date(end_day).isoformat()))
+        df[list(TOKEN_KINDS)] = df[list(TOKEN_KINDS)].astype('int64')
+        if not group_by:
+            return df[list(TOKEN_KINDS)].sum().to_frame().T
+        return df.groupby(group_by, sort=True)[list(TOKEN_KINDS)].sum().reset_index()
+
+    def cost_breakdown(self, start_day, end_day, group_by=()):
+        """
+        Returns one dict per group with its token totals and the exact Decimal cost per kind and in total.
+        """
+        breakdown = []
+        for record in self.totals(start_day, end_day, group_by).to_dict('records'):
+            costs = token_costs(record)
+            record.update({f"{kind}_cost": cost for kind, cost in costs.items()})
+            breakdown.append(record)
+        return breakdown